@@ -0,0 +1,207 @@
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Mapping, NamedTuple, Optional, Tuple
+
+from OptiHPLCHandler import EmpowerHandler, EmpowerInstrumentMethod
+
+logger = logging.getLogger(__name__)
+
+SystemKey = Tuple[str, str]  # (node, system)
+
+
+IDLE_STATE_FIELD = "SystemState"
+
+
+def default_idle_check(status: Mapping[str, str]) -> bool:
+    """
+    Default check of whether a chromatographic system is idle: A system is considered
+    idle if its "SystemState" is "Idle" (case insensitive). Other status values, e.g.
+    of a single module, can be "Idle" while the system is running.
+    """
+    return str(status.get(IDLE_STATE_FIELD, "")).lower() == "idle"
+
+
+@dataclass
+class ScheduledJob:
+    """
+    A sample set method waiting to be run on one of a number of systems.
+
+    Args:
+        sample_set_method: Name of the sample set method, which must already be posted
+            to Empower.
+        eligible_systems: List of (node, system) pairs the job may run on.
+        priority: Jobs with higher priority are dispatched first.
+        instrument_methods: The instrument methods run by the sample set method, one
+            entry per injection. Used to estimate the duration of the job.
+        duration: Duration of the job in minutes. If None, it is estimated from
+            `instrument_methods`.
+        sample_set_name: Name of the sample set. If None, the name of the sample set
+            method is used.
+        run_mode: The run mode, see `EmpowerHandler.RunExperiment`.
+    """
+
+    sample_set_method: str
+    eligible_systems: List[SystemKey]
+    priority: int = 0
+    instrument_methods: List[EmpowerInstrumentMethod] = field(default_factory=list)
+    duration: Optional[float] = None
+    sample_set_name: Optional[str] = None
+    run_mode: str = "RunOnly"
+
+
+class Dispatch(NamedTuple):
+    """A job that has been started, with the system and expected finishing time."""
+
+    job: ScheduledJob
+    node: str
+    system: str
+    start_time: float
+    expected_finish_time: float
+
+
+def estimate_duration(job: ScheduledJob) -> float:
+    """
+    Estimate the duration of a job in minutes.
+
+    Args:
+        job: The job to estimate the duration of.
+
+    Returns:
+        float: `job.duration` if it is set, otherwise the sum of the last time in the
+        gradient table of each instrument method of the job.
+    """
+    if job.duration is not None:
+        return job.duration
+    duration = 0.0
+    for method in job.instrument_methods:
+        last_time = method.gradient_table[-1]["Time"]
+        if last_time != "Initial":
+            duration += float(last_time)
+    return duration
+
+
+class RunScheduler:
+    """
+    Scheduler that dispatches queued sample set methods to idle chromatographic systems.
+
+    Each time `dispatch` is called, the status of all systems is fetched, and each
+    queued job is, in order of priority, started on one of its eligible systems that is
+    idle. Of these, the system that the fewest other queued jobs can run on is used,
+    and if that is a tie, the one with the least estimated work waiting for it, so
+    systems are kept free for the jobs that need them. Jobs without an idle eligible
+    system stay in the queue until a later call of `dispatch`.
+
+    The handler must be logged in while the scheduler dispatches jobs.
+    """
+
+    def __init__(
+        self,
+        handler: EmpowerHandler,
+        idle_check: Callable[[Mapping[str, str]], bool] = default_idle_check,
+        clock: Callable[[], float] = time.time,
+    ):
+        """
+        Args:
+            handler: The handler used to get system statuses and start runs.
+            idle_check: Function that takes the status of a system, as returned by
+                `EmpowerHandler.GetStatus`, and returns whether the system is idle.
+            clock: Function returning the current time in seconds.
+        """
+        self.handler = handler
+        self.idle_check = idle_check
+        self.clock = clock
+        self.queue: List[ScheduledJob] = []
+        self.dispatched: List[Dispatch] = []
+
+    def add_job(self, job: ScheduledJob) -> None:
+        """Add a job to the queue."""
+        if len(job.eligible_systems) == 0:
+            raise ValueError(f"No eligible systems given for {job.sample_set_method}.")
+        self.queue.append(job)
+
+    def _idle_systems(self) -> Dict[SystemKey, bool]:
+        """Get whether each system that a queued job is eligible for is idle."""
+        eligible = {system for job in self.queue for system in job.eligible_systems}
+        idle = {system: False for system in eligible}
+        for row in self.handler.GetFleetSnapshot():
+            key = (row["node"], row["system"])
+            if key in idle and not row["timed_out"] and row["error"] is None:
+                status = {
+                    name: value
+                    for name, value in row.items()
+                    if name not in ("node", "system", "timed_out", "error")
+                }
+                idle[key] = self.idle_check(status)
+        return idle
+
+    def dispatch(self) -> List[Dispatch]:
+        """
+        Start the queued jobs that should run on a system that is idle now.
+
+        Returns:
+            List[Dispatch]: The jobs started in this call.
+        """
+        if len(self.queue) == 0:
+            return []
+        idle = self._idle_systems()
+        now = self.clock()
+        durations = {id(job): estimate_duration(job) * 60 for job in self.queue}
+        # For each system, the number of queued jobs that can run on it, and their
+        # estimated duration.
+        demand: Dict[SystemKey, List[float]] = {system: [0, 0.0] for system in idle}
+        for job in self.queue:
+            for system in job.eligible_systems:
+                demand[system][0] += 1
+                demand[system][1] += durations[id(job)]
+        started = []
+        # sorted is stable, so jobs with the same priority keep their queue order
+        for job in sorted(self.queue, key=lambda job: -job.priority):
+            idle_systems = [system for system in job.eligible_systems if idle[system]]
+            if not idle_systems:
+                logger.debug("Keeping %s in the queue", job.sample_set_method)
+                continue
+            # min keeps the first of equal systems, so ties go by the eligible order
+            node, system = min(idle_systems, key=lambda system: demand[system])
+            logger.debug("Starting %s on %s/%s", job.sample_set_method, node, system)
+            self.handler.RunExperiment(
+                sample_set_method=job.sample_set_method,
+                node=node,
+                system=system,
+                sample_set_name=job.sample_set_name,
+                run_mode=job.run_mode,
+            )
+            idle[(node, system)] = False
+            for eligible_system in job.eligible_systems:
+                demand[eligible_system][0] -= 1
+                demand[eligible_system][1] -= durations[id(job)]
+            dispatch = Dispatch(job, node, system, now, now + durations[id(job)])
+            self.queue.remove(job)
+            self.dispatched.append(dispatch)
+            started.append(dispatch)
+        return started
+
+    def run(
+        self, poll_interval: float = 60, timeout: Optional[float] = None
+    ) -> List[Dispatch]:
+        """
+        Dispatch jobs until the queue is empty.
+
+        Args:
+            poll_interval: Time in seconds between checks of the system statuses.
+            timeout: Maximum time in seconds to wait for the queue to be emptied. If
+                None, it waits indefinitely.
+
+        Returns:
+            List[Dispatch]: All jobs dispatched by the scheduler.
+        """
+        start = self.clock()
+        while True:
+            self.dispatch()
+            if len(self.queue) == 0:
+                return self.dispatched
+            if timeout is not None and self.clock() - start > timeout:
+                raise TimeoutError(
+                    f"{len(self.queue)} job(s) were not dispatched within {timeout} s."
+                )
+            time.sleep(poll_interval)
@@ -9,6 +9,8 @@ import requests
 from keyring.errors import NoKeyringError
 from urllib3.exceptions import InsecureRequestWarning
 
+from .utils.sqlite_cache import SQLiteResponseCache
+
 logger = logging.getLogger(__name__)
 
 
@@ -53,6 +55,8 @@ class EmpowerConnection:
     :ivar default_get_timeout: The default timeout to use for get requests.
     :ivar default_post_timeout: The default timeout to use for post requests.
     :ivar verify: Whether to verify SSL certificates when connecting via HTTPS.
+    :ivar response_cache: Cache for responses to get requests, shared between
+        processes. None if responses are not cached.
     """
 
     def __init__(
@@ -63,6 +67,7 @@ class EmpowerConnection:
         service: Optional[str] = None,
         verify: Union[bool, str] = True,
         api_version: str = "1.0",
+        response_cache: Optional[SQLiteResponseCache] = None,
     ) -> None:
         """
         Initialize the EmpowerConnection.
@@ -79,6 +84,11 @@ class EmpowerConnection:
             path to the CA_BUNDLE file or directory with certificates of trusted CAs-
             If true, the built-in list of trusted CAs will be used.
         :param api_version: The version of the API to use. Default is "1.0".
+        :param response_cache: Cache for responses to get requests. Responses from
+            endpoints with a time to live in the cache are returned from the cache
+            until they expire. If the server fails, expired responses are returned
+            with a warning. Posting removes cached responses that the post may have
+            changed.
         """
         if not address:
             raise ValueError(
@@ -92,6 +102,7 @@ class EmpowerConnection:
         self.token = None
         self.verify = verify
         self.api_version = api_version
+        self.response_cache = response_cache
         if service is None:
             logger.debug("No service specified, getting service from Empower")
             try:
@@ -327,13 +338,56 @@ class EmpowerConnection:
                 f"timeout is set to {timeout} seconds"
             )
         logger.debug("Getting data from %s with timeout %s", endpoint, timeout)
-        response = self._requests_wrapper(
-            method="get", endpoint=endpoint, body=None, timeout=timeout
-        )
+        if self.response_cache is not None and self.response_cache.ttl_for(endpoint):
+            response = self._cached_get(endpoint=endpoint, timeout=timeout)
+        else:
+            response = self._requests_wrapper(
+                method="get", endpoint=endpoint, body=None, timeout=timeout
+            )
         if response[1]:
             logger.debug("Got message from Empower %s", response[1])
         return response
 
+    def _cached_get(self, endpoint: str, timeout: int) -> EmpowerResponse:
+        """
+        Get data from the response cache, or from Empower if it is not cached or has
+        expired. If Empower fails with a server error, an expired response is used.
+        """
+        key = (self.address, self.project, self.username, self.api_version, endpoint)
+        try:
+            set_time, cached_response = self.response_cache.get(*key)
+        except KeyError:
+            cached_response = None
+        else:
+            if not self.response_cache.is_expired(endpoint, set_time):
+                logger.debug("Using cached response from %s", endpoint)
+                return EmpowerResponse(**cached_response)
+        try:
+            response = self._requests_wrapper(
+                method="get", endpoint=endpoint, body=None, timeout=timeout
+            )
+        except (
+            requests.exceptions.ConnectionError,
+            requests.exceptions.Timeout,
+            requests.exceptions.HTTPError,
+        ) as error:
+            if cached_response is None or not self._is_server_error(error):
+                raise
+            warnings.warn(
+                f"Getting data from {endpoint} failed with '{error}'. Using cached "
+                f"response from {time.ctime(set_time)}."
+            )
+            return EmpowerResponse(**cached_response)
+        self.response_cache.set(*key, response._asdict())
+        return response
+
+    @staticmethod
+    def _is_server_error(error: requests.exceptions.RequestException) -> bool:
+        """Whether an error is caused by the server, and not by the request."""
+        if isinstance(error, requests.exceptions.HTTPError):
+            return error.response is not None and error.response.status_code >= 500
+        return True
+
     def post(
         self, endpoint: str, body: dict, timeout: Optional[int] = None
     ) -> EmpowerResponse:
@@ -358,6 +412,15 @@ class EmpowerConnection:
         response = self._requests_wrapper(
             method="post", endpoint=endpoint, body=body, timeout=timeout
         )
+        if self.response_cache is not None:
+            # E.g. posting to project/methods/instrument-method changes the responses
+            # from all endpoints starting with project/methods
+            path = endpoint.lstrip("/").split("?")[0]
+            self.response_cache.invalidate(
+                address=self.address,
+                project=self.project or "",
+                endpoint_prefix=path.rsplit("/", 1)[0],
+            )
         if response[1]:
             logger.debug("Got message from Empower %s", response[1])
         return response
@@ -402,16 +465,21 @@ class EmpowerConnection:
         try:
             response.raise_for_status()
         except requests.exceptions.HTTPError as error:
-            body = response.json()
+            try:
+                body = response.json()
+            except ValueError:
+                raise error from None  # E.g. an error page from a proxy
             if "message" in body and "id" in body:
                 error = requests.exceptions.HTTPError(
                     f"HTTP error {response.status_code} "
                     f"with message '{response.json()['message']}' "
-                    f"and ID {response.json()['id']}"
+                    f"and ID {response.json()['id']}",
+                    response=response,
                 )
             elif "errors" in body:
                 error = requests.exceptions.HTTPError(
                     f"HTTP error {response.status_code} "
-                    f"with errors '{response.json()['errors']}'"
+                    f"with errors '{response.json()['errors']}'",
+                    response=response,
                 )
             raise error from None
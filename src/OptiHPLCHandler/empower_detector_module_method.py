@@ -1,3 +1,4 @@
+import dataclasses
 import logging
 from dataclasses import dataclass
 from typing import Optional, Union
@@ -29,11 +30,31 @@ def xml_compatible(value: Union[str, bool]) -> str:
     return str(value)
 
 
+def with_slots(cls: type) -> type:
+    """
+    Make a dataclass use `__slots__` instead of a `__dict__` for its fields, which
+    takes less memory per object. Like `dataclass(slots=True)`, which is not available
+    in Python 3.9.
+    """
+    field_names = tuple(field.name for field in dataclasses.fields(cls))
+    cls_dict = dict(cls.__dict__)
+    for name in field_names:
+        # The defaults are already in the generated __init__, and class attributes
+        # with the same names as slots are not allowed.
+        cls_dict.pop(name, None)
+    cls_dict.pop("__dict__", None)
+    cls_dict.pop("__weakref__", None)
+    cls_dict["__slots__"] = field_names
+    return type(cls)(cls.__name__, cls.__bases__, cls_dict)
+
+
 class Channel:
+    __slots__ = ()
+
     def __iter__(self):
         yield "channel_type", self.__class__.__name__
-        for attr, value in self.__dict__.items():
-            yield attr, value
+        for field in dataclasses.fields(self):
+            yield field.name, getattr(self, field.name)
 
     def __getitem__(self, item):
         return getattr(self, item)
@@ -43,6 +64,8 @@ class Channel:
 
 
 class Detector(EmpowerModuleMethod):
+    __slots__ = ()
+
     @property
     def lamp_enabled(self) -> bool:
         try:
@@ -87,6 +110,7 @@ class Detector(EmpowerModuleMethod):
     channel_types: tuple[Channel, ...] = tuple()
 
 
+@with_slots
 @dataclass
 class TUVChannel(Channel):
     # Description ignored and just placed in xml
@@ -108,14 +132,17 @@ class TUVChannel(Channel):
 
 
 class TUVMethod(Detector):
+    __slots__ = ()
+
     channel_names = ["ChannelA", "ChannelB"]
     channel_types = (TUVChannel,)
 
     @property
     def channels(self) -> list[TUVChannel]:
         channels = []
+        channel_xml_dict = self.get_many(self.channel_names)
         for channel_name in self.channel_names:
-            channel_xml = self[channel_name]
+            channel_xml = channel_xml_dict[channel_name]
             channel_xml = "<xml>" + channel_xml + "</xml>"  # give root
             channel = ET.fromstring(channel_xml)
             datamode = channel.find("DataMode").text
@@ -162,13 +189,17 @@ class TUVMethod(Detector):
             },
         ]
 
-        for i, settings in enumerate(channel_settings):
-            self[f"Channel{chr(65 + i)}"] = (
-                f"<DataRate>{settings['datarate']}</DataRate>"
-                f"<DataMode>{settings['datamode']}</DataMode>"
-                f"<TimeConstant>{settings['timeconstant']}</TimeConstant>"
-                f"{settings['channel']}"
-            )
+        self.update(
+            {
+                f"Channel{chr(65 + i)}": (
+                    f"<DataRate>{settings['datarate']}</DataRate>"
+                    f"<DataMode>{settings['datamode']}</DataMode>"
+                    f"<TimeConstant>{settings['timeconstant']}</TimeConstant>"
+                    f"{settings['channel']}"
+                )
+                for i, settings in enumerate(channel_settings)
+            }
+        )
 
     @property
     def wavelengths(self) -> list[str]:
@@ -183,6 +214,7 @@ class TUVMethod(Detector):
         self.channels = [TUVChannel(wavelength=str(wavelength)) for wavelength in value]
 
 
+@with_slots
 @dataclass
 class PDAChannel(Channel):
     # Wrapper of channel name and enable handled on module method level
@@ -200,6 +232,7 @@ class PDAChannel(Channel):
         return TUVChannel(wavelength=self.wavelength1)
 
 
+@with_slots
 @dataclass
 class PDASpectralChannel(Channel):
     start_wavelength: str
@@ -211,6 +244,8 @@ class PDASpectralChannel(Channel):
 
 
 class PDAMethod(Detector):
+    __slots__ = ()
+
     channel_names = [
         "Channel1",
         "Channel2",
@@ -226,8 +261,9 @@ class PDAMethod(Detector):
     @property
     def channels(self) -> list[PDAChannel]:
         channels = []
+        channel_xml_dict = self.get_many(self.channel_names)
         for channel_name in self.channel_names:
-            channel_xml = self[channel_name]
+            channel_xml = channel_xml_dict[channel_name]
             channel_xml = "<xml>" + channel_xml + "</xml>"
             channel = ET.fromstring(channel_xml)
             if not channel.find("Enable").text == "true":
@@ -247,6 +283,7 @@ class PDAMethod(Detector):
     def channels(self, value: list[PDAChannel]):
         if len(value) > 8:
             raise ValueError("Too many channels")
+        new_values = {}
         for channel_index in range(8):
             try:
                 channel_xml = f"<Enable>true</Enable>{value[channel_index].to_xml()}"
@@ -254,7 +291,8 @@ class PDAMethod(Detector):
                 default_pda_channel = PDAChannel(wavelength1="254")
                 channel_xml = f"<Enable>false</Enable>{default_pda_channel.to_xml()}"
 
-            self[self.channel_names[channel_index]] = channel_xml
+            new_values[self.channel_names[channel_index]] = channel_xml
+        self.update(new_values)
 
     @property
     def wavelengths(self) -> list[str]:
@@ -313,6 +351,7 @@ class PDAMethod(Detector):
         )
 
 
+@with_slots
 @dataclass
 class FLRChannel(Channel):
     # name: str # Emission and excitation constructed here and channel name is constructed in module level # noqa: E501
@@ -332,14 +371,17 @@ class FLRChannel(Channel):
 
 
 class FLRMethod(Detector):
+    __slots__ = ()
+
     channel_names = ["ChannelA", "ChannelB", "ChannelC", "ChannelD"]
     channel_types = (FLRChannel,)
 
     @property
     def channels(self) -> list[FLRChannel]:
         channels = []
+        channel_xml_dict = self.get_many(self.channel_names)
         for channel_name in self.channel_names:
-            channel_xml = self[channel_name]
+            channel_xml = channel_xml_dict[channel_name]
             channel_xml = "<xml>" + channel_xml + "</xml>"  # give root
             channel = ET.fromstring(channel_xml)
             if channel.find("Enable").text != "true":
@@ -366,6 +408,7 @@ class FLRMethod(Detector):
             3: "Emission_3C",
             4: "Emission_4D",
         }
+        new_values = {}
         for channel_index in range(4):
             try:
                 # Always enable if it is in the list
@@ -384,7 +427,8 @@ class FLRMethod(Detector):
                 )
                 channel_xml = default_flr_channel.to_xml()
 
-            self[self.channel_names[channel_index]] = channel_xml
+            new_values[self.channel_names[channel_index]] = channel_xml
+        self.update(new_values)
 
     @property
     def wavelengths(self) -> list[dict[str, str]]:
@@ -1,14 +1,127 @@
+import concurrent.futures
+import contextlib
+import copy
+import hashlib
+import json
 import logging
+import re
+import time
 import warnings
-from typing import Any, Dict, Iterable, List, Mapping, Optional, Union
+from datetime import datetime
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
 
 from .empower_api_core import EmpowerConnection
 from .empower_instrument_method import EmpowerInstrumentMethod
+from .execution_plan import ExecutionPlan
+from .post_journal import PostJournal
+from .utils.cache import LRUCache, ReferenceDataCache
 from .utils.default_data import BUILTIN_ALLOWED_VALUES, RUN_MODES, SYNONYMS
+from .utils.sqlite_cache import SQLiteResponseCache
+from .utils.validate_method_name import append_truncate_method_name
 
 logger = logging.getLogger(__name__)
 
 
+class UpsertResult(NamedTuple):
+    """
+    The outcome of upserting a method.
+
+    :ivar requested_name: The name of the method before it was upserted.
+    :ivar name: The name the method is stored under in Empower.
+    :ivar outcome: "posted" if no method with the name existed, "skipped" if an
+        identical method existed, "versioned" if it was posted under a new name, or
+        "overwritten" if it replaced a different method with the same name.
+    """
+
+    requested_name: str
+    name: str
+    outcome: str
+
+
+class ResolvedSampleSetMethod(NamedTuple):
+    """
+    A sample set method with the methods it uses.
+
+    :ivar sample_set_method: The sample set method definition from Empower.
+    :ivar method_set_methods: The method set methods used by the sample set method, by
+        name.
+    :ivar instrument_methods: The instrument methods used by the method set methods, by
+        name.
+    """
+
+    sample_set_method: Dict[str, Any]
+    method_set_methods: Dict[str, Dict[str, Any]]
+    instrument_methods: Dict[str, EmpowerInstrumentMethod]
+
+
+_FRACTION_PATTERN = re.compile(r"\.(\d+)")
+
+
+def _as_aware(timestamp: datetime) -> datetime:
+    """Give a time without time zone the local time zone."""
+    return timestamp if timestamp.tzinfo is not None else timestamp.astimezone()
+
+
+def _parse_time(value: str) -> datetime:
+    """
+    Parse an ISO 8601 time from Empower. Before Python 3.11, `fromisoformat` only
+    accepts fractions of a second with 3 or 6 digits, and Empower sends e.g. 7.
+    """
+    value = _FRACTION_PATTERN.sub(
+        lambda match: "." + match.group(1)[:6].ljust(6, "0"), value, count=1
+    )
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def _in_window(
+    value: Optional[str], after: Optional[datetime], before: Optional[datetime]
+) -> bool:
+    """Whether an ISO 8601 time from Empower is between `after` and `before`."""
+    if not value:
+        return False
+    timestamp = _as_aware(_parse_time(value))
+    if after is not None and timestamp <= _as_aware(after):
+        return False
+    if before is not None and timestamp >= _as_aware(before):
+        return False
+    return True
+
+
+def _failed(
+    future: concurrent.futures.Future, row: Dict[str, Any], description: str
+) -> bool:
+    """
+    Whether a request for a fleet snapshot timed out or failed, in which case
+    `timed_out` or `error` is set in its row.
+    """
+    if not future.done():
+        logger.debug("Getting %s timed out", description)
+        row["timed_out"] = True
+        return True
+    if future.exception() is not None:
+        row["error"] = str(future.exception())
+        return True
+    return False
+
+
+def fingerprint(content: Any) -> str:
+    """SHA-256 hash of JSON serialisable content, independent of the order of keys."""
+    return hashlib.sha256(json.dumps(content, sort_keys=True).encode()).hexdigest()
+
+
 class EmpowerHandler:
     """
     Handler for Empower. It allows you to post experiments to Empower and run them. It
@@ -24,6 +137,10 @@ class EmpowerHandler:
     :ivar synonym_dict: Dictionary with the synonyms for the fields in SampleSetLine.
         The keys are the synonyms, the values are the actual field names that the API
         accepts.
+    :ivar reference_cache: Cache for projects, nodes, systems, plate types and sample
+        set methods. Use `reference_cache.invalidate()` to force fetching them again.
+    :ivar method_cache: Cache for instrument methods and method set methods fetched by
+        name. Its `hit_ratio` and `memory_usage` show how well it works.
     """
 
     def __init__(
@@ -34,6 +151,10 @@ class EmpowerHandler:
         username: Optional[str] = None,
         allow_login_without_context_manager: bool = False,
         auto_login: bool = True,
+        reference_cache: Optional[ReferenceDataCache] = None,
+        method_cache: Optional[LRUCache] = None,
+        response_cache: Optional[SQLiteResponseCache] = None,
+        journal: Optional[PostJournal] = None,
         **kwargs,
     ):
         """
@@ -52,10 +173,29 @@ class EmpowerHandler:
         :param auto_login: If `True` (default), the handler will log in automatically
             when you start a context manager. If `False`, you will have to call
             `login()` manually. This will allow you to give the password manually.
+        :param reference_cache: Cache for reference data that rarely changes, i.e.
+            projects, nodes, systems, plate types and sample set methods. If not given,
+            a cache with the default time to live for each resource is used. Give a
+            `ReferenceDataCache` with a `path` to persist the cache between sessions.
+        :param method_cache: Cache for instrument methods and method set methods. If
+            not given, a cache of up to 64 MB is used. Posting a method with the same
+            name removes it from the cache. To turn off caching, give a `LRUCache` with
+            `max_bytes=0`.
+        :param response_cache: Cache for responses from Empower stored on disk, which
+            can be shared between processes. If not given, responses are not stored
+            on disk.
+        :param journal: Journal to record posts in. If given, posts return as soon as
+            they are stored in the journal, and are sent to Empower in the background
+            while logged in. Posts left in the journal by a previous process are sent
+            when logging in. Logging out waits for all posts to be sent.
         """
         super().__init__(**kwargs)
         self.connection = EmpowerConnection(
-            project=project, address=address, service=service, username=username
+            project=project,
+            address=address,
+            service=service,
+            username=username,
+            response_cache=response_cache,
         )
         self.allow_login_without_context_manager = allow_login_without_context_manager
         self.auto_login = auto_login
@@ -63,6 +203,14 @@ class EmpowerHandler:
         self._samplesetline_enum_dict = dict(BUILTIN_ALLOWED_VALUES)
         self.synonym_dict = dict(SYNONYMS)
         self.allowed_run_modes = RUN_MODES
+        if reference_cache is None:
+            reference_cache = ReferenceDataCache()
+        self.reference_cache = reference_cache
+        if method_cache is None:
+            method_cache = LRUCache()
+        self.method_cache = method_cache
+        self._plan: Optional[ExecutionPlan] = None
+        self.journal = journal
 
     def __enter__(self):
         """Start the context manager."""
@@ -135,6 +283,8 @@ class EmpowerHandler:
                     "`with EmpowerHandler(...) as handler:...`"
                 )
         self.connection.login(password=password, username=username)
+        if self.journal is not None:
+            self.journal.start(self.connection)
         # Setting the synonyms and enumerated fields.
         # Consider making this optional to save time if you know which enumerated
         # fields you are going to use.
@@ -166,7 +316,118 @@ class EmpowerHandler:
     def logout(self) -> None:
         """Log out of Empower."""
         logger.debug("Logging out of Empower")
-        self.connection.logout()
+        try:
+            if self.journal is not None:
+                self.journal.flush()
+        finally:
+            if self.journal is not None:
+                self.journal.stop()
+            self.connection.logout()
+
+    @contextlib.contextmanager
+    def record_plan(
+        self, plan: Optional[ExecutionPlan] = None
+    ) -> Iterator[ExecutionPlan]:
+        """
+        Context manager that records posts to Empower in an execution plan instead of
+        sending them.
+
+        Inside the context, `PostInstrumentMethod`, `PostMethodSetMethod`,
+        `PostExperiment` and `RunExperiment` are added to the plan. The plan can be
+        validated, saved and reviewed without being logged in, and then run with
+        `ExecutePlan`, e.g.
+
+        ```
+        with handler.record_plan() as plan:
+            handler.PostInstrumentMethod(method)
+            handler.PostMethodSetMethod(method_set_method)
+        plan.save("plan.json")
+        with handler:
+            handler.ExecutePlan(plan)
+        ```
+
+        :param plan: A plan to add the operations to. If None, a new plan is created.
+        """
+        if self._plan is not None:
+            raise RuntimeError("Already recording a plan.")
+        if plan is None:
+            plan = ExecutionPlan()
+        self._plan = plan
+        try:
+            yield plan
+        finally:
+            self._plan = None
+
+    def ExecutePlan(self, plan: ExecutionPlan, max_workers: int = 4) -> None:
+        """
+        Execute a plan recorded with `record_plan`.
+
+        :param plan: The plan to execute.
+        :param max_workers: The maximum number of concurrent posts to Empower.
+        """
+        logger.debug("Executing %s", plan)
+        try:
+            plan.execute(self.connection, max_workers=max_workers)
+        finally:
+            self.reference_cache.invalidate("sample_set_methods")
+            for operation in plan.operations:
+                self._invalidate_provided(operation.provides)
+
+    def _invalidate_provided(self, provides: Optional[str]) -> None:
+        """
+        Remove the cached data of an Empower object that has been posted.
+
+        :param provides: The posted object, e.g. "InstrumentMethod:my_method".
+        """
+        if not provides:
+            return
+        method_type, method_name = provides.split(":", 1)
+        if method_type == "SampleSetMethod":
+            self.reference_cache.invalidate("sample_set_methods")
+        self.method_cache.invalidate(self._method_cache_key(method_type, method_name))
+
+    def _post(
+        self,
+        operation: str,
+        endpoint: str,
+        body: Any,
+        timeout: Optional[int] = None,
+        provides: Optional[str] = None,
+        requires: Iterable[str] = (),
+    ) -> None:
+        """
+        Post to Empower, or add the post to the plan if a plan is being recorded, or to
+        the journal if the handler has one. The cached data of the posted object is
+        removed after it is posted.
+
+        :param operation: Name of the method doing the post.
+        :param provides: The Empower object created by the post, e.g.
+            "InstrumentMethod:my_method".
+        :param requires: The Empower objects that must exist before the post.
+        """
+        if self._plan is not None:
+            self._plan.add(
+                operation=operation,
+                endpoint=endpoint,
+                body=body,
+                timeout=timeout,
+                provides=provides,
+                requires=requires,
+            )
+            return
+        if self.journal is not None:
+            self._invalidate_provided(provides)
+            # Also removed when it is sent, as it may be read and cached again before
+            self.journal.add(
+                operation=operation,
+                endpoint=endpoint,
+                body=body,
+                timeout=timeout,
+                on_sent=lambda: self._invalidate_provided(provides),
+            )
+            return
+        self.connection.post(endpoint=endpoint, body=body, timeout=timeout)
+        self._invalidate_provided(provides)
 
     def GetEmpowerProjects(self) -> list[Dict[str, str]]:
         """
@@ -174,8 +435,22 @@ class EmpowerHandler:
         project = Mobile, this method fetches all available projectName that
         the user has access to and returns them as a list.
         """
-        project_list = self.connection.get("/authentication/project-list")[0]
-        return project_list
+        return self._get_reference_data(
+            "projects",
+            lambda: self.connection.get("/authentication/project-list")[0],
+        )
+
+    def _get_reference_data(self, resource: str, loader, *args) -> Any:
+        """
+        Get reference data through the reference cache.
+
+        :param resource: The resource to get, e.g. "nodes".
+        :param loader: Function that fetches the data from Empower.
+        :param args: Arguments that identify the data within the resource, e.g. the node
+            name for systems.
+        """
+        key = (self.address, self.project, self.username, *args)
+        return self.reference_cache.get(resource, key, loader)
 
     def PostExperiment(
         self,
@@ -293,7 +568,45 @@ class EmpowerHandler:
             logger.debug("Adding audit trail message to endpoint")
             endpoint += f"?auditTrailComment={audit_trail_message}"
 
-        self.connection.post(endpoint=endpoint, body=sampleset_object)
+        self._post(
+            operation="PostExperiment",
+            endpoint=endpoint,
+            body=sampleset_object,
+            provides=f"SampleSetMethod:{sample_set_method_name}",
+            requires=self._method_set_requirements(empower_sample_list),
+        )
+
+    @staticmethod
+    def _method_set_requirements(empower_sample_list: List[dict]) -> List[str]:
+        """The method set methods used by a list of sample set lines."""
+        requirements = []
+        for sample in empower_sample_list:
+            for field in sample["fields"]:
+                # The method field can also hold a report method, but that only makes
+                # the requirement unfulfilled by the plan, which is harmless.
+                requirement = f"MethodSetMethod:{field['value']}"
+                if field["name"] == "MethodSetOrReportMethod" and (
+                    requirement not in requirements
+                ):
+                    requirements.append(requirement)
+        return requirements
+
+    @staticmethod
+    def _method_set_names(sample_set_lines: List[dict]) -> List[str]:
+        """
+        The distinct method set methods used by a list of sample set lines, skipping
+        lines with a report function, as they use a report method.
+        """
+        names = []
+        for line in sample_set_lines:
+            fields = {field["name"]: field["value"] for field in line["fields"]}
+            function = fields.get("Function", "")
+            if isinstance(function, dict):
+                function = function.get("member", "")
+            name = fields.get("MethodSetOrReportMethod")
+            if name and "Report" not in str(function) and name not in names:
+                names.append(name)
+        return names
 
     def RunExperiment(
         self,
@@ -334,36 +647,98 @@ class EmpowerHandler:
             "systemName": system,
         }
         logger.debug("Running experiment with parameters %s", parameters)
-        self.connection.post(
-            endpoint="acquisition/run-sample-set-method", body=parameters, timeout=60
+        self._post(
+            operation="RunExperiment",
+            endpoint="acquisition/run-sample-set-method",
+            body=parameters,
+            timeout=60,
+            requires=[f"SampleSetMethod:{sample_set_method}"],
         )
 
-    def GetMethodList(self, method_type: str = "MethodSetMethod") -> List[str]:
+    def GetMethodList(
+        self,
+        method_type: str = "MethodSetMethod",
+        name_contains: Optional[str] = None,
+        name_pattern: Optional[str] = None,
+        modified_after: Optional[datetime] = None,
+        modified_before: Optional[datetime] = None,
+        fields: Optional[Sequence[str]] = None,
+        date_field: str = "DateModified",
+    ) -> Union[List[str], List[Dict[str, Any]]]:
         """
         Get the list of methods.
 
+        Only the method type is sent to Empower, as the API doesn't support other
+        filters. The other filters are applied to the methods one at a time as they
+        are read from the response, and only the requested fields are kept.
+
         :param method_type: Type of methods to get. If it doesn't end with "Method", it
             will be added. Default: "MethodSetMethod".
+        :param name_contains: Only get methods with names containing this string.
+        :param name_pattern: Only get methods with names matching this regular
+            expression, e.g. "^robustness_.*_v[0-9]+$".
+        :param modified_after: Only get methods modified after this time. A time
+            without time zone is in local time.
+        :param modified_before: Only get methods modified before this time.
+        :param fields: The fields to get for each method, e.g. ["Name", "DateModified"].
+            If None, only the names of the methods are returned.
+        :param date_field: The field with the time the method was last modified.
+        :return: The names of the methods if `fields` is None, otherwise a dict with the
+            requested fields for each method. Fields a method doesn't have are None.
         """
         if not method_type.endswith("Method"):
             method_type += "Method"
         method_list = self.connection.get(
             endpoint="project/methods?methodTypes=" + method_type
         ).content
-        method_name_dict_list = [
-            [name_dict for name_dict in method["fields"] if name_dict["name"] == "Name"]
-            for method in method_list
-        ]
-        if any(len(name_dict) > 1 for name_dict in method_name_dict_list):
-            raise ValueError("Multiple names found for a method.")
-        if any(len(name_dict) == 0 for name_dict in method_name_dict_list):
-            raise ValueError("No name found for a method.")
-        method_name_list = [
-            name_dict[0]["value"] for name_dict in method_name_dict_list
-        ]
+        methods = self._filter_methods(
+            method_list,
+            name_contains=name_contains,
+            name_pattern=re.compile(name_pattern) if name_pattern else None,
+            modified_window=(modified_after, modified_before),
+            date_field=date_field,
+        )
+        if fields is not None:
+            return [
+                {field: method_fields.get(field) for field in fields}
+                for method_fields in methods
+            ]
+        method_name_list = [method_fields["Name"] for method_fields in methods]
         logger.debug("Found methods %s", method_name_list)
         return method_name_list
 
+    @staticmethod
+    def _filter_methods(
+        method_list: Iterable[Dict[str, Any]],
+        name_contains: Optional[str],
+        name_pattern: Optional[re.Pattern],
+        modified_window: Tuple[Optional[datetime], Optional[datetime]],
+        date_field: str,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Filter methods from the method list endpoint.
+
+        :return: A dict from field name to value for each method that matches.
+        """
+        for method in method_list:
+            method_fields = {}
+            for name_dict in method["fields"]:
+                if name_dict["name"] == "Name" and "Name" in method_fields:
+                    raise ValueError("Multiple names found for a method.")
+                method_fields[name_dict["name"]] = name_dict["value"]
+            if "Name" not in method_fields:
+                raise ValueError("No name found for a method.")
+            name = method_fields["Name"]
+            if name_contains is not None and name_contains not in name:
+                continue
+            if name_pattern is not None and not name_pattern.search(name):
+                continue
+            if modified_window != (None, None) and not _in_window(
+                method_fields.get(date_field), *modified_window
+            ):
+                continue
+            yield method_fields
+
     def GetInstrumentMethod(
         self, method_name: str, use_sample_manager_oven: bool = False
     ) -> EmpowerInstrumentMethod:
@@ -374,20 +749,42 @@ class EmpowerHandler:
         :param use_sample_manager_oven: If True, both sample manager oven and column
             manager oven will be used. If False, only column manager oven will be used.
         """
-        response = self.connection.get(
-            endpoint=f"project/methods/instrument-method?name={method_name}"
-        )
-        if self.connection.api_version == "1.0":
-            return EmpowerInstrumentMethod(response.content[0], use_sample_manager_oven)
-        return EmpowerInstrumentMethod(response.content, use_sample_manager_oven)
+        key = self._method_cache_key("InstrumentMethod", method_name)
+        try:
+            method_definition = self.method_cache.get(key)
+            logger.debug("Using cached instrument method %s", method_name)
+        except KeyError:
+            response = self.connection.get(
+                endpoint=f"project/methods/instrument-method?name={method_name}"
+            )
+            if self.connection.api_version == "1.0":
+                method_definition = response.content[0]
+            else:
+                method_definition = response.content
+            self.method_cache.set(key, method_definition)
+        # EmpowerInstrumentMethod never changes the definition, so it can be shared.
+        return EmpowerInstrumentMethod(method_definition, use_sample_manager_oven)
 
-    def PostInstrumentMethod(self, method: EmpowerInstrumentMethod) -> None:
+    def PostInstrumentMethod(
+        self, method: EmpowerInstrumentMethod, overwrite: bool = False
+    ) -> None:
         """
         Post a method set method to Empower.
 
-        :param method: The method set method to post."""
-        endpoint = "project/methods/instrument-method?overWriteExisting=false"
-        self.connection.post(endpoint=endpoint, body=method.current_method)
+        :param method: The method set method to post.
+        :param overwrite: Whether to overwrite an existing method with the same name.
+            If False (default), posting fails if the method exists.
+        """
+        overwrite_parameter = "true" if overwrite else "false"
+        endpoint = (
+            f"project/methods/instrument-method?overWriteExisting={overwrite_parameter}"
+        )
+        self._post(
+            operation="PostInstrumentMethod",
+            endpoint=endpoint,
+            body=method.current_method,
+            provides=f"InstrumentMethod:{method.method_name}",
+        )
 
     def GetMethodSetMethod(self, method_name: str):
         """
@@ -395,12 +792,20 @@ class EmpowerHandler:
 
         :param method_name: Name of the method set method to get.
         """
-        response = self.connection.get(
-            endpoint=f"project/methods/method-set?name={method_name}"
-        )
-        if self.connection.api_version == "1.0":
-            return response.content[0]
-        return response.content
+        key = self._method_cache_key("MethodSetMethod", method_name)
+        try:
+            method = self.method_cache.get(key)
+            logger.debug("Using cached method set method %s", method_name)
+        except KeyError:
+            response = self.connection.get(
+                endpoint=f"project/methods/method-set?name={method_name}"
+            )
+            if self.connection.api_version == "1.0":
+                method = response.content[0]
+            else:
+                method = response.content
+            self.method_cache.set(key, method)
+        return copy.deepcopy(method)  # The caller may change the method set method
 
     def PostMethodSetMethod(self, method: Mapping[str, Any]) -> None:
         """
@@ -408,11 +813,249 @@ class EmpowerHandler:
 
         :param method: The method set method to post."""
         endpoint = "project/methods/method-set"
-        self.connection.post(endpoint=endpoint, body=method)
+        requires = []
+        if "instrumentMethod" in method:
+            requires.append(f"InstrumentMethod:{method['instrumentMethod']}")
+        self._post(
+            operation="PostMethodSetMethod",
+            endpoint=endpoint,
+            body=method,
+            provides=f"MethodSetMethod:{method['name']}" if "name" in method else None,
+            requires=requires,
+        )
+
+    def GetSampleSetMethod(self, method_name: str) -> Dict[str, Any]:
+        """
+        Get a sample set method.
+
+        :param method_name: Name of the sample set method to get.
+        """
+        key = self._method_cache_key("SampleSetMethod", method_name)
+        try:
+            method = self.method_cache.get(key)
+            logger.debug("Using cached sample set method %s", method_name)
+        except KeyError:
+            response = self.connection.get(
+                endpoint=f"project/methods/sample-set-method?name={method_name}"
+            )
+            if self.connection.api_version == "1.0":
+                method = response.content[0]
+            else:
+                method = response.content
+            self.method_cache.set(key, method)
+        return copy.deepcopy(method)  # The caller may change the sample set method
+
+    def GetResolvedSampleSetMethod(
+        self, method_name: str, max_workers: int = 8
+    ) -> ResolvedSampleSetMethod:
+        """
+        Get a sample set method together with the method set methods and instrument
+        methods it uses.
+
+        The method set methods are fetched concurrently, and each instrument method is
+        fetched as soon as the first method set method using it has been fetched. Each
+        method is only fetched once, and methods in the method cache are not fetched
+        at all.
+
+        :param method_name: Name of the sample set method to get.
+        :param max_workers: The maximum number of methods fetched concurrently.
+        """
+        sample_set_method = self.GetSampleSetMethod(method_name)
+        method_set_names = self._method_set_names(
+            sample_set_method.get("sampleSetLines", [])
+        )
+        method_set_methods = {}
+        instrument_futures: Dict[str, concurrent.futures.Future] = {}
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as pool:
+            method_set_futures = {
+                pool.submit(self.GetMethodSetMethod, name): name
+                for name in method_set_names
+            }
+            for future in concurrent.futures.as_completed(method_set_futures):
+                method_set_method = future.result()
+                method_set_methods[method_set_futures[future]] = method_set_method
+                instrument_name = method_set_method.get("instrumentMethod")
+                if instrument_name and instrument_name not in instrument_futures:
+                    instrument_futures[instrument_name] = pool.submit(
+                        self.GetInstrumentMethod, instrument_name
+                    )
+            instrument_methods = {
+                name: future.result() for name, future in instrument_futures.items()
+            }
+        return ResolvedSampleSetMethod(
+            sample_set_method=sample_set_method,
+            method_set_methods={
+                name: method_set_methods[name] for name in method_set_names
+            },
+            instrument_methods=instrument_methods,
+        )
+
+    def _method_cache_key(self, method_type: str, method_name: str) -> tuple:
+        """The key for a method in the method cache."""
+        return (method_type, self.address, self.project, method_name)
+
+    def UpsertInstrumentMethods(
+        self,
+        methods: Iterable[EmpowerInstrumentMethod],
+        overwrite: bool = False,
+        max_workers: int = 8,
+    ) -> List[UpsertResult]:
+        """
+        Post instrument methods, unless an identical method already exists.
+
+        Methods are compared by a fingerprint of the XML of their modules. If a
+        method with the same name, or a versioned name like "name_v2", is identical to
+        the method, it is not posted. Otherwise, the method is posted under its own
+        name if that is free, overwrites the existing method if `overwrite` is True,
+        or is posted under the next free versioned name. The names of existing methods
+        are fetched in one call, and the existing methods are fetched concurrently, so
+        running the same script twice is fast.
+
+        The `method_name` of each method is changed to the name it is stored under.
+
+        :param methods: The instrument methods to post.
+        :param overwrite: Whether to overwrite existing methods that are different,
+            instead of posting them under a new name.
+        :param max_workers: The maximum number of methods fetched concurrently.
+        :return: The outcome for each method, in the same order as `methods`.
+        """
+        methods = list(methods)
+        versions, existing_methods = self._find_versions(
+            "InstrumentMethod",
+            [method.method_name for method in methods],
+            lambda name: self.GetInstrumentMethod(name).current_method,
+            max_workers,
+        )
+        results = []
+        for method in methods:
+            method_fingerprint = self._instrument_method_fingerprint(
+                method.current_method
+            )
+            name_versions = versions[method.method_name]
+            identical = [
+                name
+                for name in name_versions[:-1]
+                if self._instrument_method_fingerprint(existing_methods[name])
+                == method_fingerprint
+            ]
+            result = self._upsert_outcome(method.method_name, name_versions, identical)
+            if result.outcome == "overwritten" and not overwrite:
+                result = result._replace(name=name_versions[-1], outcome="versioned")
+            method.method_name = result.name
+            if result.outcome != "skipped":
+                self.PostInstrumentMethod(method, overwrite=overwrite)
+            logger.debug("Upserted instrument method: %s", result)
+            results.append(result)
+        return results
+
+    @staticmethod
+    def _instrument_method_fingerprint(method_definition: Mapping[str, Any]) -> str:
+        """Fingerprint of the XML of the modules of an instrument method."""
+        return fingerprint(
+            [module["nativeXml"] for module in method_definition["modules"]]
+        )
+
+    def UpsertMethodSetMethods(
+        self, methods: Iterable[Dict[str, Any]], max_workers: int = 8
+    ) -> List[UpsertResult]:
+        """
+        Post method set methods, unless an identical method already exists.
+
+        Works like `UpsertInstrumentMethods`, except that the API can't overwrite
+        method set methods, so different methods are always posted under a versioned
+        name. An existing method is identical if it has the same values for all the
+        fields in the method, apart from the name.
+
+        The "name" of each method is changed to the name it is stored under.
+
+        :param methods: The method set methods to post.
+        :param max_workers: The maximum number of methods fetched concurrently.
+        :return: The outcome for each method, in the same order as `methods`.
+        """
+        methods = list(methods)
+        versions, existing_methods = self._find_versions(
+            "MethodSetMethod",
+            [method["name"] for method in methods],
+            self.GetMethodSetMethod,
+            max_workers,
+        )
+        results = []
+        for method in methods:
+            fields = [key for key in method if key != "name"]
+            method_fingerprint = fingerprint({key: method[key] for key in fields})
+            name_versions = versions[method["name"]]
+            identical = [
+                name
+                for name in name_versions[:-1]
+                if fingerprint({key: existing_methods[name].get(key) for key in fields})
+                == method_fingerprint
+            ]
+            result = self._upsert_outcome(method["name"], name_versions, identical)
+            if result.outcome == "overwritten":
+                result = result._replace(name=name_versions[-1], outcome="versioned")
+            method["name"] = result.name
+            if result.outcome != "skipped":
+                self.PostMethodSetMethod(method)
+            logger.debug("Upserted method set method: %s", result)
+            results.append(result)
+        return results
+
+    def _find_versions(
+        self,
+        method_type: str,
+        names: List[str],
+        get_method: Callable[[str], Any],
+        max_workers: int,
+    ) -> Tuple[Dict[str, List[str]], Dict[str, Any]]:
+        """
+        Find the existing versions of methods.
+
+        :return: A dict with a list of names for each name in `names`. The list
+            contains the name and the versioned names that exist, followed by the first
+            name that doesn't exist and isn't in `names` or chosen for another name.
+            Also returns a dict with the existing methods.
+        """
+        if len(set(names)) < len(names):
+            raise ValueError(f"The same {method_type} name is given more than once.")
+        existing_names = set(self.GetMethodList(method_type))
+        taken = existing_names | set(names)
+        versions = {}
+        for name in names:
+            versions[name] = [name]
+            version = 2
+            while versions[name][-1] in existing_names:
+                versioned_name = append_truncate_method_name(name, f"_v{version}")
+                version += 1
+                if versioned_name in existing_names or versioned_name not in taken:
+                    versions[name].append(versioned_name)
+            # E.g. two long names that are truncated to the same versioned name
+            taken.add(versions[name][-1])
+        names_to_get = [name for names in versions.values() for name in names[:-1]]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as pool:
+            existing_methods = dict(
+                zip(names_to_get, pool.map(get_method, names_to_get))
+            )
+        return versions, existing_methods
+
+    @staticmethod
+    def _upsert_outcome(
+        name: str, versions: List[str], identical: List[str]
+    ) -> UpsertResult:
+        """
+        The outcome of upserting a method, assuming existing methods may be
+        overwritten.
+        """
+        if identical:
+            return UpsertResult(name, identical[0], "skipped")
+        if len(versions) == 1:
+            return UpsertResult(name, name, "posted")
+        return UpsertResult(name, name, "overwritten")
 
     def GetNodeNames(self) -> List[str]:
         """Get the list of node names."""
-        return self.connection.get(endpoint="acquisition/nodes").content
+        return self._get_reference_data(
+            "nodes", lambda: self.connection.get(endpoint="acquisition/nodes").content
+        )
 
     def GetSystemNames(self, node: str) -> List[str]:
         """
@@ -421,13 +1064,18 @@ class EmpowerHandler:
         :param node: Name of the node to get the systems from.
         """
         endpoint = f"acquisition/chromatographic-systems?nodeName={node}"
-        return self.connection.get(endpoint=endpoint).content
+        return self._get_reference_data(
+            "systems", lambda: self.connection.get(endpoint=endpoint).content, node
+        )
 
     def GetSampleSetMethods(self) -> List[str]:
         """Get the list of sample set methods in project."""
-        return self.connection.get(
-            endpoint="project/methods/sample-set-method-list"
-        ).content
+        return self._get_reference_data(
+            "sample_set_methods",
+            lambda: self.connection.get(
+                endpoint="project/methods/sample-set-method-list"
+            ).content,
+        )
 
     def GetPlateTypeNames(self, filter_string: Optional[str] = None) -> List[str]:
         """
@@ -439,7 +1087,11 @@ class EmpowerHandler:
         endpoint = "configuration/plate-types-list"
         if filter_string:
             endpoint += f"?stringFilter={filter_string}"
-        return self.connection.get(endpoint=endpoint).content
+        return self._get_reference_data(
+            "plate_types",
+            lambda: self.connection.get(endpoint=endpoint).content,
+            filter_string,
+        )
 
     def GetStatus(self, node: str, system: str):
         endpoint = (
@@ -449,6 +1101,79 @@ class EmpowerHandler:
         result_list = self.connection.get(endpoint=endpoint, timeout=120).content
         return {entry["name"]: entry["value"] for entry in result_list}
 
+    def GetFleetSnapshot(
+        self,
+        time_budget: float = 60,
+        max_workers: int = 8,
+        refresh_topology: bool = False,
+    ) -> List[Dict[str, Any]]:
+        """
+        Get the status of all chromatographic systems on all nodes.
+
+        The node names, the system names of each node and the statuses of all systems
+        are fetched in a pool of threads, the names through the reference cache, so all
+        requests count towards the time budget.
+
+        :param time_budget: The maximum time in seconds to spend on the snapshot.
+            Systems whose status has not been received within the time budget are
+            marked as timed out.
+        :param max_workers: The maximum number of concurrent requests to Empower.
+        :param refresh_topology: If True, the node and system names in the reference
+            cache are discarded and fetched again.
+
+        :return: A list with one row per system, that can be given directly to e.g.
+            `pandas.DataFrame`. Each row is a dict with the keys `node`, `system`,
+            `timed_out` and `error`, as well as the status fields of the system. If the
+            system names of a node could not be fetched, the node is given a single row
+            with `system` set to None. If the node names could not be fetched, a single
+            row with `node` and `system` set to None is returned.
+        """
+        deadline = time.monotonic() + time_budget
+        if refresh_topology:
+            self.reference_cache.invalidate("nodes")
+            self.reference_cache.invalidate("systems")
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+        try:
+            node_future = executor.submit(self.GetNodeNames)
+            concurrent.futures.wait(
+                [node_future], timeout=max(deadline - time.monotonic(), 0)
+            )
+            row = {"node": None, "system": None, "timed_out": False, "error": None}
+            if _failed(node_future, row, "node names"):
+                return [row]
+            system_futures = {
+                node: executor.submit(self.GetSystemNames, node)
+                for node in node_future.result()
+            }
+            concurrent.futures.wait(
+                system_futures.values(), timeout=max(deadline - time.monotonic(), 0)
+            )
+            snapshot = []
+            status_futures = {}
+            for node, system_future in system_futures.items():
+                row = {"node": node, "system": None, "timed_out": False, "error": None}
+                if _failed(system_future, row, f"systems on node {node}"):
+                    snapshot.append(row)
+                    continue
+                for system in system_future.result():
+                    row = {**row, "system": system}
+                    snapshot.append(row)
+                    status_futures[len(snapshot) - 1] = executor.submit(
+                        self.GetStatus, node=node, system=system
+                    )
+            concurrent.futures.wait(
+                status_futures.values(), timeout=max(deadline - time.monotonic(), 0)
+            )
+            for index, status_future in status_futures.items():
+                row = snapshot[index]
+                if not _failed(status_future, row, f"status of {row['system']}"):
+                    row.update(status_future.result())
+        finally:
+            # Requests that are still running are left to finish in the background, so
+            # the time budget is respected.
+            executor.shutdown(wait=False, cancel_futures=True)
+        return snapshot
+
     def SetAllowedSamplesetLineFieldValues(
         self,
         field_name: str,
@@ -1,21 +1,304 @@
+import contextlib
 import logging
 import re
-from typing import List, Optional, Union
+from collections.abc import MutableSequence
+from collections.abc import Sequence as SequenceABC
+from copy import copy as shallow_copy
+from typing import (
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+    Union,
+)
 
 from .empower_detector_module_method import Channel, Detector, NoWavelengthError
 from .empower_module_method import (
     ColumnManagerMethod,
     ColumnOvenMethod,
     EmpowerModuleMethod,
+    GradientStep,
+    ModuleMethodCheckpoint,
     SampleManagerMethod,
     SolventManagerMethod,
 )
-from .factories import module_method_factory
+from .factories import module_class_for_definition
+from .method_template import MethodTemplate
 from .utils.data_types import EmpowerInstrumentMethodModel as DataModel
+from .utils.data_types import EmpowerModuleMethodModel
 
 logger = logging.getLogger(__name__)
 
 
+class ModuleMethodList(MutableSequence):
+    """
+    List of the module methods in an instrument method. A module method is only
+    created when it is first accessed, and the list keeps an index of the positions of
+    each type of module method, so finding e.g. the detectors doesn't create or check
+    all the module methods.
+    """
+
+    __slots__ = ("_definitions", "_modules", "_classes", "_backend", "_type_index")
+
+    def __init__(
+        self, definitions: Iterable[Mapping[str, str]] = (), backend: str = "string"
+    ):
+        """
+        Initialize the ModuleMethodList.
+
+        :param definitions: The module method definitions from Empower.
+        :param backend: How the xml of the module methods is stored, see
+            `EmpowerModuleMethod`.
+        """
+        self._definitions: List[Optional[Mapping[str, str]]] = list(definitions)
+        self._modules: List[Optional[EmpowerModuleMethod]] = [None] * len(
+            self._definitions
+        )
+        self._classes: List[Type[EmpowerModuleMethod]] = [
+            module_class_for_definition(definition) for definition in self._definitions
+        ]
+        self._backend = backend
+        self._type_index: Dict[tuple, List[int]] = {}
+
+    def _module(self, index: int) -> EmpowerModuleMethod:
+        module = self._modules[index]
+        if module is None:
+            module = self._classes[index](
+                self._definitions[index], backend=self._backend
+            )
+            self._modules[index] = module
+        return module
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._module(i) for i in range(len(self))[index]]
+        return self._module(range(len(self))[index])
+
+    def _set_modules(self, modules: List[EmpowerModuleMethod]) -> None:
+        self._definitions = [None] * len(modules)
+        self._modules = list(modules)
+        self._classes = [type(module) for module in modules]
+        self._type_index = {}
+
+    def __setitem__(self, index, value) -> None:
+        modules = list(self)
+        modules[index] = value
+        self._set_modules(modules)
+
+    def __delitem__(self, index) -> None:
+        for name in ("_definitions", "_modules", "_classes"):
+            del getattr(self, name)[index]
+        self._type_index = {}
+
+    def insert(self, index: int, value: EmpowerModuleMethod) -> None:
+        self._definitions.insert(index, None)
+        self._modules.insert(index, value)
+        self._classes.insert(index, type(value))
+        self._type_index = {}
+
+    def __len__(self) -> int:
+        return len(self._modules)
+
+    def __repr__(self) -> str:
+        return repr(list(self))
+
+    def __eq__(self, other: object) -> bool:
+        # Compares like a list, so it is equal to a list with the same module methods
+        if not isinstance(other, SequenceABC) or isinstance(other, (str, bytes)):
+            return NotImplemented
+        return len(self) == len(other) and all(
+            module == other_module for module, other_module in zip(self, other)
+        )
+
+    __hash__ = None  # Mutable, like a list
+
+    @property
+    def classes(self) -> List[Type[EmpowerModuleMethod]]:
+        """The class of each module method, without creating them."""
+        return list(self._classes)
+
+    def of_type(
+        self, module_types: Tuple[Type[EmpowerModuleMethod], ...]
+    ) -> List[EmpowerModuleMethod]:
+        """The module methods that are instances of any of the types."""
+        if module_types not in self._type_index:
+            self._type_index[module_types] = [
+                index
+                for index, module_class in enumerate(self._classes)
+                if issubclass(module_class, module_types)
+            ]
+        return [self._module(index) for index in self._type_index[module_types]]
+
+    def revisions(self) -> tuple:
+        """
+        The revision of each module method. For a module method that hasn't been
+        created, the identity of its definition, so lists of different module methods
+        that haven't been created don't have the same revisions.
+        """
+        return tuple(
+            ("definition", id(definition)) if module is None else module._revision
+            for definition, module in zip(self._definitions, self._modules)
+        )
+
+    def current_methods(self) -> List[EmpowerModuleMethodModel]:
+        """The current method definition of each module method."""
+        return [
+            (
+                EmpowerModuleMethodModel(definition)
+                if module is None
+                else module.current_method
+            )
+            for definition, module in zip(self._definitions, self._modules)
+        ]
+
+    def labels(self) -> List[str]:
+        """
+        A name for each module method, from the name in its definition. If more than
+        one module method has the same name, they are numbered from 0, e.g.
+        "AcquityTUV[1]".
+        """
+        names = [
+            (definition if module is None else module.original_method).get(
+                "name", module_class.__name__
+            )
+            for definition, module, module_class in zip(
+                self._definitions, self._modules, self._classes
+            )
+        ]
+        numbers: Dict[str, int] = {}
+        labels = []
+        for name in names:
+            if names.count(name) == 1:
+                labels.append(name)
+            else:
+                labels.append(f"{name}[{numbers.get(name, 0)}]")
+                numbers[name] = numbers.get(name, 0) + 1
+        return labels
+
+    def _unchanged_definition(self, index: int) -> Optional[Mapping[str, str]]:
+        """
+        The definition of a module method, if it hasn't been created or changed. None
+        otherwise.
+        """
+        module = self._modules[index]
+        if module is None:
+            return self._definitions[index]
+        if module._last_step is None:
+            return module.original_method
+        return None
+
+    def _module_diff(
+        self, index: int, other: "ModuleMethodList", other_index: int
+    ) -> Dict[str, tuple]:
+        """The differences between a module method and one in another list."""
+        definition = self._unchanged_definition(index)
+        if definition is not None and definition is other._unchanged_definition(
+            other_index
+        ):
+            return {}  # Both made from the same definition, without changes
+        return self._module(index).diff(other._module(other_index))
+
+    def diff(self, other: "ModuleMethodList") -> Dict[str, Dict[str, tuple]]:
+        """
+        The differences between the module methods and the module methods with the
+        same label in another list, see `labels` and `EmpowerModuleMethod.diff`. Module
+        methods that are made from the same definition, e.g. in a copy of the list,
+        and haven't been changed, are not compared, and are not created if they
+        haven't been created already.
+
+        :return: The differences of each module method with differences, by label. All
+            values of a module method that is only in one of the lists are included,
+            with None as the value in the other list.
+        """
+        other_indices = {label: index for index, label in enumerate(other.labels())}
+        differences = {}
+        for index, label in enumerate(self.labels()):
+            other_index = other_indices.pop(label, None)
+            if other_index is None:
+                module_differences = {
+                    path: (value, None)
+                    for path, value in self._module(index)._leaf_values().items()
+                }
+            else:
+                module_differences = self._module_diff(index, other, other_index)
+            if module_differences:
+                differences[label] = module_differences
+        for label, other_index in other_indices.items():
+            differences[label] = {
+                path: (None, value)
+                for path, value in other._module(other_index)._leaf_values().items()
+            }
+        return differences
+
+    def checkpoint(self) -> tuple:
+        """
+        The current module methods and the state of each of them, which the list can be
+        rolled back to with `rollback`.
+        """
+        module_checkpoints: List[Optional[ModuleMethodCheckpoint]] = [
+            None if module is None else module.checkpoint() for module in self._modules
+        ]
+        return (
+            list(self._definitions),
+            list(self._modules),
+            list(self._classes),
+            module_checkpoints,
+        )
+
+    def rollback(self, checkpoint: tuple) -> None:
+        """
+        Go back to the module methods and their state at a checkpoint from
+        `checkpoint`. Module methods that were created after the checkpoint are
+        created again from their definition when they are accessed.
+        """
+        definitions, modules, classes, module_checkpoints = checkpoint
+        for module, module_checkpoint in zip(modules, module_checkpoints):
+            if module is not None:
+                module.rollback(module_checkpoint)
+        self._definitions = list(definitions)
+        self._modules = list(modules)
+        self._classes = list(classes)
+        self._type_index = {}
+
+    def copy(self) -> "ModuleMethodList":
+        """
+        Return a copy of the list, with copies of the module methods that have been
+        created.
+        """
+        # Made immutable, so the module methods created from them later share them
+        self._definitions = [
+            None
+            if definition is None
+            else EmpowerModuleMethodModel.immutable(definition)
+            for definition in self._definitions
+        ]
+        copy = shallow_copy(self)
+        copy._definitions = list(self._definitions)
+        copy._classes = list(self._classes)
+        copy._modules = [
+            None if module is None else module.copy() for module in self._modules
+        ]
+        copy._type_index = dict(self._type_index)
+        return copy
+
+
+class InstrumentMethodCheckpoint(NamedTuple):
+    """
+    The state of an instrument method, from `EmpowerInstrumentMethod.checkpoint`, which
+    the method can be rolled back to with `EmpowerInstrumentMethod.rollback`.
+    """
+
+    method_name: str
+    module_method_list: ModuleMethodList
+    modules: tuple
+
+
 class EmpowerInstrumentMethod:
     """
     A class to handle Empower instrument methods.
@@ -42,10 +325,20 @@ class EmpowerInstrumentMethod:
         manager is found, a ValueError is raised.
     """
 
+    __slots__ = (
+        "backend",
+        "_module_method_list",
+        "method_name",
+        "original_method",
+        "use_sample_manager_oven",
+        "_current_method_cache",
+    )
+
     def __init__(
         self,
         method_definition: Union[dict, list],
         use_sample_manager_oven: bool = False,
+        backend: str = "string",
     ):
         """
         Initialize the EmpowerInstrumentMethod.
@@ -54,9 +347,10 @@ class EmpowerInstrumentMethod:
             is passed, the instrument method definition will be extracted.
         :param use_sample_manager_oven: If True, both sample manager oven and column
             manager oven will be used. If False, only column manager oven will be used.
+        :param backend: How the xml of the module methods is stored, see
+            `EmpowerModuleMethod`.
         """
-        self.module_method_list: list[EmpowerModuleMethod] = []
-
+        self.backend = backend
         if isinstance(method_definition, dict) and "results" in method_definition:
             # If the entire response from Empower is passed, extract the results
             if len(method_definition["results"]) > 1:
@@ -65,27 +359,39 @@ class EmpowerInstrumentMethod:
                 )
             method_definition = method_definition["results"][0]
         self.method_name = method_definition["methodName"]
-        self.original_method = DataModel(method_definition, mutable=False)
-        for module_method_definition in method_definition["modules"]:
-            module_method = module_method_factory(module_method_definition)
-            self.module_method_list.append(module_method)
+        self.original_method = DataModel.immutable(method_definition)
+        self._module_method_list = ModuleMethodList(
+            method_definition["modules"], backend=backend
+        )
         self.use_sample_manager_oven = use_sample_manager_oven
+        self._current_method_cache: Optional[tuple] = None
+
+    @property
+    def module_method_list(self) -> ModuleMethodList:
+        """
+        The module methods in the instrument method. They are created when they are
+        first accessed. When setting, any list of module methods can be used.
+        """
+        return self._module_method_list
+
+    @module_method_list.setter
+    def module_method_list(self, value: List[EmpowerModuleMethod]) -> None:
+        if not isinstance(value, ModuleMethodList):
+            module_method_list = ModuleMethodList(backend=self.backend)
+            module_method_list.extend(value)
+            value = module_method_list
+        self._module_method_list = value
+        self._current_method_cache = None
 
     @property
     def detector_method_list(self) -> list[Detector]:
         """A list of detector module methods in the instrument method."""
-        return [
-            module for module in self.module_method_list if isinstance(module, Detector)
-        ]
+        return self.module_method_list.of_type((Detector,))
 
     @property
     def sample_handler_method(self) -> Optional[SampleManagerMethod]:
         """The sample manager module method."""
-        sample_handler_method = [
-            module
-            for module in self.module_method_list
-            if isinstance(module, SampleManagerMethod)
-        ]
+        sample_handler_method = self.module_method_list.of_type((SampleManagerMethod,))
         if len(sample_handler_method) == 0:
             return None
         if len(sample_handler_method) > 1:
@@ -95,11 +401,9 @@ class EmpowerInstrumentMethod:
     @property
     def solvent_handler_method(self) -> Optional[SolventManagerMethod]:
         """The sample manager module method."""
-        solvent_handler_method = [
-            module
-            for module in self.module_method_list
-            if isinstance(module, SolventManagerMethod)
-        ]
+        solvent_handler_method = self.module_method_list.of_type(
+            (SolventManagerMethod,)
+        )
         if len(solvent_handler_method) == 0:
             return None
         if len(solvent_handler_method) > 1:
@@ -113,21 +417,29 @@ class EmpowerInstrumentMethod:
             oven_type_tuple = (ColumnManagerMethod, SampleManagerMethod)
         else:
             oven_type_tuple = (ColumnManagerMethod,)
-        return [
-            module
-            for module in self.module_method_list
-            if isinstance(module, oven_type_tuple)
-        ]
+        return self.module_method_list.of_type(oven_type_tuple)
 
     @property
     def current_method(self):
         """The current method definition."""
-        method = dict(self.original_method)
-        method["methodName"] = self.method_name
-        method["modules"] = [
-            method.current_method for method in self.module_method_list
-        ]
-        return DataModel(method)
+        # The method is only rebuilt if the name or a module method has changed
+        state = (
+            self.method_name,
+            id(self.module_method_list),
+            self.module_method_list.revisions(),
+        )
+        if self._current_method_cache is None or (
+            self._current_method_cache[0] != state
+        ):
+            method = dict(self.original_method)
+            method["methodName"] = self.method_name
+            method["modules"] = self.module_method_list.current_methods()
+            self._current_method_cache = (state, method)
+        method = self._current_method_cache[1]
+        # Copying, so changes by the caller don't affect the cache
+        return DataModel(
+            method, modules=[type(module)(module) for module in method["modules"]]
+        )
 
     @property
     def column_temperature(self):
@@ -180,6 +492,19 @@ class EmpowerInstrumentMethod:
             )
         self.solvent_handler_method.gradient_table = gradient_table
 
+    @property
+    def gradient_steps(self) -> Tuple[GradientStep, ...]:
+        """
+        The gradient table with numbers, if a solvent manager module method is present,
+        see `SolventManagerMethod.gradient_steps`.
+        """
+        if self.solvent_handler_method is None:
+            raise ValueError(
+                "Can't get gradient table, "
+                "no solvent manager found in instrument method."
+            )
+        return self.solvent_handler_method.gradient_steps
+
     @property
     def valve_position(self):
         """
@@ -301,20 +626,100 @@ class EmpowerInstrumentMethod:
         return (
             f"{type(self).__name__} with "
             f"{len(self.module_method_list)} module methods of types "
-            + (", ".join([type(method).__name__ for method in self.module_method_list]))
+            + ", ".join(
+                module_class.__name__
+                for module_class in self.module_method_list.classes
+            )
         )
 
-    def copy(self):
-        if any(
-            isinstance(module, SampleManagerMethod)
-            for module in self.column_oven_method_list
-        ):
-            use_sample_manager_oven = True
-        else:
-            use_sample_manager_oven = False
-        copy = EmpowerInstrumentMethod(
-            self.original_method, use_sample_manager_oven=use_sample_manager_oven
+    def diff(
+        self, other: "EmpowerInstrumentMethod"
+    ) -> Dict[str, Dict[str, Tuple[Optional[str], Optional[str]]]]:
+        """
+        The differences between the current method and the current method of another
+        instrument method, e.g. a variant made from this method. The method names are
+        not compared.
+
+        :param other: The instrument method to compare with.
+        :return: For each module method with differences, the value in this method and
+            in the other method of each different value, by the label of the module
+            method and the path of the value, e.g.
+            `{"AcquityTUV": {"ChannelA/Wavelength": ("214", "254")}}`. See
+            `ModuleMethodList.diff`.
+        """
+        return self.module_method_list.diff(other.module_method_list)
+
+    def diff_many(
+        self, others: Iterable["EmpowerInstrumentMethod"]
+    ) -> List[Dict[str, Dict[str, Tuple[Optional[str], Optional[str]]]]]:
+        """
+        The differences between this method and each of several other methods, see
+        `diff`. The values of this method are only found once, and module methods
+        that other methods share with this method, e.g. copies that haven't been
+        changed, are not compared.
+        """
+        return [self.diff(other) for other in others]
+
+    def to_template(self, parameters: Sequence[str]) -> MethodTemplate:
+        """
+        Make a template of the current method, where the values of some parameters are
+        filled in when a variant is made, see `MethodTemplate`. Making variants from a
+        template is much faster than changing and rolling back the method.
+
+        :param parameters: The keys in the xml of the module methods whose values are
+            filled in, e.g. ["SetColumnTemperature"].
+        """
+        return MethodTemplate(self.current_method, parameters)
+
+    def checkpoint(self) -> InstrumentMethodCheckpoint:
+        """
+        The current state of the method, including the method name, which the method
+        can be rolled back to with `rollback`. Making a checkpoint doesn't copy the
+        method.
+        """
+        return InstrumentMethodCheckpoint(
+            self.method_name,
+            self.module_method_list,
+            self.module_method_list.checkpoint(),
         )
-        copy.method_name = self.method_name
-        copy.module_method_list = [module.copy() for module in self.module_method_list]
+
+    def rollback(self, checkpoint: InstrumentMethodCheckpoint) -> None:
+        """
+        Go back to the state of a checkpoint from `checkpoint`, see
+        `EmpowerModuleMethod.rollback`. With the "string" backend, the time this takes
+        doesn't depend on the number of changes made after the checkpoint.
+        """
+        checkpoint.module_method_list.rollback(checkpoint.modules)
+        self._module_method_list = checkpoint.module_method_list
+        self.method_name = checkpoint.method_name
+        self._current_method_cache = None
+
+    @contextlib.contextmanager
+    def transaction(self) -> Iterator[InstrumentMethodCheckpoint]:
+        """
+        Context manager that rolls the method back to its state before the with
+        statement when leaving it, also if an error is raised. This can be used to make
+        and post a variant of a method:
+
+        ```
+        with method.transaction():
+            method.column_temperature = 40
+            method.method_name = "variant"
+            handler.PostInstrumentMethod(method)
+        ```
+        """
+        checkpoint = self.checkpoint()
+        try:
+            yield checkpoint
+        finally:
+            self.rollback(checkpoint)
+
+    def copy(self):
+        """
+        Return a copy of the EmpowerInstrumentMethod. The copy shares the original
+        method definition and the changes made so far with this method, see
+        `EmpowerModuleMethod.copy`.
+        """
+        copy = shallow_copy(self)
+        copy.module_method_list = self.module_method_list.copy()
         return copy
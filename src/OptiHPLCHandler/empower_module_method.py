@@ -1,13 +1,151 @@
+import itertools
 import logging
 import re
 import warnings
-from typing import Dict, List, Mapping, Tuple, Union
+from copy import copy as shallow_copy
+from copy import deepcopy
+from functools import lru_cache
+from typing import Dict, Iterable, List, Mapping, NamedTuple, Optional, Tuple, Union
 from xml.etree import ElementTree as ET
+from xml.sax.saxutils import escape
 
 from .utils.data_types import EmpowerModuleMethodModel as DataModel
+from .utils.xml_tree import LeafIndex, TagOffsetIndex, XmlTree
 
 logger = logging.getLogger(__name__)
 
+_revision_counter = itertools.count()
+# Every change to a module method gives it a new revision number, so the instrument
+# method can tell whether its cached current method is still valid.
+
+
+@lru_cache(maxsize=4096)
+def _round_value(
+    value: Union[str, float], decimal_digits: int = 3
+) -> Tuple[str, Optional[float]]:
+    """
+    Round a value for Empower. Cached, as the same values are used again and again in
+    e.g. gradient tables.
+
+    :return: The rounded value as a string, and the value before rounding if it was
+        changed by rounding, otherwise None. Values that are not numbers are returned
+        as they are.
+    """
+    try:
+        number = float(value)
+    except ValueError:
+        logger.debug("Could not convert %s to float, returning as is", value)
+        return value, None
+    rounded_number = round(number, decimal_digits)
+    if rounded_number != number:
+        return str(rounded_number), number
+    return str(rounded_number), None
+
+
+GRADIENT_TABLE_PATTERN = re.compile(
+    r"(?:\s*<GradientRow>(?:\s*<(\w+)>[^<&]+</\1>)*\s*</GradientRow>)*\s*"
+)
+GRADIENT_ROW_PATTERN = re.compile(r"<GradientRow>(.*?)</GradientRow>", re.DOTALL)
+GRADIENT_FIELD_PATTERN = re.compile(r"<(\w+)>([^<&]+)</\1>")
+
+
+def decode_gradient_table(
+    gradient_xml: str,
+) -> Tuple[Tuple[Tuple[str, str], ...], ...]:
+    """
+    The fields of each row in the xml of a gradient table, i.e. the content of the
+    GradientTable element.
+
+    Tables with only plain rows and fields, which is what Empower makes, are read with
+    regular expressions. Anything else, e.g. entities or empty elements, is parsed with
+    ElementTree, which gives the same result, but is slower.
+
+    :raises ValueError: If the table contains something that is not a GradientRow.
+    """
+    if GRADIENT_TABLE_PATTERN.fullmatch(gradient_xml):
+        return tuple(
+            tuple(GRADIENT_FIELD_PATTERN.findall(row))
+            for row in GRADIENT_ROW_PATTERN.findall(gradient_xml)
+        )
+    gradient_rows = []
+    for gradient_row in ET.fromstring(f"<root>{gradient_xml}</root>"):
+        if gradient_row.tag != "GradientRow":
+            raise ValueError(f"Expected GradientRow, got {gradient_row.tag} instead.")
+        gradient_rows.append(tuple((field.tag, field.text) for field in gradient_row))
+    return tuple(gradient_rows)
+
+
+def _escape(text: str) -> str:
+    """Escape text for xml, like ElementTree does. Most text has nothing to escape."""
+    if "&" in text or "<" in text or ">" in text:
+        return escape(text)
+    return text
+
+
+def encode_gradient_table(
+    gradient_table: Iterable[Mapping[str, Union[str, float, int]]],
+    solvent_lines: Iterable[str],
+    decimal_digits: int = 3,
+) -> str:
+    """
+    The xml of a gradient table, i.e. the content of the GradientTable element. Times,
+    flows and compositions are rounded, and one warning is given for all values that
+    were changed by rounding.
+
+    :param gradient_table: The rows of the gradient table, see
+        `SolventManagerMethod.gradient_table`.
+    :param solvent_lines: The solvent lines to write compositions for, e.g. ["A", "B"].
+    :param decimal_digits: The number of decimals to round to.
+    """
+    keys = ["Time", "Flow", *[f"Composition{line}" for line in solvent_lines]]
+    parts = []
+    rounded = []
+    for row_number, row in enumerate(gradient_table, start=1):
+        parts.append("<GradientRow>")
+        for key in keys:
+            value, unrounded_value = _round_value(row[key], decimal_digits)
+            if unrounded_value is not None:
+                rounded.append(
+                    f"{key} in row {row_number}: {unrounded_value} to {value}"
+                )
+            parts.append(f"<{key}>{_escape(value)}</{key}>")
+        # "6" is linear, which covers 90% of the use cases
+        parts.append(f"<Curve>{_escape(str(row.get('Curve', '6')))}</Curve>")
+        # Consider validating curve (1-11)
+        parts.append("</GradientRow>")
+    if rounded:
+        warnings.warn(
+            f"Rounding {len(rounded)} value(s) in the gradient table, as Empower only "
+            f"accepts {decimal_digits} decimal(s): " + "; ".join(rounded)
+        )
+    return "".join(parts)
+
+
+class _UndoStep(NamedTuple):
+    """
+    A step that can be undone: the changes made in the step and the xml after the
+    step. The steps form a linked list from the newest to the oldest step. They are
+    never changed, so copies of a method share the steps made before the copy.
+
+    The keys are the keys that were set in the step, in the order of the changes, or
+    None if the step replaced a string.
+    """
+
+    previous: Optional["_UndoStep"]
+    changes: Tuple[Tuple[str, str], ...]
+    xml: Optional[str]
+    keys: Optional[Tuple[str, ...]] = None
+
+
+class ModuleMethodCheckpoint(NamedTuple):
+    """
+    The state of a module method, from `EmpowerModuleMethod.checkpoint`, which the
+    method can be rolled back to with `EmpowerModuleMethod.rollback`.
+    """
+
+    last_step: Optional[_UndoStep]
+    revision: int
+
 
 class EmpowerModuleMethod:
     """
@@ -27,12 +165,38 @@ class EmpowerModuleMethod:
     If no xml key is present in the method definition, no changes can be made to the
     method, but the original method definition can still be retrieved.
 
+    With the "tree" backend, the xml is parsed once into a tree with an index of the
+    tags, so reading and setting values by key doesn't search the xml. The xml is only
+    put together again when the current method is requested, and is identical to the
+    original xml, apart from the changed values. Replacing arbitrary strings with
+    `replace` is slower than with the default "string" backend.
+
+    Setting the same keys several times in a row is recorded as one change, so a method
+    that is changed many times, e.g. in an optimisation loop, doesn't keep a change and
+    an xml for each of them. One call to `undo` undoes all of these changes together.
+    Call `checkpoint` to be able to undo back to the current state. Changes are never
+    folded into changes made before the method was copied.
+
     :ivar original_method: The original method definition.
     :ivar current_method: The current method definition, including the changes that
         have been made.
+    :ivar backend: How the xml is stored, "string" or "tree".
     """
 
-    def __init__(self, method_definition: Mapping[str, str]):
+    __slots__ = (
+        "backend",
+        "original_method",
+        "_tree",
+        "_owns_tree",
+        "_tag_index",
+        "_tag_index_revision",
+        "_leaf_index",
+        "_last_step",
+        "_checkpoint",
+        "_revision",
+    )
+
+    def __init__(self, method_definition: Mapping[str, str], backend: str = "string"):
         """
         Initialize the EmpowerModuleMethod.
 
@@ -40,9 +204,36 @@ class EmpowerModuleMethod:
             least an xml key. If it is not present, the EmpowerModuleMethod can still be
             created, but no changes can be made to the method, and no values can be
             extracted.
+        :param backend: How the xml is stored. "string" (default) stores it as a
+            string, "tree" parses it into a tree, which is faster when many values are
+            read and set by key.
         """
-        self.original_method = DataModel(method_definition, mutable=False)
-        self._change_list: List[Tuple[str, str]] = []
+        if backend not in ("string", "tree"):
+            raise ValueError(f"Unknown backend {backend}, must be 'string' or 'tree'.")
+        self.backend = backend
+        self.original_method = DataModel.immutable(method_definition)
+        self._tree: Optional[XmlTree] = None
+        self._owns_tree = True  # False if the tree is shared with a copy
+        if backend == "tree" and "nativeXml" in self.original_method:
+            self._tree = XmlTree(self.original_method["nativeXml"])
+        self._tag_index: Optional[TagOffsetIndex] = None
+        self._tag_index_revision: Optional[int] = None
+        self._leaf_index: Optional[Tuple[int, Optional[LeafIndex]]] = None
+        self._last_step: Optional[_UndoStep] = None
+        # The xml is kept after each step, so the current xml is available without
+        # applying all changes, and undoing a step is just going back to the previous
+        # xml.
+        self._checkpoint: Optional[_UndoStep] = None  # Never folded into a later step
+        self._revision = next(_revision_counter)
+
+    @property
+    def _xml(self) -> Optional[str]:
+        """The xml of the current method. None if the method has no xml."""
+        if self._tree is not None:
+            return self._tree.xml
+        if self._last_step is not None:
+            return self._last_step.xml
+        return self.original_method.get("nativeXml")
 
     def replace(self, original: str, new: str) -> None:
         """
@@ -51,39 +242,345 @@ class EmpowerModuleMethod:
         :param original: The string to replace.
         :param new: The string to replace it with.
         """
+        self._replace(original, new)
+
+    def _replace(
+        self, original: str, new: str, keys: Optional[Tuple[str, ...]] = None
+    ) -> None:
+        self._warn_about_decimals(new)
+        xml = self._xml
+        if xml is not None:
+            num_replaced = xml.count(original)
+            if num_replaced == 0:
+                warnings.warn(
+                    f"Could not find {original} in {self.original_method}, no changes "
+                    "made to method."
+                )
+            else:
+                logger.debug(
+                    "Replaced %s instances of %s with %s", num_replaced, original, new
+                )
+            if self._tree is not None:
+                # Always changes the tree, so undo matches the change list
+                self._writable_tree().replace(original, new)
+            else:
+                xml = xml.replace(original, new)
+        self._record_changes([(original, new)], xml, keys)
+
+    @staticmethod
+    def _warn_about_decimals(new: str) -> None:
         if re.search(r"\.\d{8}", new):
             warnings.warn(
                 f"The value {new} seems to contain a numerical value with more than 7 "
                 "digits after the decimal point. Empower might interpret that wrong."
             )
-        self._change_list.append((original, new))
+
+    def _record_changes(
+        self,
+        changes: List[Tuple[str, str]],
+        xml: Optional[str],
+        keys: Optional[Tuple[str, ...]] = None,
+    ) -> None:
+        """
+        Record changes that are undone together, and the xml after the changes.
+
+        If the changes set the same keys as the last step, and the last step was made
+        by this method after the last checkpoint or copy, they are folded into the last
+        step.
+
+        :param keys: The key set by each change, or None if a string was replaced.
+        """
+        if self._tree is not None:
+            xml = None  # The tree keeps track of its own changes
+        last_step = self._last_step
+        if (
+            keys is not None
+            and last_step is not None
+            and last_step.keys == keys
+            and last_step is not self._checkpoint
+            and (self._tree is None or self._tree.merge_last(len(keys)))
+        ):
+            changes = [
+                (original, new)
+                for (original, _), (_, new) in zip(last_step.changes, changes)
+            ]
+            last_step = last_step.previous
+        self._last_step = _UndoStep(last_step, tuple(changes), xml, keys)
+        self._revision = next(_revision_counter)
+
+    def checkpoint(self) -> ModuleMethodCheckpoint:
+        """
+        Make sure `undo` can go back to the current state. Changes made after the
+        checkpoint are not folded into the changes made before it.
+
+        :return: The current state, which the method can be rolled back to with
+            `rollback`.
+        """
+        self._checkpoint = self._last_step
+        return ModuleMethodCheckpoint(self._last_step, self._revision)
+
+    def rollback(self, checkpoint: ModuleMethodCheckpoint) -> None:
+        """
+        Go back to the state of a checkpoint. With the "string" backend, the changes
+        are not undone one by one. With the "tree" backend, the steps made after the
+        checkpoint are undone on the tree, or if the checkpoint is not in the history of
+        this method, the changes up to the checkpoint are made on a new tree.
+
+        :param checkpoint: A checkpoint from `checkpoint` of this method or a copy of
+            it.
+        """
+        if self._tree is not None:
+            steps = self._steps_since(checkpoint.last_step)
+            if steps is None:
+                self._tree = self._replayed_tree(checkpoint.last_step)
+                self._owns_tree = True
+            elif steps:
+                tree = self._writable_tree()
+                for step in steps:
+                    for _ in step.changes:
+                        tree.undo()
+        self._last_step = self._checkpoint = checkpoint.last_step
+        # The state is the same as when the checkpoint was made, so values cached for
+        # that revision are still valid.
+        self._revision = checkpoint.revision
+
+    def revert(self) -> None:
+        """Undo all changes made to the method."""
+        if self._last_step is None:
+            return
+        self._last_step = self._checkpoint = None
+        if self._tree is not None:
+            self._tree = XmlTree(self.original_method["nativeXml"])
+            self._owns_tree = True
+        self._revision = next(_revision_counter)
 
     def undo(self) -> None:
-        """Undo the last change made to the method."""
-        self._change_list.pop()
+        """
+        Undo the last change made to the method, or the last call to `update`. Changes
+        of the same keys made in a row since the last checkpoint are undone together.
+        """
+        if self._last_step is None:
+            raise IndexError("pop from empty list")  # The error from undoing a list
+        if self._tree is not None:
+            tree = self._writable_tree()
+            for _ in self._last_step.changes:
+                tree.undo()
+        self._last_step = self._last_step.previous
+        self._revision = next(_revision_counter)
+
+    @property
+    def _change_list(self) -> List[Tuple[str, str]]:
+        """All changes made to the method, in the order they were made."""
+        steps = []
+        step = self._last_step
+        while step is not None:
+            steps.append(step)
+            step = step.previous
+        return [change for step in reversed(steps) for change in step.changes]
+
+    def _steps_since(self, last_step: Optional[_UndoStep]) -> Optional[List[_UndoStep]]:
+        """
+        The steps made after `last_step`, newest first, or None if `last_step` is not
+        in the history of the method, e.g. because it has been undone.
+        """
+        steps = []
+        step = self._last_step
+        while step is not last_step:
+            if step is None:
+                return None
+            steps.append(step)
+            step = step.previous
+        return steps
+
+    def _replayed_tree(self, last_step: Optional[_UndoStep]) -> XmlTree:
+        """A tree of the original xml with the changes up to and including a step."""
+        steps = []
+        while last_step is not None:
+            steps.append(last_step)
+            last_step = last_step.previous
+        tree = XmlTree(self.original_method["nativeXml"])
+        for step in reversed(steps):
+            if step.keys is None:
+                for original, new in step.changes:
+                    tree.replace(original, new)
+                continue
+            for key, (_, new) in zip(step.keys, step.changes):
+                tree[key] = new[len(f"<{key}>") : -len(f"</{key}>")]
+        return tree
+
+    def _writable_tree(self) -> XmlTree:
+        """The tree, copied first if it is shared with a copy of the method."""
+        if not self._owns_tree:
+            self._tree = deepcopy(self._tree)
+            self._owns_tree = True
+        return self._tree
 
-    # If this property method is called often, there could be performance issues. In
-    # that case, consider cahcing the result with `@functools.lru_cahce(maxsize=1)`. You
-    # also need to implement a `__hash__` method and an `__eq__` method for this to
-    # work.
     @property
     def current_method(self) -> DataModel:
         """The current method definition, including the changes that have been made."""
-        logger.debug(
-            "Applying changes to method of type %s to create current method", type(self)
-        )
-        return self.alter_method(self.original_method, self._change_list)
+        method = DataModel(self.original_method)
+        if "nativeXml" not in method:
+            if self._last_step is not None:
+                raise ValueError(
+                    "Cannot apply changes to method, no xml key in method definition."
+                )
+            return method
+        method["nativeXml"] = self._xml
+        return method
 
     def __getitem__(self, key: str) -> str:
-        try:
-            xml = self.current_method["nativeXml"]
-        except KeyError as ex:
-            raise KeyError("No xml found in method definition") from ex
-        return self.find_value(xml, key)
+        if self._tree is not None:
+            return self._tree[key]
+        xml = self._xml
+        if xml is None:
+            raise KeyError("No xml found in method definition")
+        if self._tag_index_revision != self._revision:
+            # Searching is faster than building the index for a single read, so the
+            # index is only built when the same xml is read again.
+            self._tag_index = None
+            self._tag_index_revision = self._revision
+            return self.find_value(xml, key)
+        return self._index[key]
+
+    @property
+    def _index(self) -> TagOffsetIndex:
+        """Index of the tags in the current xml, which is kept until the next change."""
+        if self._tag_index is None or self._tag_index_revision != self._revision:
+            self._tag_index = TagOffsetIndex(self._xml)
+            self._tag_index_revision = self._revision
+        return self._tag_index
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, str]:
+        """
+        Get the values of several keys in the xml of the current method, with one pass
+        over the xml.
+
+        :param keys: The keys to get the values of.
+        :return: A dict with the value of each key.
+        :raises KeyError: If a key is not found, or the method has no xml.
+        :raises ValueError: If a key is found more than once.
+        """
+        return {key: self[key] for key in keys}
+
+    def _leaves(self) -> Optional[LeafIndex]:
+        """Index of the values in the current xml by path. None if there is no xml."""
+        if self._leaf_index is None or self._leaf_index[0] != self._revision:
+            xml = self._xml
+            self._leaf_index = (self._revision, None if xml is None else LeafIndex(xml))
+        return self._leaf_index[1]
+
+    def _leaf_values(self) -> Dict[str, str]:
+        """The values in the current xml by path, see `LeafIndex`."""
+        leaves = self._leaves()
+        return {} if leaves is None else leaves.values
+
+    def _same_as(self, other: "EmpowerModuleMethod") -> bool:
+        """Whether the current method is known to be the same as another."""
+        if (
+            other.original_method is self.original_method
+            and other._last_step is self._last_step
+        ):
+            return True  # E.g. a copy that hasn't been changed since it was made
+        return other._xml == self._xml
+
+    def diff(
+        self, other: "EmpowerModuleMethod"
+    ) -> Dict[str, Tuple[Optional[str], Optional[str]]]:
+        """
+        The values that are different in the current method of another module method,
+        e.g. `{"ChannelA/Wavelength": ("214", "254")}`. The values are found by the
+        path of the element in the xml, see `LeafIndex`, so e.g. the rows of a
+        gradient table are compared one by one. If the methods have the same elements,
+        only the part of the xml that is different is compared.
+
+        :param other: The module method to compare with.
+        :return: The value in this method and in the other method of each path with
+            different values. The value is None if the path is not in a method.
+        """
+        if self._same_as(other):
+            return {}
+        leaves, other_xml = self._leaves(), other._xml
+        if leaves is not None and other_xml is not None:
+            differences = leaves.diff(other_xml)
+            if differences is not None:
+                return differences
+        values = self._leaf_values()
+        other_values = other._leaf_values()
+        differences = {
+            path: (value, other_values.get(path))
+            for path, value in values.items()
+            if other_values.get(path) != value
+        }
+        for path, other_value in other_values.items():
+            if path not in values:
+                differences[path] = (None, other_value)
+        return differences
 
     def __setitem__(self, key: str, value: str) -> None:
         current_value = self[key]
-        self.replace(f"<{key}>{current_value}</{key}>", f"<{key}>{value}</{key}>")
+        change = (f"<{key}>{current_value}</{key}>", f"<{key}>{value}</{key}>")
+        if self._tree is None:
+            self._replace(*change, keys=(key,))
+            return
+        self._warn_about_decimals(str(value))
+        self._writable_tree()[key] = str(value)
+        self._record_changes([change], None, (key,))
+
+    def update(self, values: Mapping[str, Union[str, float]]) -> None:
+        """
+        Set the values of several keys in the xml of the current method, with one pass
+        over the xml. The changes are undone together by one call to `undo`.
+
+        :param values: The new value of each key.
+        :raises KeyError: If a key is not found, or the method has no xml. No changes
+            are made.
+        :raises ValueError: If a key is found more than once, or the value of a key
+            contains another of the keys. No changes are made.
+        """
+        if self._xml is None:
+            raise KeyError("No xml found in method definition")
+        current_values = self.get_many(values)
+        self._check_not_nested(values, current_values)
+        changes = []
+        for key, value in values.items():
+            self._warn_about_decimals(str(value))
+            changes.append(
+                (
+                    f"<{key}>{current_values[key]}</{key}>",
+                    f"<{key}>{value}</{key}>",
+                )
+            )
+        if self._tree is not None:
+            tree = self._writable_tree()
+            for key, value in values.items():
+                tree[key] = str(value)
+            self._record_changes(changes, None, tuple(values))
+            return
+        spans = sorted((*self._index.span(key), key) for key in values)
+        xml = self._xml
+        parts = []
+        position = 0
+        for start, end, key in spans:
+            parts.extend([xml[position:start], str(values[key])])
+            position = end
+        parts.append(xml[position:])
+        self._record_changes(changes, "".join(parts), tuple(values))
+
+    @staticmethod
+    def _check_not_nested(
+        values: Mapping[str, Union[str, float]], current_values: Mapping[str, str]
+    ) -> None:
+        """
+        Raise a ValueError if the current or new value of a key contains another of the
+        keys, as setting both would depend on the order they are set in.
+        """
+        for key, value in values.items():
+            for other_key in values:
+                tag = f"<{other_key}>"
+                if other_key != key and (
+                    tag in current_values[key] or tag in str(value)
+                ):
+                    raise ValueError(f"The value of {key} contains {other_key}")
 
     @staticmethod
     def find_value(xml: str, key: str) -> str:
@@ -138,23 +635,27 @@ class EmpowerModuleMethod:
 
     @staticmethod
     def _round(value: Union[str, float], decimal_digits: int = 3) -> str:
-        try:
-            value = float(value)
-        except ValueError:
-            logger.debug("Could not convert %s to float, returning as is", value)
-            return value
-        rounded_value = round(value, decimal_digits)
-        if rounded_value != float(value):
+        rounded_value, unrounded_value = _round_value(value, decimal_digits)
+        if unrounded_value is not None:
             warnings.warn(
-                f"Rounding {value} to {rounded_value}, as Empower only "
+                f"Rounding {unrounded_value} to {rounded_value}, as Empower only "
                 f"accepts {decimal_digits} decimal(s)."
             )
-        return str(rounded_value)
+        return rounded_value
 
     def copy(self):
-        """Return a copy of the EmpowerModuleMethod."""
-        copy = type(self)(self.original_method)
-        copy._change_list = self._change_list.copy()
+        """
+        Return a copy of the EmpowerModuleMethod. The copy shares the original method
+        definition and the changes made so far with this method, so copying is fast
+        and the copy only uses memory for the changes made to it afterwards.
+        """
+        copy = shallow_copy(self)
+        # Changes made after copying are never folded into the shared steps, so undo
+        # in one of the methods only undoes its own changes
+        self._checkpoint = copy._checkpoint = self._last_step
+        if self._tree is not None:
+            # The tree is copied by whichever method is changed first
+            self._owns_tree = copy._owns_tree = False
         return copy
 
 
@@ -169,6 +670,8 @@ class ColumnOvenMethod(EmpowerModuleMethod):
     :meta private:
     """
 
+    __slots__ = ()
+
     column_temperature_key: str
 
     @property
@@ -186,6 +689,8 @@ class ColumnOvenMethod(EmpowerModuleMethod):
 class SampleManagerMethod(ColumnOvenMethod):
     """Class for module methods that control a sample manager."""
 
+    __slots__ = ()
+
     column_temperature_key = "ColumnTemperature"
 
     sample_temperature_key = "SampleTemperature"
@@ -203,9 +708,28 @@ class SampleManagerMethod(ColumnOvenMethod):
 class ColumnManagerMethod(ColumnOvenMethod):
     """Class for module methods that control a column manager."""
 
+    __slots__ = ()
+
     column_temperature_key = "SetColumnTemperature"
 
 
+class GradientStep(NamedTuple):
+    """
+    A row of a gradient table, with numbers instead of strings.
+
+    :ivar time: The time in minutes. 0 for the initial row.
+    :ivar flow: The flow in mL/min.
+    :ivar composition: The composition in % of each solvent line, in the order of
+        `solvent_lines` of the solvent manager method.
+    :ivar curve: The curve type (1-11). None for the initial row.
+    """
+
+    time: float
+    flow: float
+    composition: Tuple[float, ...]
+    curve: Optional[int]
+
+
 class SolventManagerMethod(EmpowerModuleMethod):
     """
     Parent class for module methods that control a solvent manager. Specific instrument
@@ -215,14 +739,23 @@ class SolventManagerMethod(EmpowerModuleMethod):
     Attributes in addition to the ones from EmpowerModuleMethod:
     :ivar valve_position: The current valve position for each solvent line.
     :ivar gradient_table: The gradient table for the method.
+    :ivar gradient_steps: The gradient table for the method, with numbers.
 
     :meta private:
     """
 
+    __slots__ = ("_gradient_table_cache", "_gradient_steps_cache")
+
     valve_tag_prefix: str
     valve_tag_suffix: str
     solvent_lines: List[str]
 
+    def __init__(self, method_definition: Mapping[str, str], backend: str = "string"):
+        super().__init__(method_definition, backend=backend)
+        # The parsed gradient table and the xml it was parsed from, see _gradient_rows
+        self._gradient_table_cache: Optional[tuple] = None
+        self._gradient_steps_cache: Optional[tuple] = None
+
     @property
     def valve_position(self) -> List[str]:
         """
@@ -230,10 +763,14 @@ class SolventManagerMethod(EmpowerModuleMethod):
         a list of strings. Each string should should be of the form `XY`, where `X`
         is the solvent line (A, B, C, D) and `Y` is the position (0-6).
         """
-        valve_position_list = [
-            line + self[self.valve_tag_prefix + line + self.valve_tag_suffix]
+        keys = [
+            self.valve_tag_prefix + line + self.valve_tag_suffix
             for line in self.solvent_lines
         ]
+        values = self.get_many(keys)
+        valve_position_list = [
+            line + values[key] for line, key in zip(self.solvent_lines, keys)
+        ]
         # Consider removing the ones that have position 0,
         # to make QSM methods easier to read.
         return valve_position_list
@@ -243,15 +780,31 @@ class SolventManagerMethod(EmpowerModuleMethod):
 
     @valve_position.setter
     def valve_position(self, value: List[str]) -> None:
+        new_values = {}
         for position in value:
             if position[0] not in self.solvent_lines:
                 raise ValueError(
                     f"Invalid valve position {position}, "
                     f"must start with one of {self.solvent_lines}"
                 )
-            self[
+            new_values[
                 self.valve_tag_prefix + position[0] + self.valve_tag_suffix
             ] = position[1:]
+        self.update(new_values)
+
+    def _gradient_rows(self) -> Tuple[Tuple[Tuple[str, str], ...], ...]:
+        """
+        The fields of each row in the gradient table. The parsed table is cached, and
+        only parsed again when the xml of the gradient table has changed.
+        """
+        cache = self._gradient_table_cache
+        if cache is not None and cache[0] == self._revision:
+            return cache[2]
+        gradient_xml = self["GradientTable"]
+        if cache is None or cache[1] != gradient_xml:
+            cache = (self._revision, gradient_xml, decode_gradient_table(gradient_xml))
+        self._gradient_table_cache = (self._revision, *cache[1:])
+        return cache[2]
 
     @property
     def gradient_table(self) -> List[Dict[str, str]]:
@@ -267,24 +820,46 @@ class SolventManagerMethod(EmpowerModuleMethod):
         When setting, values can be strings or numbers. Floats will be rounded to 3
         decimals, as Empower has problems with too many decimals. The exception is
         value(s) for 'Curve', which is assumed to be integers and will not be rounded.
+        A `GradientTable` can also be set.
         """
-        gradient_table = []
-        e_tree = ET.fromstring(f"<root>{self['GradientTable']}</root>")
-        for gradient_row in e_tree:
-            if gradient_row.tag != "GradientRow":
-                raise ValueError(
-                    f"Expected GradientRow, got {gradient_row.tag} instead."
+        return [dict(row) for row in self._gradient_rows()]
+
+    @property
+    def gradient_steps(self) -> Tuple[GradientStep, ...]:
+        """
+        The gradient table for the method, with a GradientStep for each row. Unlike
+        `gradient_table`, the steps are shared between calls, so reading them several
+        times is fast.
+        """
+        gradient_rows = self._gradient_rows()
+        cache = self._gradient_steps_cache
+        if cache is None or cache[0] is not gradient_rows:
+            steps = []
+            for row in gradient_rows:
+                row_dict = dict(row)
+                time, curve = row_dict["Time"], row_dict.get("Curve", "Initial")
+                steps.append(
+                    GradientStep(
+                        time=0.0 if time == "Initial" else float(time),
+                        flow=float(row_dict["Flow"]),
+                        composition=tuple(
+                            float(row_dict[f"Composition{line}"])
+                            for line in self.solvent_lines
+                        ),
+                        curve=None if curve == "Initial" else int(curve),
+                    )
                 )
-            row_dict = {}
-            for field in gradient_row:
-                row_dict[field.tag] = field.text
-            gradient_table.append(row_dict)
-        return gradient_table
+            cache = (gradient_rows, tuple(steps))
+            self._gradient_steps_cache = cache
+        return cache[1]
 
     @gradient_table.setter
     def gradient_table(
         self, new_gradient_table: List[Dict[str, Union[str, float, int]]]
     ) -> None:
+        if hasattr(new_gradient_table, "to_dicts"):
+            # A GradientTable, which is not imported here, as it needs NumPy
+            new_gradient_table = new_gradient_table.to_dicts()
         for i, gradient_row in enumerate(new_gradient_table[1:]):
             if gradient_row["Time"] == "Initial":
                 raise ValueError(
@@ -309,28 +884,16 @@ class SolventManagerMethod(EmpowerModuleMethod):
                     f"got {new_gradient_table[0]['Time']}."
                 )
         new_gradient_table[0]["Curve"] = "Initial"
-        xml = ET.Element("GradientTable")
-        for row in new_gradient_table:
-            row_xml = ET.SubElement(xml, "GradientRow")
-            curve = row.get("Curve", "6")
-            # "6" is linear, which covers 90% of the use cases
-            ET.SubElement(row_xml, "Time").text = self._round(row["Time"])
-            ET.SubElement(row_xml, "Flow").text = self._round(row["Flow"])
-            for line in self.solvent_lines:
-                line_name = f"Composition{line}"
-                ET.SubElement(row_xml, line_name).text = self._round(row[line_name])
-            ET.SubElement(row_xml, "Curve").text = str(curve)
-            # Consider validating curve (1-11)
-        gradient_xml = ET.tostring(xml, encoding="unicode")
-        gradient_xml = gradient_xml.replace("<GradientTable>", "").replace(
-            "</GradientTable>", ""
-        )  # Stripping root tag, as it is set by __setitem__()
-        self["GradientTable"] = gradient_xml
+        self["GradientTable"] = encode_gradient_table(
+            new_gradient_table, self.solvent_lines
+        )
 
 
 class BSMMethod(SolventManagerMethod):
     """Class for module methods that control a binary solvent manager (BSM)."""
 
+    __slots__ = ()
+
     valve_tag_prefix = "FlowSource"
     valve_tag_suffix = ""
     solvent_lines = ["A", "B"]
@@ -339,6 +902,8 @@ class BSMMethod(SolventManagerMethod):
 class QSMMethod(SolventManagerMethod):
     """Class for module methods that control a quaternary solvent manager (QSM)."""
 
+    __slots__ = ()
+
     valve_tag_prefix = "SolventSelectionValve"
     valve_tag_suffix = "Position"
     solvent_lines = ["A", "B", "C", "D"]
@@ -0,0 +1,195 @@
+import concurrent.futures
+import json
+import logging
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from .empower_api_core import EmpowerConnection
+
+logger = logging.getLogger(__name__)
+
+
+class PlannedOperation(NamedTuple):
+    """
+    A post to Empower that has been recorded in an execution plan.
+
+    :ivar operation: Name of the EmpowerHandler method that recorded the operation.
+    :ivar endpoint: The endpoint to post to.
+    :ivar body: The body to post.
+    :ivar timeout: The timeout of the post. If None, the default timeout is used.
+    :ivar provides: The Empower object created by the operation, e.g.
+        "InstrumentMethod:my_method", or None if it creates nothing that other
+        operations can depend on.
+    :ivar requires: The Empower objects that must exist before the operation is run.
+    """
+
+    operation: str
+    endpoint: str
+    body: Any
+    timeout: Optional[int] = None
+    provides: Optional[str] = None
+    requires: Tuple[str, ...] = ()
+
+
+class ExecutionPlan:
+    """
+    A list of posts to Empower, that can be reviewed, saved and executed later.
+
+    Plans are recorded with `EmpowerHandler.record_plan` and executed with
+    `EmpowerHandler.ExecutePlan`. When executed, operations are run in order of their
+    dependencies, e.g. an instrument method is posted before the method set method using
+    it, and independent operations are posted concurrently.
+
+    :ivar operations: The recorded operations, in the order they were recorded.
+    """
+
+    def __init__(self, operations: Iterable[PlannedOperation] = ()):
+        self.operations: List[PlannedOperation] = list(operations)
+
+    def add(
+        self,
+        operation: str,
+        endpoint: str,
+        body: Any,
+        timeout: Optional[int] = None,
+        provides: Optional[str] = None,
+        requires: Iterable[str] = (),
+    ) -> PlannedOperation:
+        """
+        Add an operation to the plan.
+
+        The body is copied through JSON, so later changes to the object posted do not
+        change the plan, and so the plan is guaranteed to be serialisable.
+        """
+        planned_operation = PlannedOperation(
+            operation=operation,
+            endpoint=endpoint,
+            body=json.loads(json.dumps(body)),
+            timeout=timeout,
+            provides=provides,
+            requires=tuple(requires),
+        )
+        logger.debug("Adding %s to plan", operation)
+        self.operations.append(planned_operation)
+        return planned_operation
+
+    def validate(self) -> List[str]:
+        """
+        Validate the plan without contacting Empower.
+
+        :raises ValueError: If the same Empower object is created more than once in the
+            plan, or if an operation requires an object that is created later in the
+            plan. In the latter case, the operations were recorded out of order, which
+            will also fail in Empower.
+
+        :return: The required objects that are not created by the plan. These must
+            exist in Empower before the plan is executed.
+        """
+        provided: Set[str] = set()
+        external: List[str] = []
+        all_provided = [op.provides for op in self.operations if op.provides]
+        duplicates = {name for name in all_provided if all_provided.count(name) > 1}
+        if duplicates:
+            raise ValueError(f"Objects created more than once in plan: {duplicates}")
+        for operation in self.operations:
+            for requirement in operation.requires:
+                if requirement in provided:
+                    continue
+                if requirement in all_provided:
+                    raise ValueError(
+                        f"{operation.operation} requires {requirement}, "
+                        "which is created later in the plan."
+                    )
+                if requirement not in external:
+                    external.append(requirement)
+            if operation.provides:
+                provided.add(operation.provides)
+        return external
+
+    def stages(self) -> List[List[PlannedOperation]]:
+        """
+        Group the operations into stages. The operations in a stage only depend on
+        operations in earlier stages, so they can be run concurrently.
+        """
+        self.validate()
+        stage_of: Dict[str, int] = {}
+        stages: List[List[PlannedOperation]] = []
+        for operation in self.operations:
+            stage = max(
+                (stage_of[req] + 1 for req in operation.requires if req in stage_of),
+                default=0,
+            )
+            if stage == len(stages):
+                stages.append([])
+            stages[stage].append(operation)
+            if operation.provides:
+                stage_of[operation.provides] = stage
+        return stages
+
+    def execute(self, connection: EmpowerConnection, max_workers: int = 4) -> None:
+        """
+        Post all operations in the plan to Empower.
+
+        :param connection: A logged in connection to Empower.
+        :param max_workers: The maximum number of concurrent posts.
+        :raises RuntimeError: If any operation fails. Operations in later stages are
+            not run in that case.
+        """
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as pool:
+            for stage_number, stage in enumerate(self.stages()):
+                logger.debug(
+                    "Executing stage %s with %s operations", stage_number, len(stage)
+                )
+                futures = [
+                    pool.submit(
+                        connection.post,
+                        endpoint=operation.endpoint,
+                        body=operation.body,
+                        timeout=operation.timeout,
+                    )
+                    for operation in stage
+                ]
+                errors = [
+                    (operation, future.exception())
+                    for operation, future in zip(stage, futures)
+                    if future.exception() is not None
+                ]
+                if errors:
+                    raise RuntimeError(
+                        f"{len(errors)} operation(s) failed in stage {stage_number}: "
+                        + "; ".join(
+                            f"{operation.operation} ({operation.provides}): {error}"
+                            for operation, error in errors
+                        )
+                    ) from errors[0][1]
+
+    def to_json(self) -> str:
+        """Serialise the plan to a JSON string."""
+        return json.dumps(
+            {"operations": [operation._asdict() for operation in self.operations]}
+        )
+
+    @classmethod
+    def from_json(cls, plan_json: str) -> "ExecutionPlan":
+        """Create a plan from a JSON string made by `to_json`."""
+        operations = json.loads(plan_json)["operations"]
+        return cls(
+            PlannedOperation(**{**operation, "requires": tuple(operation["requires"])})
+            for operation in operations
+        )
+
+    def save(self, path: str) -> None:
+        """Save the plan to a JSON file."""
+        with open(path, "w") as f:
+            f.write(self.to_json())
+
+    @classmethod
+    def load(cls, path: str) -> "ExecutionPlan":
+        """Load a plan from a JSON file made by `save`."""
+        with open(path) as f:
+            return cls.from_json(f.read())
+
+    def __len__(self) -> int:
+        return len(self.operations)
+
+    def __str__(self) -> str:
+        return f"{type(self).__name__} with {len(self)} operations"
@@ -1,6 +1,6 @@
 import logging
-from typing import Mapping
-from xml.etree import ElementTree as ET
+from functools import lru_cache
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple, Type
 
 from .empower_detector_module_method import FLRMethod, PDAMethod, TUVMethod
 from .empower_module_method import (
@@ -10,56 +10,97 @@ from .empower_module_method import (
     QSMMethod,
     SampleManagerMethod,
 )
+from .utils.xml_tree import root_tag
 
 logger = logging.getLogger(__name__)
 
+_module_names: Dict[str, Type[EmpowerModuleMethod]] = {}
+_module_patterns: List[Tuple[str, Type[EmpowerModuleMethod]]] = []
+# Patterns are checked in order, and newly registered patterns are checked first, so
+# they can override the built-in ones.
 
-def module_method_factory(  # noqa: C901 This method is allowed to be "complex"
-    method_definition: Mapping[str, str]
+
+def register_module_method(
+    module_class: Type[EmpowerModuleMethod],
+    patterns: Iterable[str] = (),
+    names: Iterable[str] = (),
+) -> None:
+    """
+    Register a module method class, so `module_method_factory` creates it for matching
+    module types. The module type is the name of the module method, or the root tag of
+    its xml if it has no name.
+
+    :param module_class: The class to create. Must be a subclass of
+        EmpowerModuleMethod.
+    :param patterns: The class is created for module types containing one of these.
+    :param names: The class is created for module types that are exactly one of these.
+        Names are checked before patterns.
+    """
+    if not issubclass(module_class, EmpowerModuleMethod):
+        raise TypeError(f"{module_class} is not a subclass of EmpowerModuleMethod")
+    for name in names:
+        _module_names[name] = module_class
+    _module_patterns[0:0] = [(pattern, module_class) for pattern in patterns]
+    _match_pattern.cache_clear()
+
+
+@lru_cache(maxsize=1024)
+def _match_pattern(module_type: str) -> Optional[Type[EmpowerModuleMethod]]:
+    for pattern, module_class in _module_patterns:
+        if pattern in module_type:
+            return module_class
+    return None
+
+
+def module_class_for(module_type: str) -> Type[EmpowerModuleMethod]:
+    """
+    The module method class registered for a module type. If no class is registered,
+    EmpowerModuleMethod is returned.
+    """
+    try:
+        return _module_names[module_type]
+    except KeyError:
+        return _match_pattern(module_type) or EmpowerModuleMethod
+
+
+# Registered in reverse order, so the first ones are checked first
+register_module_method(PDAMethod, patterns=["AcquityPDA", "ACQ-PDA"])
+register_module_method(TUVMethod, patterns=["AcquityTUV", "ACQ-TUV"])
+register_module_method(FLRMethod, patterns=["AcquityFLR", "ACQ-FLR"])
+register_module_method(QSMMethod, patterns=["AcquityQSM", "ACQ-QSM"])
+register_module_method(BSMMethod, patterns=["AcquityBSM", "ACQ-BSM"])
+register_module_method(ColumnManagerMethod, patterns=["AcquityCM", "ACQ-CM"])
+register_module_method(SampleManagerMethod, patterns=["FTN", "AcquitySM"])
+
+
+def module_method_factory(
+    method_definition: Mapping[str, str], backend: str = "string"
 ) -> EmpowerModuleMethod:
     """
     Factory function for creating an EmpowerModuleMethod from a method definition. The
     method definition should contain at least a name key, which is used to determine
-    which subclass should be created. If the name key is not present or the name is not
-    recognized, a generic EmpowerModuleMethod will be created.
+    which subclass should be created, see `register_module_method`. If the name key is
+    not present, the root tag of the xml is used instead. If neither is present or the
+    module type is not recognized, a generic EmpowerModuleMethod will be created.
+
+    The backend is passed on to the EmpowerModuleMethod, see its documentation.
     """
-    try:
-        try:
-            module_type = method_definition["name"]
-        except KeyError:
-            tree = ET.fromstring(method_definition["nativeXml"])
-            module_type = tree.tag
-        if "FTN" in module_type or "AcquitySM" in module_type:
-            logger.debug("Creating SampleManagerMethod")
-            return SampleManagerMethod(method_definition)
-        if "AcquityCM" in module_type or "ACQ-CM" in module_type:
-            logger.debug("Creating ColumnManagerMethod")
-            return ColumnManagerMethod(method_definition)
-        if "AcquityBSM" in module_type or "ACQ-BSM" in module_type:
-            logger.debug("Creating BSMMethod")
-            return BSMMethod(method_definition)
-        if "AcquityQSM" in module_type or "ACQ-QSM" in module_type:
-            logger.debug("Creating QSMMethod")
-            return QSMMethod(method_definition)
-        if "AcquityFLR" in module_type or "ACQ-FLR" in module_type:
-            logger.debug("Creating FLRMethod")
-            return FLRMethod(method_definition)
-        if "AcquityTUV" in module_type or "ACQ-TUV" in module_type:
-            logger.debug("Creating TUVMethod")
-            return TUVMethod(method_definition)
-        if "AcquityPDA" in module_type or "ACQ-PDA" in module_type:
-            logger.debug("Creating PDAMethod")
-            return PDAMethod(method_definition)
-        # Add more cases as they are coded
-        else:
-            logger.debug(
-                "Unknown module method: %s, creating a generic EmpowerModuleMethod",
-                module_type,
-            )  # The error is always caught, so we use the debug level here.
-            raise ValueError(f"Unknown module method: {method_definition['name']}")
-    except (KeyError, ValueError) as e:
-        if isinstance(e, KeyError):
-            # If the name key is not present, we don't know what to do with it, but we
-            # can still create a generic EmpowerModuleMethod and just return that.
-            logger.debug("KeyError: %s, creating a generic EmpowerModuleMethod", e)
-        return EmpowerModuleMethod(method_definition)
+    module_class = module_class_for_definition(method_definition)
+    logger.debug("Creating %s", module_class.__name__)
+    return module_class(method_definition, backend=backend)
+
+
+def module_class_for_definition(
+    method_definition: Mapping[str, str]
+) -> Type[EmpowerModuleMethod]:
+    """
+    The module method class `module_method_factory` creates for a method definition,
+    without creating it.
+    """
+    module_type = method_definition.get("name")
+    if module_type is None:
+        module_type = root_tag(method_definition.get("nativeXml", ""))
+    if module_type is None:
+        logger.debug("No module type found in method definition")
+        return EmpowerModuleMethod
+    return module_class_for(module_type)
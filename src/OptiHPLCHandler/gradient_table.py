@@ -0,0 +1,253 @@
+from typing import Dict, List, Mapping, Optional, Sequence, Union
+
+from .empower_module_method import decode_gradient_table, encode_gradient_table
+
+try:
+    import numpy as np
+except ImportError as error:
+    raise ImportError(
+        "GradientTable needs NumPy. Install it with "
+        "`pip install Opti-HPLC-Handler[gradient]`."
+    ) from error
+
+INITIAL_CURVE = 0
+# Curves are 1-11 in Empower, so 0 is used for the "Initial" curve of the first row,
+# like in `plotting.gradient_utils.standardise_gradient_table_types`.
+
+
+class GradientTable:
+    """
+    Gradient table with a NumPy array for each column, so the whole table can be
+    changed at once instead of row by row.
+
+    The time of the first row is 0 and its curve is 0, which are "Initial" in Empower.
+    The methods that change the table return a new table, and leave the table
+    unchanged.
+
+    A GradientTable can be set as the gradient table of a solvent manager method or an
+    instrument method, e.g. `method.gradient_table = table`.
+
+    :ivar time: The time of each row in minutes.
+    :ivar flow: The flow of each row in mL/min.
+    :ivar composition: The composition in % of each solvent line, e.g. {"A": ...}.
+    :ivar curve: The curve type of each row (1-11, 0 for the first row).
+    """
+
+    def __init__(
+        self,
+        time: Sequence[float],
+        flow: Sequence[float],
+        composition: Mapping[str, Sequence[float]],
+        curve: Optional[Sequence[int]] = None,
+    ):
+        """
+        Initialize the GradientTable.
+
+        :param time: The time of each row in minutes.
+        :param flow: The flow of each row in mL/min.
+        :param composition: The composition in % of each solvent line, e.g.
+            {"A": [95, 5], "B": [5, 95]}.
+        :param curve: The curve type of each row. If None, the curve is 6 (linear) for
+            all rows but the first.
+        :raises ValueError: If the columns don't have the same length.
+        """
+        self.time = np.asarray(time, dtype=float)
+        self.flow = np.asarray(flow, dtype=float)
+        self.composition: Dict[str, np.ndarray] = {
+            line: np.asarray(values, dtype=float)
+            for line, values in composition.items()
+        }
+        if curve is None:
+            curve = np.full(len(self.time), 6)
+            if len(curve) > 0:
+                curve[0] = INITIAL_CURVE
+        self.curve = np.asarray(curve, dtype=int)
+        lengths = {
+            len(column)
+            for column in [self.time, self.flow, self.curve, *self.composition.values()]
+        }
+        if len(lengths) > 1:
+            raise ValueError(
+                "All columns of a gradient table must have the same length"
+            )
+
+    @property
+    def solvent_lines(self) -> List[str]:
+        """The solvent lines in the table, e.g. ["A", "B"]."""
+        return list(self.composition)
+
+    def __len__(self) -> int:
+        return len(self.time)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, GradientTable):
+            return NotImplemented
+        return (
+            self.solvent_lines == other.solvent_lines
+            and np.array_equal(self.time, other.time)
+            and np.array_equal(self.flow, other.flow)
+            and np.array_equal(self.curve, other.curve)
+            and all(
+                np.array_equal(self.composition[line], other.composition[line])
+                for line in self.solvent_lines
+            )
+        )
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.to_dicts()})"
+
+    def _rows(self, index: Union[slice, np.ndarray]) -> "GradientTable":
+        return GradientTable(
+            self.time[index],
+            self.flow[index],
+            {line: values[index] for line, values in self.composition.items()},
+            self.curve[index],
+        )
+
+    @classmethod
+    def from_dicts(
+        cls, gradient_table: Sequence[Mapping[str, Union[str, float]]]
+    ) -> "GradientTable":
+        """
+        Make a GradientTable from the list of dicts used by `gradient_table` of a
+        solvent manager method. The curve of the first row is always "Initial", like
+        when the table is set on a method.
+        """
+        lines = [
+            key[len("Composition") :]
+            for key in gradient_table[0]
+            if key.startswith("Composition")
+        ]
+        return cls(
+            time=[
+                0.0 if row["Time"] == "Initial" else float(row["Time"])
+                for row in gradient_table
+            ],
+            flow=[float(row["Flow"]) for row in gradient_table],
+            composition={
+                line: [float(row[f"Composition{line}"]) for row in gradient_table]
+                for line in lines
+            },
+            curve=[
+                INITIAL_CURVE if index == 0 or curve == "Initial" else int(curve)
+                for index, curve in enumerate(
+                    row.get("Curve", "6") for row in gradient_table
+                )
+            ],
+        )
+
+    def to_dicts(self) -> List[Dict[str, str]]:
+        """
+        The table as the list of dicts used by `gradient_table` of a solvent manager
+        method. Numbers are written with as few digits as possible without changing
+        their value.
+        """
+        rows = []
+        for index in range(len(self)):
+            initial = index == 0 and self.time[0] == 0
+            row = {
+                "Time": "Initial" if initial else repr(float(self.time[index])),
+                "Flow": repr(float(self.flow[index])),
+            }
+            for line, values in self.composition.items():
+                row[f"Composition{line}"] = repr(float(values[index]))
+            curve = int(self.curve[index])
+            row["Curve"] = "Initial" if curve == INITIAL_CURVE else str(curve)
+            rows.append(row)
+        return rows
+
+    @classmethod
+    def from_xml(cls, xml: str) -> "GradientTable":
+        """
+        Make a GradientTable from the xml of a gradient table in Empower, i.e. the
+        GradientRow elements inside the GradientTable element. The xml is read like the
+        gradient table of a solvent manager method, see `decode_gradient_table`.
+        """
+        return cls.from_dicts([dict(row) for row in decode_gradient_table(xml)])
+
+    def to_xml(self) -> str:
+        """
+        The xml of the table in Empower, i.e. the GradientRow elements inside the
+        GradientTable element. Values are rounded like when the table is set on a
+        method, see `encode_gradient_table`.
+        """
+        return encode_gradient_table(self.to_dicts(), self.solvent_lines)
+
+    def scale_time(self, factor: float) -> "GradientTable":
+        """Return a table with all times multiplied by `factor`."""
+        table = self._rows(slice(None))
+        table.time = self.time * factor
+        return table
+
+    def shift_composition(self, line: str, shift: float) -> "GradientTable":
+        """
+        Return a table where the composition of a solvent line is changed by `shift`
+        percentage points in all rows, limited to 0-100 %. The other lines are scaled
+        so the composition still adds up to the same total, keeping their ratio.
+
+        :raises ValueError: If the other lines are 0 in a row, so they can't be scaled.
+        """
+        new_line = np.clip(self.composition[line] + shift, 0, 100)
+        total = sum(self.composition.values())
+        other_total = total - self.composition[line]
+        remaining = total - new_line
+        if np.any((other_total == 0) & (remaining != 0)):
+            raise ValueError(
+                f"Can't shift line {line}, the other lines are 0 in some rows."
+            )
+        with np.errstate(divide="ignore", invalid="ignore"):
+            scale = np.where(other_total == 0, 0, remaining / other_total)
+        table = self._rows(slice(None))
+        table.composition = {
+            other: (new_line if other == line else self.composition[other] * scale)
+            for other in self.composition
+        }
+        return table
+
+    def insert(
+        self,
+        time: float,
+        flow: float,
+        composition: Mapping[str, float],
+        curve: int = 6,
+    ) -> "GradientTable":
+        """
+        Return a table with a row added at `time`, after any rows with the same time.
+        """
+        index = int(np.searchsorted(self.time, time, side="right"))
+        return GradientTable(
+            np.insert(self.time, index, time),
+            np.insert(self.flow, index, flow),
+            {
+                line: np.insert(values, index, composition[line])
+                for line, values in self.composition.items()
+            },
+            np.insert(self.curve, index, curve),
+        )
+
+    def delete(self, index: Union[int, Sequence[int], slice]) -> "GradientTable":
+        """
+        Return a table without the row(s) at `index`. If the first row is deleted, the
+        times are moved so the new first row is at 0, see `window`.
+        """
+        keep = np.ones(len(self), dtype=bool)
+        keep[index] = False
+        return self._rows(keep)._from_zero()
+
+    def window(self, start: float, end: float) -> "GradientTable":
+        """
+        Return a table with the rows with a time from `start` to `end`. The times are
+        moved so the first of these rows is at 0, and its curve is 0, as Empower only
+        accepts tables that start at "Initial".
+        """
+        return self._rows((self.time >= start) & (self.time <= end))._from_zero()
+
+    def _from_zero(self) -> "GradientTable":
+        """The table with the first row at time 0 and with curve 0."""
+        if len(self) == 0:
+            return self
+        table = self._rows(slice(None))
+        table.time = self.time - self.time[0]
+        table.curve = self.curve.copy()
+        table.curve[0] = INITIAL_CURVE
+        return table
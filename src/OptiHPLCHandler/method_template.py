@@ -0,0 +1,117 @@
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple, Union
+
+from .utils.data_types import EmpowerInstrumentMethodModel as DataModel
+from .utils.data_types import EmpowerModuleMethodModel
+from .utils.xml_tree import TagOffsetIndex
+
+
+class MethodTemplate:
+    """
+    An instrument method where the values of some parameters are filled in later, so
+    many variants of the method can be made quickly, e.g.
+    `template.render({"SetColumnTemperature": "45.0"}, method_name="Variant 1")`.
+
+    The xml of each module method is split at the values of the parameters when the
+    template is made, so rendering a variant only joins strings, and doesn't search the
+    xml or apply changes.
+
+    :ivar parameters: The parameters that can be filled in.
+    :ivar defaults: The value of each parameter in the method the template was made
+        from, in the first module method it is found in. When no value is given for a
+        parameter, each module method keeps its own value.
+    """
+
+    __slots__ = ("parameters", "defaults", "_method", "_modules")
+
+    def __init__(self, method_definition: Mapping, parameters: Sequence[str]):
+        """
+        Initialize the MethodTemplate.
+
+        :param method_definition: The definition of an instrument method, e.g. the
+            current method of an EmpowerInstrumentMethod.
+        :param parameters: The keys in the xml of the module methods whose values can be
+            filled in. A key is filled in in every module method it is found in, like
+            the column temperature is set in all column ovens.
+        :raises KeyError: If a parameter is not found in any module method.
+        :raises ValueError: If a parameter is found more than once in a module method,
+            or the value of a parameter contains another parameter.
+        """
+        self.parameters = tuple(parameters)
+        self.defaults: Dict[str, str] = {}
+        self._method = dict(method_definition)
+        # For each module method, the definition, and if it has parameters, the xml
+        # split at the values of the parameters, and the parameter of each value. The
+        # parts of the xml where the values go hold the values in the module method.
+        self._modules: List[
+            Tuple[Mapping[str, str], Optional[Tuple[List[str], Tuple[str, ...]]]]
+        ] = [
+            (module, self._split(module.get("nativeXml")))
+            for module in method_definition["modules"]
+        ]
+        missing = set(self.parameters) - set(self.defaults)
+        if missing:
+            raise KeyError(f"Could not find keys {sorted(missing)}")
+
+    def _split(self, xml: Optional[str]) -> Optional[Tuple[List[str], Tuple[str, ...]]]:
+        """Split an xml at the values of the parameters, and note their values."""
+        if xml is None:
+            return None
+        index = TagOffsetIndex(xml)
+        spans = []
+        for parameter in self.parameters:
+            try:
+                start, end = index.span(parameter)
+            except KeyError:
+                continue  # Not in this module method
+            spans.append((start, end, parameter))
+            self.defaults.setdefault(parameter, xml[start:end])
+        if not spans:
+            return None
+        spans.sort()
+        for (_, previous_end, previous_key), (start, _, key) in zip(spans, spans[1:]):
+            if start < previous_end:
+                raise ValueError(f"The value of {previous_key} contains {key}")
+        parts = []
+        position = 0
+        for start, end, _ in spans:
+            parts.extend([xml[position:start], xml[start:end]])
+            position = end
+        parts.append(xml[position:])
+        return parts, tuple(parameter for _, _, parameter in spans)
+
+    def render(
+        self,
+        values: Mapping[str, Union[str, float]],
+        method_name: Optional[str] = None,
+    ) -> DataModel:
+        """
+        Make the method definition of a variant, which can e.g. be made into an
+        EmpowerInstrumentMethod and posted.
+
+        :param values: The value of each parameter. Parameters without a value keep
+            their value from the method the template was made from. The values are put
+            into the xml as they are, e.g. without rounding.
+        :param method_name: The name of the variant. If None, the name of the method
+            the template was made from is used.
+        :return: The method definition of the variant.
+        :raises KeyError: If a value is given for a key that isn't a parameter.
+        """
+        unknown = values.keys() - self.defaults.keys()
+        if unknown:
+            raise KeyError(f"{sorted(unknown)} are not parameters of the template")
+        values = {key: str(value) for key, value in values.items()}
+        modules = []
+        for module, split in self._modules:
+            module = EmpowerModuleMethodModel(module)
+            if split is not None:
+                parts, keys = split
+                parts = parts.copy()
+                for position, key in enumerate(keys):
+                    if key in values:
+                        parts[2 * position + 1] = values[key]
+                module["nativeXml"] = "".join(parts)
+            modules.append(module)
+        method = DataModel(self._method, modules=modules)
+        if method_name is not None:
+            method["methodName"] = method_name
+        return method
@@ -0,0 +1,359 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, ContextManager, Dict, List, NamedTuple, Optional
+
+import requests
+
+from .empower_api_core import EmpowerConnection
+from .utils.sqlite_connection import connect
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+
+
+def _is_transient(error: Exception) -> bool:
+    """Whether a post that failed with `error` may succeed if it is tried again."""
+    return isinstance(
+        error,
+        (
+            requests.exceptions.ConnectionError,
+            requests.exceptions.Timeout,
+            requests.exceptions.HTTPError,
+        ),
+    ) and EmpowerConnection._is_server_error(error)
+
+
+class JournalEntry(NamedTuple):
+    """
+    A post to Empower recorded in a post journal.
+
+    :ivar id: The position of the entry in the journal.
+    :ivar operation: Name of the EmpowerHandler method that recorded the post.
+    :ivar endpoint: The endpoint to post to.
+    :ivar body: The body to post.
+    :ivar timeout: The timeout of the post. If None, the default timeout is used.
+    :ivar status: "pending", "done" or "failed".
+    :ivar attempts: The number of times the post has been tried.
+    :ivar error: The error from the last failed attempt, or None.
+    """
+
+    id: int
+    operation: str
+    endpoint: str
+    body: Any
+    timeout: Optional[int]
+    status: str
+    attempts: int
+    error: Optional[str]
+
+
+class PostJournal:
+    """
+    Journal on disk of posts to Empower, which are sent in the background.
+
+    When a post is added to the journal, the call returns as soon as it is stored, and a
+    background thread posts the entries to Empower in the order they were added,
+    retrying posts that fail with a connection error or a server error. Posts that
+    Empower rejects, e.g. because the method already exists, are not retried. If the
+    process stops before all entries are posted, a new journal using the same file posts
+    the remaining entries when it is started. If an entry fails, no further entries are
+    posted, as they may depend on it, until `retry_failed` is called.
+
+    An entry with the same endpoint and body as an entry already in the journal is not
+    added again, whether it has been posted or not, so a script that is restarted after
+    a crash can record all its posts again, and only the posts that were not sent are
+    posted. Use `force=True` in `add` to post the same again, e.g. to change a method
+    back to an earlier version.
+
+    A post that was sent when the process stopped, but not yet marked as done, is sent
+    again when the journal is restarted.
+
+    :ivar path: Path to the journal database file.
+    :ivar max_attempts: The number of times a post is tried before it is marked failed.
+    :ivar retry_delay: The time in seconds before the first retry. The delay is doubled
+        for each retry.
+    """
+
+    def __init__(self, path: str, max_attempts: int = 5, retry_delay: float = 1.0):
+        """
+        Initialize the PostJournal. The journal file is created if it does not exist.
+
+        :param path: Path to the journal database file.
+        :param max_attempts: The number of times a post is tried before it is marked
+            as failed.
+        :param retry_delay: The time in seconds before the first retry. The delay is
+            doubled for each retry.
+        """
+        self.path = path
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._connection: Optional[EmpowerConnection] = None
+        self._worker: Optional[threading.Thread] = None
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._changed = threading.Condition()
+        self._on_sent: Dict[str, List[Callable[[], None]]] = {}
+        # Held while adding an entry and while finishing a post, so a function given
+        # to `add` is always called after the post it waits for.
+        self._on_sent_lock = threading.RLock()
+        with self._connect() as database:
+            database.execute("PRAGMA journal_mode=WAL")
+            database.execute(
+                "CREATE TABLE IF NOT EXISTS journal ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT UNIQUE, "
+                "operation TEXT, endpoint TEXT, body TEXT, timeout INTEGER, "
+                "status TEXT, attempts INTEGER, error TEXT)"
+            )
+
+    def _connect(self) -> ContextManager[sqlite3.Connection]:
+        return connect(self.path)
+
+    @staticmethod
+    def _key(endpoint: str, body: Any) -> str:
+        """Key identifying a post, so the same post is only in the journal once."""
+        serialised = json.dumps([endpoint, body], sort_keys=True)
+        return hashlib.sha256(serialised.encode()).hexdigest()
+
+    def add(
+        self,
+        operation: str,
+        endpoint: str,
+        body: Any,
+        timeout: Optional[int] = None,
+        on_sent: Optional[Callable[[], None]] = None,
+        force: bool = False,
+    ) -> bool:
+        """
+        Add a post to the journal. It is posted when the journal is started.
+
+        :param operation: Name of the EmpowerHandler method doing the post.
+        :param endpoint: The endpoint to post to.
+        :param body: The body to post. Must be JSON serialisable.
+        :param timeout: The timeout of the post. If None, the default timeout is used.
+        :param on_sent: Function called by the background thread after the post has
+            been posted, e.g. to clear cached data that the post changes. It is only
+            kept in memory, so it is not called if the post is sent by another process.
+        :param force: Add the post even if the same post has already been posted.
+        :return: True if the post was added, False if the same post was already in the
+            journal.
+        """
+        key = self._key(endpoint, body)
+        with self._on_sent_lock, self._connect() as database:
+            if force:
+                # The posted entry keeps its place in the history, but not its key
+                database.execute(
+                    "UPDATE journal SET key = NULL WHERE key = ? AND status = ?",
+                    (key, DONE),
+                )
+            cursor = database.execute(
+                "INSERT OR IGNORE INTO journal (key, operation, endpoint, body, "
+                "timeout, status, attempts) VALUES (?, ?, ?, ?, ?, ?, 0)",
+                (
+                    key,
+                    operation,
+                    endpoint,
+                    json.dumps(body),
+                    timeout,
+                    PENDING,
+                ),
+            )
+            (status,) = database.execute(
+                "SELECT status FROM journal WHERE key = ?", (key,)
+            ).fetchone()
+            if on_sent is not None and status != DONE:
+                self._on_sent.setdefault(key, []).append(on_sent)
+        added = cursor.rowcount == 1
+        if added:
+            logger.debug("Added %s to journal", operation)
+        else:
+            logger.debug("%s is already in the journal, not adding it", operation)
+        self._wake.set()
+        return added
+
+    def entries(self, status: Optional[str] = None) -> List[JournalEntry]:
+        """
+        The entries in the journal, in the order they were added.
+
+        :param status: Only return entries with this status. If None, all entries are
+            returned.
+        """
+        query = (
+            "SELECT id, operation, endpoint, body, timeout, status, attempts, error "
+            "FROM journal"
+        )
+        parameters = []
+        if status is not None:
+            query += " WHERE status = ?"
+            parameters.append(status)
+        with self._connect() as database:
+            rows = database.execute(query + " ORDER BY id", parameters).fetchall()
+        return [JournalEntry(*row[:3], json.loads(row[3]), *row[4:]) for row in rows]
+
+    def _counts(self) -> Dict[str, int]:
+        with self._connect() as database:
+            rows = database.execute(
+                "SELECT status, COUNT(*) FROM journal GROUP BY status"
+            ).fetchall()
+        return {PENDING: 0, DONE: 0, FAILED: 0, **dict(rows)}
+
+    def _next_entry(self) -> Optional[JournalEntry]:
+        """The next entry to post, or None if there is none or an entry has failed."""
+        counts = self._counts()
+        if counts[FAILED] or not counts[PENDING]:
+            return None
+        return self.entries(PENDING)[0]
+
+    def _set_status(
+        self, entry: JournalEntry, status: str, error: Optional[str] = None
+    ) -> None:
+        with self._connect() as database:
+            database.execute(
+                "UPDATE journal SET status = ?, attempts = attempts + 1, error = ? "
+                "WHERE id = ?",
+                (status, error, entry.id),
+            )
+        with self._changed:
+            self._changed.notify_all()
+
+    def start(self, connection: EmpowerConnection) -> None:
+        """
+        Start posting the entries in the journal in the background, if not already
+        started.
+
+        :param connection: A logged in connection to Empower.
+        """
+        self._connection = connection
+        if self._worker is not None and self._worker.is_alive():
+            return
+        self._stopped.clear()
+        self._worker = threading.Thread(target=self._drain, daemon=True)
+        self._worker.start()
+
+    def stop(self) -> None:
+        """Stop posting entries. Entries not yet posted are kept in the journal."""
+        self._stopped.set()
+        self._wake.set()
+        if self._worker is not None:
+            self._worker.join()
+        self._worker = None
+
+    def _drain(self) -> None:
+        while not self._stopped.is_set():
+            entry = self._next_entry()
+            if entry is None:
+                self._wake.wait(timeout=1)
+                self._wake.clear()
+                continue
+            self._post(entry)
+
+    def _post(self, entry: JournalEntry) -> None:
+        """
+        Post an entry, retrying connection and server errors until it succeeds or all
+        attempts are used.
+        """
+        if entry.attempts >= self.max_attempts:
+            # E.g. if max_attempts was lowered after the entry was tried
+            logger.error("Posting %s failed: no attempts left", entry.operation)
+            self._set_status(entry, FAILED, error=entry.error or "No attempts left")
+            return
+        for attempt in range(entry.attempts, self.max_attempts):
+            try:
+                self._connection.post(
+                    endpoint=entry.endpoint, body=entry.body, timeout=entry.timeout
+                )
+            except Exception as error:
+                if attempt + 1 == self.max_attempts or not _is_transient(error):
+                    logger.error("Posting %s failed: %s", entry.operation, error)
+                    self._set_status(entry, FAILED, error=str(error))
+                    return
+                delay = self.retry_delay * 2 ** (attempt - entry.attempts)
+                logger.warning(
+                    "Posting %s failed, retrying in %s s: %s",
+                    entry.operation,
+                    delay,
+                    error,
+                )
+                self._set_status(entry, PENDING, error=str(error))
+                if self._stopped.wait(delay):
+                    return
+            else:
+                logger.debug("Posted %s from journal", entry.operation)
+                with self._on_sent_lock:
+                    self._call_on_sent(entry)
+                    self._set_status(entry, DONE)
+                return
+
+    def _call_on_sent(self, entry: JournalEntry) -> None:
+        callbacks = self._on_sent.pop(self._key(entry.endpoint, entry.body), [])
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                logger.exception("Error after posting %s", entry.operation)
+
+    def flush(self, timeout: Optional[float] = None) -> None:
+        """
+        Wait until all entries in the journal have been posted.
+
+        :param timeout: The maximum time in seconds to wait. If None, it waits until
+            all entries are posted.
+        :raises RuntimeError: If an entry failed, or the journal is not started while
+            there are entries that have not been posted.
+        :raises TimeoutError: If the entries were not posted within `timeout`.
+        """
+        start = time.monotonic()
+        with self._changed:
+            while True:
+                counts = self._counts()
+                if counts[FAILED]:
+                    errors = [
+                        f"{entry.operation}: {entry.error}"
+                        for entry in self.entries(FAILED)
+                    ]
+                    raise RuntimeError(
+                        f"{counts[FAILED]} post(s) in the journal failed, "
+                        f"{counts[PENDING]} not posted: " + "; ".join(errors)
+                    )
+                if not counts[PENDING]:
+                    return
+                if self._worker is None or not self._worker.is_alive():
+                    raise RuntimeError(
+                        f"{counts[PENDING]} post(s) in the journal have not been "
+                        "posted, and the journal is not started."
+                    )
+                remaining = (
+                    None if timeout is None else start + timeout - time.monotonic()
+                )
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError(
+                        f"{counts[PENDING]} post(s) were not posted within {timeout} s."
+                    )
+                self._changed.wait(
+                    timeout=1 if remaining is None else min(remaining, 1)
+                )
+
+    def retry_failed(self) -> None:
+        """Try posting the failed entries again, with a new set of attempts."""
+        with self._connect() as database:
+            database.execute(
+                "UPDATE journal SET status = ?, attempts = 0 WHERE status = ?",
+                (PENDING, FAILED),
+            )
+        self._wake.set()
+
+    def clear(self) -> None:
+        """Remove the entries that have been posted from the journal, to save space."""
+        with self._connect() as database:
+            database.execute("DELETE FROM journal WHERE status = ?", (DONE,))
+
+    def __len__(self) -> int:
+        with self._connect() as database:
+            (length,) = database.execute("SELECT COUNT(*) FROM journal").fetchone()
+        return length
@@ -0,0 +1,349 @@
+import copy
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Mapping, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """
+    Small thread safe cache, where every entry expires a fixed time after it was set.
+
+    :ivar ttl: The time to live of an entry in seconds.
+    """
+
+    def __init__(self, ttl: float, clock: Callable[[], float] = time.monotonic):
+        """
+        Initialize the TTLCache.
+
+        :param ttl: The time to live of an entry in seconds.
+        :param clock: The function used to get the current time. Only meant to be
+            changed for testing.
+        """
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: Dict[Hashable, Tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Any:
+        """
+        Get a value from the cache.
+
+        :param key: The key of the value.
+        :raises KeyError: If the key is not in the cache, or the entry has expired.
+        """
+        with self._lock:
+            set_time, value = self._entries[key]
+            if self.is_expired(set_time):
+                logger.debug("Cache entry for %s has expired", key)
+                del self._entries[key]
+                raise KeyError(key)
+        return value
+
+    def get_entry(self, key: Hashable) -> Tuple[float, Any]:
+        """
+        Get an entry from the cache, regardless of whether it has expired.
+
+        :raises KeyError: If the key is not in the cache.
+        :return: The time the entry was set and the value.
+        """
+        with self._lock:
+            return self._entries[key]
+
+    def set(self, key: Hashable, value: Any, set_time: Optional[float] = None) -> None:
+        """
+        Set a value in the cache.
+
+        :param set_time: The time the value was set. If None, the current time is used.
+        """
+        if set_time is None:
+            set_time = self._clock()
+        with self._lock:
+            self._entries[key] = (set_time, value)
+
+    def is_expired(self, set_time: float) -> bool:
+        """Whether an entry set at `set_time` has expired."""
+        return self._clock() - set_time > self.ttl
+
+    def items(self) -> List[Tuple[Hashable, Tuple[float, Any]]]:
+        """All entries in the cache, including expired ones."""
+        with self._lock:
+            return list(self._entries.items())
+
+    def invalidate(self, key: Hashable = None) -> None:
+        """
+        Remove an entry from the cache.
+
+        :param key: The key of the entry to remove. If None, all entries are removed.
+        """
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+
+class ReferenceDataCache:
+    """
+    Cache for reference data from Empower that rarely changes, like node names and plate
+    types.
+
+    Each resource, e.g. "nodes", has its own time to live. When an entry has expired,
+    the expired value is returned while a fresh value is fetched in the background
+    (stale-while-revalidate), unless `stale_while_revalidate` is False. The cache can
+    optionally be persisted to a JSON file, so it survives restarting the Python
+    process.
+
+    :ivar ttl: Dict with the time to live in seconds for each resource. Resources not
+        in the dict, or with a time to live of 0, are not cached.
+    :ivar stale_while_revalidate: Whether to return expired values while refreshing
+        them in the background.
+    :ivar path: Path to the JSON file the cache is persisted to. None if the cache is
+        not persisted.
+    """
+
+    default_ttl: Mapping[str, float] = {
+        "projects": 3600,
+        "nodes": 300,
+        "systems": 300,
+        "plate_types": 3600,
+        "sample_set_methods": 60,
+    }
+
+    def __init__(
+        self,
+        ttl: Optional[Mapping[str, float]] = None,
+        stale_while_revalidate: bool = True,
+        path: Optional[str] = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        """
+        Initialize the ReferenceDataCache.
+
+        :param ttl: The time to live in seconds for each resource. Given values
+            override the defaults in `default_ttl`.
+        :param stale_while_revalidate: Whether to return expired values while
+            refreshing them in the background.
+        :param path: Path to a JSON file to persist the cache to. If the file exists,
+            the cache is loaded from it.
+        :param clock: The function used to get the current time. Only meant to be
+            changed for testing. As entries can be persisted, it must be wall time.
+        """
+        self.ttl = {**self.default_ttl, **(ttl or {})}
+        self.stale_while_revalidate = stale_while_revalidate
+        self.path = path
+        self._clock = clock
+        self._caches: Dict[str, TTLCache] = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        if path is not None and os.path.exists(path):
+            self._load()
+
+    def _cache(self, resource: str) -> TTLCache:
+        with self._lock:
+            if resource not in self._caches:
+                self._caches[resource] = TTLCache(
+                    ttl=self.ttl.get(resource, 0), clock=self._clock
+                )
+            return self._caches[resource]
+
+    def get(self, resource: str, key: Tuple, loader: Callable[[], Any]) -> Any:
+        """
+        Get a value from the cache, loading it with `loader` if necessary.
+
+        :param resource: The resource the value belongs to, e.g. "nodes".
+        :param key: A tuple of JSON serialisable values identifying the value within
+            the resource, e.g. the address, project and node name.
+        :param loader: Function that fetches the value from Empower.
+        :return: A copy of the cached value, so changing it doesn't change the cache.
+        """
+        if not self.ttl.get(resource, 0):
+            return loader()
+        return copy.deepcopy(self._get_cached(resource, key, loader))
+
+    def _get_cached(self, resource: str, key: Tuple, loader: Callable[[], Any]) -> Any:
+        cache = self._cache(resource)
+        try:
+            set_time, value = cache.get_entry(key)
+        except KeyError:
+            logger.debug("No cached %s for %s, fetching", resource, key)
+            return self._load_value(resource, key, loader)
+        if not cache.is_expired(set_time):
+            return value
+        if not self.stale_while_revalidate:
+            logger.debug("Cached %s for %s expired, fetching", resource, key)
+            return self._load_value(resource, key, loader)
+        logger.debug(
+            "Cached %s for %s expired, refreshing in background", resource, key
+        )
+        with self._lock:
+            if (resource, key) in self._refreshing:
+                return value
+            self._refreshing.add((resource, key))
+        threading.Thread(
+            target=self._refresh, args=(resource, key, loader), daemon=True
+        ).start()
+        return value
+
+    def _refresh(self, resource: str, key: Tuple, loader: Callable[[], Any]) -> None:
+        try:
+            self._load_value(resource, key, loader)
+        except Exception:
+            # The stale value is kept if refreshing fails, so the error is only logged
+            logger.exception("Refreshing %s for %s failed", resource, key)
+        finally:
+            with self._lock:
+                self._refreshing.discard((resource, key))
+
+    def _load_value(self, resource: str, key: Tuple, loader: Callable[[], Any]) -> Any:
+        value = loader()
+        self._cache(resource).set(key, value)
+        if self.path is not None:
+            self._save()
+        return value
+
+    def invalidate(self, resource: Optional[str] = None) -> None:
+        """
+        Remove entries from the cache.
+
+        :param resource: The resource to remove entries for. If None, all entries are
+            removed.
+        """
+        with self._lock:
+            if resource is None:
+                caches = list(self._caches.values())
+            else:
+                caches = [self._caches[resource]] if resource in self._caches else []
+        for cache in caches:
+            cache.invalidate()
+        if self.path is not None:
+            self._save()
+
+    def _save(self) -> None:
+        data = {
+            resource: [
+                [list(key), entry] for key, entry in self._cache(resource).items()
+            ]
+            for resource in list(self._caches)
+        }
+        temporary_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary_path, "w") as f:
+            json.dump(data, f)
+        os.replace(temporary_path, self.path)
+        # Replacing the file is atomic, so other processes never see a partial file.
+
+    def _load(self) -> None:
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(
+                "Could not load reference data cache from %s: %s", self.path, e
+            )
+            return
+        for resource, entries in data.items():
+            cache = self._cache(resource)
+            for key, (set_time, value) in entries:
+                cache.set(tuple(key), value, set_time=set_time)
+
+
+class LRUCache:
+    """
+    Thread safe least-recently-used cache, bounded by the total size of the values.
+
+    :ivar max_bytes: The maximum total size of the values in the cache, in bytes.
+    :ivar hits: The number of lookups that found a value.
+    :ivar misses: The number of lookups that did not find a value.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 64 * 1024**2,
+        sizeof: Callable[[Any], int] = lambda value: len(json.dumps(value)),
+    ):
+        """
+        Initialize the LRUCache.
+
+        :param max_bytes: The maximum total size of the values in the cache, in bytes.
+            Values larger than this are not cached.
+        :param sizeof: Function that estimates the size of a value in bytes. Default is
+            the length of the value as JSON.
+        """
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._sizeof = sizeof
+        self._entries: "OrderedDict[Hashable, Tuple[int, Any]]" = OrderedDict()
+        self._memory_usage = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Any:
+        """
+        Get a value from the cache, and mark it as recently used.
+
+        :raises KeyError: If the key is not in the cache.
+        """
+        with self._lock:
+            try:
+                _, value = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                raise
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """
+        Set a value in the cache, evicting the least recently used values if the cache
+        is full.
+        """
+        size = self._sizeof(value)
+        with self._lock:
+            self._remove(key)
+            if size > self.max_bytes:
+                logger.debug("Value for %s is too large to be cached", key)
+                return
+            self._entries[key] = (size, value)
+            self._memory_usage += size
+            while self._memory_usage > self.max_bytes:
+                evicted_key, (evicted_size, _) = self._entries.popitem(last=False)
+                logger.debug("Evicting %s from cache", evicted_key)
+                self._memory_usage -= evicted_size
+
+    def _remove(self, key: Hashable) -> None:
+        if key in self._entries:
+            size, _ = self._entries.pop(key)
+            self._memory_usage -= size
+
+    def invalidate(self, key: Hashable = None) -> None:
+        """
+        Remove an entry from the cache.
+
+        :param key: The key of the entry to remove. If None, all entries are removed.
+        """
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+                self._memory_usage = 0
+            else:
+                self._remove(key)
+
+    @property
+    def memory_usage(self) -> int:
+        """The total estimated size of the values in the cache, in bytes."""
+        return self._memory_usage
+
+    @property
+    def hit_ratio(self) -> float:
+        """The fraction of lookups that found a value. 0 if there have been none."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def __len__(self) -> int:
+        return len(self._entries)
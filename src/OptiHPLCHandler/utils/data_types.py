@@ -1,4 +1,4 @@
-from typing import Any
+from typing import Any, Mapping
 
 
 class OptiDict(dict):
@@ -21,6 +21,17 @@ class OptiDict(dict):
             return super().__setitem__(__key, __value)
         raise TypeError("Object is immutable")
 
+    @classmethod
+    def immutable(cls, mapping: Mapping) -> "OptiDict":
+        """
+        Return an immutable object with the content of the mapping. If the mapping is
+        already an immutable object of this class, it is returned as is, so it can be
+        shared instead of copied.
+        """
+        if isinstance(mapping, cls) and not getattr(mapping, "mutable", True):
+            return mapping
+        return cls(mapping, mutable=False)
+
 
 class EmpowerModuleMethodModel(OptiDict):
     pass
@@ -0,0 +1,212 @@
+import json
+import logging
+import sqlite3
+import time
+from typing import Any, Callable, ContextManager, Mapping, Optional, Tuple
+
+from .sqlite_connection import connect
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteResponseCache:
+    """
+    Cache for responses from Empower, stored in an SQLite database on disk, so it can be
+    shared between processes, e.g. several notebooks or workers using the same
+    projects.
+
+    Entries are identified by the address of the server, the project, the user, the API
+    version and the endpoint, as users can have access to different data. Only
+    endpoints with a time to live are cached. The database uses write-ahead logging, so
+    processes can read while another process writes. When the total size of the cached
+    responses exceeds `max_bytes`, the oldest entries are removed.
+
+    :ivar path: Path to the database file.
+    :ivar ttl: Dict with the time to live in seconds for endpoints starting with each
+        key. If an endpoint matches more than one key, the longest key is used.
+    :ivar max_bytes: The maximum total size of the cached responses, in bytes.
+    """
+
+    default_ttl: Mapping[str, float] = {
+        "project/methods": 300,
+        "project/methods/sample-set-method-list": 60,
+        "project/fields": 3600,
+        "project/field-enumerated-values": 3600,
+    }
+
+    def __init__(
+        self,
+        path: str,
+        ttl: Optional[Mapping[str, float]] = None,
+        max_bytes: int = 256 * 1024**2,
+        clock: Callable[[], float] = time.time,
+    ):
+        """
+        Initialize the SQLiteResponseCache. The database is created if it does not
+        exist.
+
+        :param path: Path to the database file.
+        :param ttl: The time to live in seconds for endpoints starting with each key.
+            Given values override the defaults in `default_ttl`. Set a time to live of
+            0 to not cache an endpoint.
+        :param max_bytes: The maximum total size of the cached responses, in bytes.
+        :param clock: The function used to get the current time. Only meant to be
+            changed for testing. As the cache is shared between processes, it must be
+            wall time.
+        """
+        self.path = path
+        self.ttl = {**self.default_ttl, **(ttl or {})}
+        self.max_bytes = max_bytes
+        self._clock = clock
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            columns = [
+                row[1] for row in connection.execute("PRAGMA table_info(responses)")
+            ]
+            if columns and "username" not in columns:
+                # Made by an older version, which didn't key responses on the user
+                connection.execute("DROP TABLE responses")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "address TEXT, project TEXT, username TEXT, api_version TEXT, "
+                "endpoint TEXT, set_time REAL, size INTEGER, response TEXT, "
+                "PRIMARY KEY (address, project, username, api_version, endpoint))"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS responses_set_time ON responses (set_time)"
+            )
+
+    def _connect(self) -> ContextManager[sqlite3.Connection]:
+        return connect(self.path)
+
+    def ttl_for(self, endpoint: str) -> float:
+        """The time to live of responses from `endpoint`. 0 if it is not cached."""
+        endpoint = endpoint.lstrip("/")
+        prefixes = [prefix for prefix in self.ttl if endpoint.startswith(prefix)]
+        if not prefixes:
+            return 0
+        return self.ttl[max(prefixes, key=len)]
+
+    def is_expired(self, endpoint: str, set_time: float) -> bool:
+        """Whether a response from `endpoint` set at `set_time` has expired."""
+        return self._clock() - set_time > self.ttl_for(endpoint)
+
+    def get(
+        self,
+        address: str,
+        project: Optional[str],
+        username: str,
+        api_version: str,
+        endpoint: str,
+    ) -> Tuple[float, Any]:
+        """
+        Get a response from the cache, regardless of whether it has expired.
+
+        :raises KeyError: If the response is not in the cache.
+        :return: The time the response was set and the response.
+        """
+        with self._connect() as connection:
+            row = connection.execute(
+                "SELECT set_time, response FROM responses WHERE address = ? "
+                "AND project = ? AND username = ? AND api_version = ? "
+                "AND endpoint = ?",
+                (address, project or "", username, api_version, endpoint.lstrip("/")),
+            ).fetchone()
+        if row is None:
+            raise KeyError((address, project, username, api_version, endpoint))
+        set_time, response = row
+        return set_time, json.loads(response)
+
+    def set(
+        self,
+        address: str,
+        project: Optional[str],
+        username: str,
+        api_version: str,
+        endpoint: str,
+        response: Any,
+    ) -> None:
+        """
+        Set a response in the cache, removing the oldest entries if the cache is full.
+
+        :param response: The response to cache. Must be JSON serialisable.
+        """
+        serialised_response = json.dumps(response)
+        size = len(serialised_response)
+        if size > self.max_bytes:
+            logger.debug("Response from %s is too large to be cached", endpoint)
+            return
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    address,
+                    project or "",
+                    username,
+                    api_version,
+                    endpoint.lstrip("/"),
+                    self._clock(),
+                    size,
+                    serialised_response,
+                ),
+            )
+            self._evict(connection)
+
+    def _evict(self, connection: sqlite3.Connection) -> None:
+        (memory_usage,) = connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()
+        if memory_usage <= self.max_bytes:
+            return
+        rows = connection.execute(
+            "SELECT rowid, size FROM responses ORDER BY set_time"
+        ).fetchall()
+        evicted = []
+        for rowid, size in rows:
+            if memory_usage <= self.max_bytes:
+                break
+            evicted.append((rowid,))
+            memory_usage -= size
+        logger.debug("Evicting %s responses from cache", len(evicted))
+        connection.executemany("DELETE FROM responses WHERE rowid = ?", evicted)
+
+    def invalidate(
+        self,
+        address: Optional[str] = None,
+        project: Optional[str] = None,
+        endpoint_prefix: str = "",
+    ) -> None:
+        """
+        Remove responses from the cache.
+
+        :param address: Only remove responses from this server. If None, responses from
+            all servers are removed.
+        :param project: Only remove responses from this project. If None, responses
+            from all projects are removed.
+        :param endpoint_prefix: Only remove responses from endpoints starting with this.
+        """
+        query = "DELETE FROM responses WHERE substr(endpoint, 1, ?) = ?"
+        endpoint_prefix = endpoint_prefix.lstrip("/")
+        parameters = [len(endpoint_prefix), endpoint_prefix]
+        if address is not None:
+            query += " AND address = ?"
+            parameters.append(address)
+        if project is not None:
+            query += " AND project = ?"
+            parameters.append(project)
+        with self._connect() as connection:
+            connection.execute(query, parameters)
+
+    @property
+    def memory_usage(self) -> int:
+        """The total size of the cached responses, in bytes."""
+        with self._connect() as connection:
+            (memory_usage,) = connection.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        return memory_usage
+
+    def __len__(self) -> int:
+        with self._connect() as connection:
+            (length,) = connection.execute("SELECT COUNT(*) FROM responses").fetchone()
+        return length
@@ -0,0 +1,20 @@
+import contextlib
+import sqlite3
+from typing import Iterator
+
+
+@contextlib.contextmanager
+def connect(path: str) -> Iterator[sqlite3.Connection]:
+    """
+    Connect to an SQLite database for one operation. A new connection is used for each
+    operation, as connections can't be shared between threads. The connection commits
+    when the block exits without error, and is closed afterwards.
+
+    :param path: Path to the database file.
+    """
+    connection = sqlite3.connect(path, timeout=30)
+    try:
+        with connection:
+            yield connection
+    finally:
+        connection.close()
@@ -0,0 +1,390 @@
+import logging
+import re
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+TAG_PATTERN = re.compile(r"<(/?)([^<>\s/]+)>")
+# Only tags without attributes are elements, as those are the only ones that can be
+# found by key. Everything else, e.g. tags with attributes, is kept as text.
+
+
+class XmlElement:
+    """
+    An element in an XmlTree. The children are the text and elements between the
+    opening and closing tag, exactly as they are in the xml.
+    """
+
+    __slots__ = ("tag", "children", "parent", "_inner_xml")
+
+    def __init__(self, tag: Optional[str], parent: Optional["XmlElement"]):
+        self.tag = tag
+        self.children: List[Union[str, "XmlElement"]] = []
+        self.parent = parent
+        self._inner_xml: Optional[str] = None
+
+    @property
+    def inner_xml(self) -> str:
+        """The xml between the opening and closing tag."""
+        if self._inner_xml is None:
+            self._inner_xml = "".join(
+                child if isinstance(child, str) else child.outer_xml
+                for child in self.children
+            )
+        return self._inner_xml
+
+    @property
+    def outer_xml(self) -> str:
+        """The xml of the element, including the opening and closing tag."""
+        return f"<{self.tag}>{self.inner_xml}</{self.tag}>"
+
+    def invalidate(self) -> None:
+        """Clear the cached xml of the element and its ancestors."""
+        element = self
+        # If an element has no cached xml, neither have its ancestors, as building the
+        # xml of an element also builds the xml of its children.
+        while element is not None and element._inner_xml is not None:
+            element._inner_xml = None
+            element = element.parent
+
+    def descendants(self) -> Iterable["XmlElement"]:
+        """All elements below this element."""
+        for child in self.children:
+            if isinstance(child, XmlElement):
+                yield child
+                yield from child.descendants()
+
+
+class XmlTree:
+    """
+    An xml document parsed into a tree, with an index from tag to elements, so the
+    value of a tag can be read and changed without searching the xml.
+
+    The tree keeps all text exactly as it is in the xml, so an unchanged tree gives
+    back the exact xml it was made from, and a changed tree only differs in the
+    changed values. The xml is only put together again when `xml` is read after a
+    change.
+
+    Values are read and changed by tag like `EmpowerModuleMethod.find_value`: a tag
+    must occur exactly once.
+    """
+
+    def __init__(self, xml: str):
+        """
+        Initialize the XmlTree.
+
+        :param xml: The xml to parse.
+        """
+        self._root = XmlElement(None, None)
+        self._index: Dict[str, List[XmlElement]] = {}
+        self._undo_stack: List[Tuple] = []
+        self._parse_into(xml, self._root)
+
+    def _parse_into(self, xml: str, element: XmlElement) -> None:
+        """Parse xml into the children of an element, and add them to the index."""
+        stack = [element]
+        position = 0
+        for match in TAG_PATTERN.finditer(xml):
+            is_closing, tag = match.groups()
+            if match.start() > position:
+                stack[-1].children.append(xml[position : match.start()])
+            position = match.end()
+            if not is_closing:
+                child = XmlElement(tag, stack[-1])
+                stack[-1].children.append(child)
+                stack.append(child)
+            elif tag in [open_element.tag for open_element in stack[1:]]:
+                while stack[-1].tag != tag:
+                    self._flatten(stack.pop())  # Opened, but never closed
+                stack.pop()
+            else:
+                stack[-1].children.append(match.group(0))  # Closed, but never opened
+        if position < len(xml):
+            stack[-1].children.append(xml[position:])
+        while len(stack) > 1:
+            self._flatten(stack.pop())
+        self._add_to_index(element.descendants())
+
+    @staticmethod
+    def _flatten(element: XmlElement) -> None:
+        """Turn an element that is not closed into text followed by its children."""
+        siblings = element.parent.children
+        position = siblings.index(element)
+        for child in element.children:
+            if isinstance(child, XmlElement):
+                child.parent = element.parent
+        siblings[position : position + 1] = [f"<{element.tag}>", *element.children]
+
+    def _add_to_index(self, elements: Iterable[XmlElement]) -> None:
+        for element in elements:
+            self._index.setdefault(element.tag, []).append(element)
+
+    def _remove_from_index(self, elements: Iterable[XmlElement]) -> None:
+        removed: Dict[str, set] = {}
+        for element in elements:
+            removed.setdefault(element.tag, set()).add(id(element))
+        for tag, ids in removed.items():
+            self._index[tag] = [
+                element for element in self._index[tag] if id(element) not in ids
+            ]
+
+    def _element(self, key: str) -> XmlElement:
+        elements = self._index.get(key, [])
+        if len(elements) == 0:
+            raise KeyError(f"Could not find key {key}")
+        if len(elements) > 1:
+            raise ValueError(f"Found more than one match for key {key}")
+        return elements[0]
+
+    def __getitem__(self, key: str) -> str:
+        return self._element(key).inner_xml
+
+    def __setitem__(self, key: str, value: str) -> None:
+        element = self._element(key)
+        old_children = element.children
+        self._remove_from_index(element.descendants())
+        element.children = []
+        self._parse_into(value, element)
+        element.invalidate()
+        self._undo_stack.append((element, old_children))
+
+    def __contains__(self, key: str) -> bool:
+        return len(self._index.get(key, [])) > 0
+
+    def replace(self, original: str, new: str) -> int:
+        """
+        Replace all instances of a string in the xml. This parses the whole xml
+        again, so prefer setting values by key.
+
+        :return: The number of instances replaced.
+        """
+        xml = self.xml
+        num_replaced = xml.count(original)
+        self._undo_stack.append((None, (self._root, self._index)))
+        if num_replaced > 0:
+            self._root = XmlElement(None, None)
+            self._index = {}
+            self._parse_into(xml.replace(original, new), self._root)
+        return num_replaced
+
+    def undo(self) -> None:
+        """Undo the last change."""
+        element, old_state = self._undo_stack.pop()
+        if element is None:
+            self._root, self._index = old_state
+            return
+        self._remove_from_index(element.descendants())
+        element.children = old_state
+        self._add_to_index(element.descendants())
+        element.invalidate()
+
+    def merge_last(self, count: int) -> bool:
+        """
+        Merge the last `count` changes into the `count` changes before them, so undoing
+        the earlier changes also undoes the later ones. This is only done if both sets
+        of changes set the same elements in the same order.
+
+        :return: Whether the changes were merged.
+        """
+        if len(self._undo_stack) < 2 * count:
+            return False
+        earlier = self._undo_stack[-2 * count : -count]
+        later = self._undo_stack[-count:]
+        if any(
+            new_element is None or new_element is not old_element
+            for (old_element, _), (new_element, _) in zip(earlier, later)
+        ):
+            return False
+        del self._undo_stack[-count:]
+        return True
+
+    @property
+    def xml(self) -> str:
+        """The current xml."""
+        return self._root.inner_xml
+
+
+class TagOffsetIndex:
+    """
+    Index of where each tag is in an xml string, made in one pass over the xml, so the
+    values of many keys can be found without searching the xml for each key.
+
+    Values are found like `EmpowerModuleMethod.find_value`: the value of a key is the
+    text from the first opening tag to the last closing tag, and it is an error if
+    there is another opening tag in between.
+    """
+
+    def __init__(self, xml: str):
+        """
+        Initialize the TagOffsetIndex.
+
+        :param xml: The xml to index.
+        """
+        self.xml = xml
+        # For each tag, the end of each opening tag and the start of each closing tag.
+        self._openings: Dict[str, List[int]] = {}
+        self._closings: Dict[str, List[int]] = {}
+        for match in TAG_PATTERN.finditer(xml):
+            is_closing, tag = match.groups()
+            if is_closing:
+                self._closings.setdefault(tag, []).append(match.start())
+            else:
+                self._openings.setdefault(tag, []).append(match.end())
+
+    def span(self, key: str) -> Tuple[int, int]:
+        """The start and end of the value of a key in the xml."""
+        openings = self._openings.get(key, [])
+        closings = self._closings.get(key, [])
+        if not openings or not closings or closings[-1] < openings[0]:
+            raise KeyError(f"Could not find key {key}")
+        start, end = openings[0], closings[-1]
+        if len(openings) > 1 and openings[1] <= end:
+            raise ValueError(f"Found more than one match for key {key}")
+        return start, end
+
+    def __getitem__(self, key: str) -> str:
+        start, end = self.span(key)
+        return self.xml[start:end]
+
+
+def _common_prefix_length(xml: str, other: str, limit: int) -> int:
+    """The length of the start the strings have in common, at most `limit`."""
+    low, high = 0, limit
+    while low < high:
+        middle = (low + high + 1) // 2
+        if xml[:middle] == other[:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def _common_suffix_length(xml: str, other: str, limit: int) -> int:
+    """The length of the end the strings have in common, at most `limit`."""
+    low, high = 0, limit
+    while low < high:
+        middle = (low + high + 1) // 2
+        if xml[len(xml) - middle :] == other[len(other) - middle :]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+class LeafIndex:
+    """
+    Index of the elements without child elements in an xml, by the path of the element
+    from the outermost element, e.g. "ChannelA/Wavelength". Elements with a tag that
+    occurs more than once in the same parent are numbered from 0, e.g.
+    "GradientTable/GradientRow[1]/Flow".
+
+    Like `XmlTree`, only tags without attributes are elements, and elements that are
+    not closed are ignored.
+    """
+
+    def __init__(self, xml: str):
+        """
+        Initialize the LeafIndex.
+
+        :param xml: The xml to index.
+        """
+        self.xml = xml
+        # For each element: parent, tag, number among siblings with the tag, end of
+        # the opening tag, and whether it has child elements.
+        elements: List[list] = []
+        tag_counts: List[Dict[str, int]] = [{}]  # The count of each tag in each element
+        stack = [-1]  # The open elements, -1 is outside all elements
+        spans: Dict[int, Tuple[int, int]] = {}
+        for match in TAG_PATTERN.finditer(xml):
+            is_closing, tag = match.groups()
+            if not is_closing:
+                parent = stack[-1]
+                counts = tag_counts[parent + 1]
+                number = counts.get(tag, 0)
+                counts[tag] = number + 1
+                if parent >= 0:
+                    elements[parent][4] = True
+                elements.append([parent, tag, number, match.end(), False])
+                tag_counts.append({})
+                stack.append(len(elements) - 1)
+                continue
+            if tag not in [elements[open_index][1] for open_index in stack[1:]]:
+                continue  # Closed, but never opened
+            while elements[stack[-1]][1] != tag:
+                stack.pop()  # Opened, but never closed
+            index = stack.pop()
+            if not elements[index][4]:
+                spans[index] = (elements[index][3], match.start())
+        paths: List[str] = []
+        for parent, tag, number, _, _ in elements:
+            name = tag if tag_counts[parent + 1][tag] == 1 else f"{tag}[{number}]"
+            paths.append(name if parent < 0 else f"{paths[parent]}/{name}")
+        self.spans: Dict[str, Tuple[int, int]] = {
+            paths[index]: span for index, span in sorted(spans.items())
+        }
+        self._paths_by_start = {start: path for path, (start, _) in self.spans.items()}
+
+    @property
+    def values(self) -> Dict[str, str]:
+        """The value of each element, by path."""
+        return {path: self.xml[start:end] for path, (start, end) in self.spans.items()}
+
+    def diff(self, other: str) -> Optional[Dict[str, Tuple[str, str]]]:
+        """
+        The values that are different in another xml, if it has the same elements as
+        this xml. Only the part of the xmls that is different is searched, so this is
+        fast when the xmls only differ in a few values.
+
+        :param other: The xml to compare with.
+        :return: The value in this xml and the other xml of each path with different
+            values, or None if the xmls don't have the same elements, or the difference
+            isn't only in whole values, e.g. it is inside a tag with attributes.
+        """
+        xml = self.xml
+        prefix = _common_prefix_length(xml, other, min(len(xml), len(other)))
+        suffix = _common_suffix_length(xml, other, min(len(xml), len(other)) - prefix)
+        # The parts that differ, extended to whole tags and values. A tag can't cross
+        # the start, which is after a ">", or the ends, which are at a "<".
+        start = xml.rfind(">", 0, prefix) + 1
+        end = xml.find("<", len(xml) - suffix)
+        other_end = other.find("<", len(other) - suffix)
+        end = len(xml) if end < 0 else end
+        other_end = len(other) if other_end < 0 else other_end
+        parts = TAG_PATTERN.split(xml[start:end])
+        other_parts = TAG_PATTERN.split(other[start:other_end])
+        # The split gives text, then the groups of a tag, then text, etc.
+        if parts[1::3] != other_parts[1::3] or parts[2::3] != other_parts[2::3]:
+            return None
+        differences = {}
+        position = start
+        for index in range(0, len(parts), 3):
+            value, other_value = parts[index], other_parts[index]
+            if value != other_value:
+                path = self._paths_by_start.get(position)
+                if path is None or self.spans[path][1] != position + len(value):
+                    # Not a whole value, e.g. part of a value with a tag with
+                    # attributes in it, so the values have to be compared in full
+                    return None
+                differences[path] = (value, other_value)
+            if index + 2 < len(parts):
+                is_closing, tag = parts[index + 1 : index + 3]
+                position += len(value) + len(tag) + len(is_closing) + 2
+        return differences
+
+
+ROOT_TAG_PATTERN = re.compile(
+    r"\s*(?:<\?.*?\?>\s*|<!--.*?-->\s*|<!DOCTYPE[^>]*>\s*)*<([^\s/>!?]+)", re.DOTALL
+)
+
+
+def root_tag(xml: str) -> Optional[str]:
+    """
+    The tag of the root element of an xml, found by reading only the declaration,
+    comments and doctype before it.
+
+    :return: The tag, or None if the xml doesn't start with an element.
+    """
+    match = ROOT_TAG_PATTERN.match(xml)
+    if match is None:
+        return None
+    return match.group(1)
@@ -0,0 +1,149 @@
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+from OptiHPLCHandler.applications.run_scheduler import (
+    RunScheduler,
+    ScheduledJob,
+    default_idle_check,
+    estimate_duration,
+)
+
+
+def snapshot_row(node, system, state):
+    return {
+        "node": node,
+        "system": system,
+        "timed_out": False,
+        "error": None,
+        "SystemState": state,
+    }
+
+
+class TestRunScheduler(unittest.TestCase):
+    def setUp(self) -> None:
+        self.handler = MagicMock()
+        self.handler.GetFleetSnapshot.return_value = [
+            snapshot_row("node", "system_1", "Idle"),
+            snapshot_row("node", "system_2", "Idle"),
+            snapshot_row("node", "system_3", "Running"),
+        ]
+        self.now = 0.0
+        self.scheduler = RunScheduler(self.handler, clock=lambda: self.now)
+
+    def test_estimate_duration(self):
+        method = SimpleNamespace(
+            gradient_table=[{"Time": "Initial"}, {"Time": "5"}, {"Time": "12.5"}]
+        )
+        job = ScheduledJob("ssm", [("node", "system_1")], instrument_methods=[method])
+        assert estimate_duration(job) == 12.5
+        job.instrument_methods = [method, method]
+        assert estimate_duration(job) == 25
+        job.duration = 3
+        assert estimate_duration(job) == 3
+
+    def test_no_eligible_systems(self):
+        with self.assertRaises(ValueError):
+            self.scheduler.add_job(ScheduledJob("ssm", []))
+
+    def test_dispatch_to_idle(self):
+        self.scheduler.add_job(
+            ScheduledJob(
+                "ssm", [("node", "system_3"), ("node", "system_2")], duration=10
+            )
+        )
+        started = self.scheduler.dispatch()
+        assert len(started) == 1
+        assert started[0].system == "system_2"
+        assert started[0].expected_finish_time == 600
+        assert self.handler.RunExperiment.call_args[1]["system"] == "system_2"
+        assert self.scheduler.queue == []
+
+    def test_priority_and_earliest_finish(self):
+        self.scheduler.add_job(
+            ScheduledJob("low", [("node", "system_1")], priority=0, duration=10)
+        )
+        self.scheduler.add_job(
+            ScheduledJob("high", [("node", "system_1")], priority=1, duration=10)
+        )
+        started = self.scheduler.dispatch()
+        assert [dispatch.job.sample_set_method for dispatch in started] == ["high"]
+        # The low priority job waits for system_1, as it is the only eligible system
+        assert [job.sample_set_method for job in self.scheduler.queue] == ["low"]
+
+    def test_wait_for_busy_system(self):
+        self.scheduler.add_job(ScheduledJob("ssm", [("node", "system_3")], duration=1))
+        assert self.scheduler.dispatch() == []
+        self.handler.RunExperiment.assert_not_called()
+        self.handler.GetFleetSnapshot.return_value = [
+            snapshot_row("node", "system_3", "Idle")
+        ]
+        assert len(self.scheduler.dispatch()) == 1
+
+    def test_default_idle_check(self):
+        assert default_idle_check({"SystemState": "idle"})
+        assert not default_idle_check({"SystemState": "Running", "LampState": "Idle"})
+        assert not default_idle_check({"LampState": "Idle"})
+
+    def test_started_system_not_reused(self):
+        self.scheduler.add_job(ScheduledJob("first", [("node", "system_1")]))
+        self.scheduler.add_job(
+            ScheduledJob("second", [("node", "system_1"), ("node", "system_2")])
+        )
+        started = self.scheduler.dispatch()
+        assert [
+            (dispatch.job.sample_set_method, dispatch.system) for dispatch in started
+        ] == [
+            ("first", "system_1"),
+            ("second", "system_2"),
+        ]
+
+    def test_keep_system_needed_by_other_job(self):
+        self.scheduler.add_job(
+            ScheduledJob("flexible", [("node", "system_1"), ("node", "system_2")])
+        )
+        self.scheduler.add_job(ScheduledJob("fixed", [("node", "system_1")]))
+        started = self.scheduler.dispatch()
+        assert sorted(
+            (dispatch.job.sample_set_method, dispatch.system) for dispatch in started
+        ) == [("fixed", "system_1"), ("flexible", "system_2")]
+
+    def test_least_waiting_work(self):
+        self.scheduler.add_job(
+            ScheduledJob(
+                "short",
+                [("node", "system_1"), ("node", "system_2")],
+                priority=1,
+                duration=1,
+            )
+        )
+        self.scheduler.add_job(
+            ScheduledJob(
+                "long", [("node", "system_1"), ("node", "system_3")], duration=60
+            )
+        )
+        self.scheduler.add_job(
+            ScheduledJob(
+                "other", [("node", "system_2"), ("node", "system_3")], duration=5
+            )
+        )
+        started = self.scheduler.dispatch()
+        # system_1 has more work waiting for it, so the short job uses system_2
+        assert [
+            (dispatch.job.sample_set_method, dispatch.system) for dispatch in started
+        ] == [
+            ("short", "system_2"),
+            ("long", "system_1"),
+        ]
+        assert started[0].expected_finish_time == 60
+
+    def test_run(self):
+        self.scheduler.add_job(ScheduledJob("ssm_1", [("node", "system_1")]))
+        self.scheduler.add_job(ScheduledJob("ssm_2", [("node", "system_2")]))
+        dispatched = self.scheduler.run(poll_interval=0)
+        assert len(dispatched) == 2
+
+    def test_run_timeout(self):
+        self.scheduler.add_job(ScheduledJob("ssm", [("node", "system_3")]))
+        with self.assertRaises(TimeoutError):
+            self.scheduler.run(poll_interval=0, timeout=-1)
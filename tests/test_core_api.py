@@ -1,3 +1,5 @@
+import os
+import tempfile
 import unittest
 import warnings
 from unittest.mock import MagicMock, patch
@@ -6,6 +8,7 @@ import requests
 
 from OptiHPLCHandler import EmpowerConnection
 from OptiHPLCHandler.empower_api_core import EmpowerResponse
+from OptiHPLCHandler.utils.sqlite_cache import SQLiteResponseCache
 
 
 class TestEmpowerConnection(unittest.TestCase):
@@ -438,3 +441,100 @@ class TestEmpowerConnection(unittest.TestCase):
         assert isinstance(response, EmpowerResponse)
         assert response.content[0]["test_key"] == "test_value"
         assert response.message == "test_message"
+
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.folder = tempfile.TemporaryDirectory()
+        self.now = 0.0
+        self.cache = SQLiteResponseCache(
+            os.path.join(self.folder.name, "cache.db"), clock=lambda: self.now
+        )
+        self.connection = EmpowerConnection(
+            project="test_project",
+            address="https://test_address/",
+            service="test_service",
+            response_cache=self.cache,
+        )
+        self.mock_response = MagicMock()
+        self.mock_response.status_code = 200
+        self.mock_response.json.return_value = {
+            "results": [{"test_key": "test_value"}],
+            "message": "test_message",
+        }
+        patcher = patch(
+            "OptiHPLCHandler.empower_api_core.requests.request",
+            return_value=self.mock_response,
+        )
+        self.mock_request = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.folder.cleanup)
+
+    def test_cached(self):
+        for _ in range(2):
+            response = self.connection.get("project/fields")
+        assert self.mock_request.call_count == 1
+        assert response.content == [{"test_key": "test_value"}]
+        assert response.message == "test_message"
+        self.now = 3601
+        self.connection.get("project/fields")
+        assert self.mock_request.call_count == 2
+
+    def test_not_cached(self):
+        self.connection.get("acquisition/nodes")
+        self.connection.get("acquisition/nodes")
+        assert self.mock_request.call_count == 2
+
+    def test_shared_between_connections(self):
+        self.connection.get("project/fields")
+        other_connection = EmpowerConnection(
+            project="test_project",
+            address="https://test_address/",
+            service="test_service",
+            response_cache=SQLiteResponseCache(self.cache.path, clock=lambda: self.now),
+        )
+        other_connection.get("project/fields")
+        assert self.mock_request.call_count == 1
+        other_connection.project = "other_project"
+        other_connection.get("project/fields")
+        assert self.mock_request.call_count == 2
+        other_connection.project = "test_project"
+        other_connection.username = "other_user"
+        other_connection.get("project/fields")
+        assert self.mock_request.call_count == 3
+
+    def test_post_invalidates(self):
+        self.connection.get("project/methods/instrument-method?name=test")
+        self.connection.get("project/fields")
+        self.connection.post(
+            "project/methods/instrument-method?overWriteExisting=false", body={}
+        )
+        self.connection.get("project/methods/instrument-method?name=test")
+        self.connection.get("project/fields")
+        assert self.mock_request.call_count == 4  # Including the post
+
+    def test_stale_on_server_error(self):
+        self.connection.get("project/fields")
+        self.now = 3601
+        self.mock_response.status_code = 503
+        self.mock_response.raise_for_status.side_effect = requests.exceptions.HTTPError(
+            response=self.mock_response
+        )
+        with self.assertWarns(UserWarning):
+            response = self.connection.get("project/fields")
+        assert response.content == [{"test_key": "test_value"}]
+        self.mock_response.status_code = 404
+        with self.assertRaises(requests.exceptions.HTTPError):
+            self.connection.get("project/fields")
+
+    def test_stale_on_server_error_without_json(self):
+        self.connection.get("project/fields")
+        self.now = 3601
+        self.mock_response.status_code = 502
+        self.mock_response.raise_for_status.side_effect = requests.exceptions.HTTPError(
+            response=self.mock_response
+        )
+        self.mock_response.json.side_effect = ValueError("Not JSON")
+        with self.assertWarns(UserWarning):
+            response = self.connection.get("project/fields")
+        assert response.content == [{"test_key": "test_value"}]
@@ -1,4 +1,6 @@
+import copy
 import os
+import pickle
 import unittest
 
 from OptiHPLCHandler.empower_detector_module_method import (
@@ -33,6 +35,28 @@ class TestDetector(unittest.TestCase):
         with self.assertRaises(AttributeError):
             method.lamp_enabled
 
+    def test_no_instance_dict(self):
+        method = Detector({"nativeXml": "<Lamp>true</Lamp>"})
+        assert not hasattr(method, "__dict__")
+        for channel in [
+            TUVChannel(wavelength="254"),
+            PDAChannel(wavelength1="254"),
+            PDASpectralChannel(start_wavelength="200", end_wavelength="400"),
+            FLRChannel(excitation="350", emission="397"),
+        ]:
+            assert not hasattr(channel, "__dict__")
+            assert copy.deepcopy(channel) == channel
+            assert pickle.loads(pickle.dumps(channel)) == channel
+
+    def test_channel_as_dict(self):
+        channel = PDASpectralChannel(start_wavelength="200", end_wavelength="400")
+        assert dict(channel) == {
+            "channel_type": "PDASpectralChannel",
+            "start_wavelength": "200",
+            "end_wavelength": "400",
+            "resolution": "Resolution_12",
+        }
+
 
 class TestTUV(unittest.TestCase):
     def setUp(self) -> None:
@@ -120,6 +144,11 @@ class TestPDA(unittest.TestCase):
         xml_content = self.method.current_method["nativeXml"]
         self.assertIn("<Wavelength1>400</Wavelength1>", xml_content)
 
+    def test_set_channels_single_undo(self):
+        self.method.channels = [PDAChannel(wavelength1="400")]
+        self.method.undo()
+        self.assertEqual(self.method.current_method, self.method.original_method)
+
     def test_get_wavelengths(self):
         self.assertEqual(self.method.wavelengths, ["214", "280"])
 
@@ -0,0 +1,142 @@
+import importlib
+import sys
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+
+from OptiHPLCHandler.empower_module_method import BSMMethod
+from OptiHPLCHandler.gradient_table import GradientTable
+
+
+class TestGradientTable(unittest.TestCase):
+    def setUp(self) -> None:
+        self.gradient_dicts = [
+            {
+                "Time": "Initial",
+                "Flow": "0.3",
+                "CompositionA": "90.0",
+                "CompositionB": "10.0",
+                "Curve": "Initial",
+            },
+            {
+                "Time": "10.0",
+                "Flow": "0.5",
+                "CompositionA": "10.0",
+                "CompositionB": "90.0",
+                "Curve": "6",
+            },
+            {
+                "Time": "12.5",
+                "Flow": "0.5",
+                "CompositionA": "10.0",
+                "CompositionB": "90.0",
+                "Curve": "11",
+            },
+        ]
+        self.table = GradientTable.from_dicts(self.gradient_dicts)
+
+    def test_from_dicts(self):
+        np.testing.assert_array_equal(self.table.time, [0, 10, 12.5])
+        np.testing.assert_array_equal(self.table.curve, [0, 6, 11])
+        assert self.table.solvent_lines == ["A", "B"]
+        assert self.table.to_dicts() == self.gradient_dicts
+
+    def test_xml(self):
+        xml = self.table.to_xml()
+        assert xml.startswith(
+            "<GradientRow><Time>Initial</Time><Flow>0.3</Flow>"
+            "<CompositionA>90.0</CompositionA>"
+        )
+        assert GradientTable.from_xml(xml) == self.table
+        table = GradientTable([0, 1 / 3], [0.5, 0.5], {"A": [100, 2 / 3]})
+        with self.assertWarns(UserWarning):
+            xml = table.to_xml()
+        assert "<Time>0.333</Time>" in xml
+        assert "<CompositionA>0.667</CompositionA>" in xml
+
+    def test_from_xml_like_method(self):
+        xml = (
+            "<GradientRow><Time>Initial</Time><Flow>0.3</Flow>"
+            "<CompositionA>100</CompositionA></GradientRow>"
+            "<GradientRow><Time>1</Time><Flow>0.3</Flow>"
+            "<CompositionA>100</CompositionA><Curve>11</Curve></GradientRow>"
+        )
+        table = GradientTable.from_xml(xml)
+        np.testing.assert_array_equal(table.curve, [0, 11])
+        method = BSMMethod(
+            {"name": "AcquityBSM", "nativeXml": "<GradientTable></GradientTable>"}
+        )
+        method["GradientTable"] = xml
+        assert table == GradientTable.from_dicts(method.gradient_table)
+
+    def test_numpy_missing(self):
+        with patch.dict(sys.modules, {"numpy": None}):
+            sys.modules.pop("OptiHPLCHandler.gradient_table")
+            with self.assertRaisesRegex(ImportError, "gradient"):
+                importlib.import_module("OptiHPLCHandler.gradient_table")
+
+    def test_column_lengths(self):
+        with self.assertRaises(ValueError):
+            GradientTable([0, 1], [0.5], {"A": [100, 100]})
+
+    def test_default_curve(self):
+        table = GradientTable([0, 1], [0.5, 0.5], {"A": [100, 100]})
+        np.testing.assert_array_equal(table.curve, [0, 6])
+
+    def test_scale_time(self):
+        scaled = self.table.scale_time(2)
+        np.testing.assert_array_equal(scaled.time, [0, 20, 25])
+        np.testing.assert_array_equal(self.table.time, [0, 10, 12.5])
+
+    def test_shift_composition(self):
+        shifted = self.table.shift_composition("A", 5)
+        np.testing.assert_allclose(shifted.composition["A"], [95, 15, 15])
+        np.testing.assert_allclose(shifted.composition["B"], [5, 85, 85])
+        shifted = self.table.shift_composition("A", 50)
+        np.testing.assert_allclose(shifted.composition["A"], [100, 60, 60])
+        np.testing.assert_allclose(shifted.composition["B"], [0, 40, 40])
+        with self.assertRaises(ValueError):
+            shifted.shift_composition("A", -10)
+
+    def test_shift_composition_keeps_ratio(self):
+        table = GradientTable([0], [0.5], {"A": [40], "B": [40], "C": [20]})
+        shifted = table.shift_composition("A", 20)
+        np.testing.assert_allclose(shifted.composition["B"], [26.666666666666668])
+        np.testing.assert_allclose(shifted.composition["C"], [13.333333333333334])
+
+    def test_insert_and_delete(self):
+        inserted = self.table.insert(11, 0.4, {"A": 50, "B": 50})
+        np.testing.assert_array_equal(inserted.time, [0, 10, 11, 12.5])
+        np.testing.assert_array_equal(inserted.composition["A"], [90, 10, 50, 10])
+        np.testing.assert_array_equal(inserted.curve, [0, 6, 6, 11])
+        assert inserted.delete(2) == self.table
+        deleted = self.table.delete(0)
+        np.testing.assert_array_equal(deleted.time, [0, 2.5])
+        np.testing.assert_array_equal(deleted.curve, [0, 11])
+        np.testing.assert_array_equal(self.table.curve, [0, 6, 11])
+
+    def test_window(self):
+        window = self.table.window(5, 15)
+        np.testing.assert_array_equal(window.time, [0, 2.5])
+        np.testing.assert_array_equal(window.composition["A"], [10, 10])
+        assert window.to_dicts()[0]["Time"] == "Initial"
+        method = BSMMethod(
+            {"name": "AcquityBSM", "nativeXml": "<GradientTable></GradientTable>"}
+        )
+        method.gradient_table = window
+        assert method.gradient_table[1]["Time"] == "2.5"
+        assert len(self.table.window(20, 30)) == 0
+
+    def test_set_on_method(self):
+        method = BSMMethod(
+            {
+                "name": "AcquityBSM",
+                "nativeXml": "<GradientTable></GradientTable>",
+            }
+        )
+        method.gradient_table = self.table.shift_composition("B", 5)
+        assert method.gradient_table[1]["CompositionB"] == "95.0"
+        assert GradientTable.from_dicts(method.gradient_table) == (
+            self.table.shift_composition("B", 5)
+        )
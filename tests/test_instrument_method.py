@@ -1,6 +1,7 @@
 import json
 import os
 import unittest
+from unittest.mock import patch
 
 from OptiHPLCHandler.empower_detector_module_method import (
     FLRChannel,
@@ -9,7 +10,14 @@ from OptiHPLCHandler.empower_detector_module_method import (
     TUVChannel,
 )
 from OptiHPLCHandler.empower_instrument_method import EmpowerInstrumentMethod
-from OptiHPLCHandler.empower_module_method import SolventManagerMethod
+from OptiHPLCHandler.empower_module_method import (
+    BSMMethod,
+    ColumnManagerMethod,
+    EmpowerModuleMethod,
+    SolventManagerMethod,
+)
+
+init = EmpowerModuleMethod.__init__
 
 
 def get_example_file_dict() -> dict:
@@ -45,6 +53,16 @@ class TestInstrumentMethod(unittest.TestCase):
                 method_definition["results"][0]["modules"]
             )
 
+    def test_module_method_list_equality(self):
+        method = EmpowerInstrumentMethod(self.minimal_definition)
+        modules = list(method.module_method_list)
+        assert method.module_method_list == modules
+        assert method.module_method_list == tuple(modules)
+        assert method.module_method_list == method.module_method_list
+        assert method.module_method_list != []
+        assert method.module_method_list != [EmpowerModuleMethod({})]
+        assert method.module_method_list != "test"
+
     def test_initialisation_method_definition(self):
         for method_definition in self.example.values():
             method = EmpowerInstrumentMethod(method_definition["results"][0])
@@ -69,6 +87,36 @@ class TestInstrumentMethod(unittest.TestCase):
         assert "BSMMethod" in description
         assert "TUVMethod" in description
 
+    def test_modules_created_when_accessed(self):
+        method_definition = self.example["response-BSM-TUV-CM-Acq.json"]
+        with patch.object(
+            ColumnManagerMethod, "__init__", autospec=True, side_effect=init
+        ) as column_manager_init, patch.object(
+            BSMMethod, "__init__", autospec=True, side_effect=init
+        ) as bsm_init:
+            method = EmpowerInstrumentMethod(method_definition)
+            column_manager_init.assert_not_called()
+            method.column_temperature
+            column_manager_init.assert_called_once()
+            method.column_oven_method_list
+            column_manager_init.assert_called_once()
+            bsm_init.assert_not_called()
+            assert (
+                method.current_method
+                == EmpowerInstrumentMethod(method_definition).current_method
+            )
+
+    def test_replace_module_method(self):
+        method_definition = self.example["response-BSM-TUV-CM-Acq.json"]
+        method = EmpowerInstrumentMethod(method_definition)
+        assert method.solvent_handler_method is not None
+        solvent_manager_index = method.module_method_list.classes.index(BSMMethod)
+        method.module_method_list[solvent_manager_index] = EmpowerModuleMethod({})
+        assert method.solvent_handler_method is None
+        method.module_method_list = [EmpowerModuleMethod({})]
+        assert method.column_oven_method_list == []
+        assert len(method.current_method["modules"]) == 1
+
     def test_column_oven_method_list(self):
         method_definition = self.example["response-BSM-TUV-CM-Acq.json"]
         method = EmpowerInstrumentMethod(method_definition)
@@ -130,6 +178,29 @@ class TestInstrumentMethod(unittest.TestCase):
         )
         assert method.original_method == method_definition["results"][0]
 
+    def test_current_method_cached(self):
+        method = EmpowerInstrumentMethod(self.example["response-BSM-TUV-CM-Acq.json"])
+        first = method.current_method
+        first["modules"][0]["nativeXml"] = "changed by caller"
+        assert method.current_method["modules"][0]["nativeXml"] != "changed by caller"
+        method.column_temperature = "45"
+        assert "<SetColumnTemperature>45.0</SetColumnTemperature>" in (
+            method.current_method["modules"][-1]["nativeXml"]
+        )
+        method.column_oven_method_list[0].undo()
+        assert method.current_method["modules"][-1]["nativeXml"] == (
+            method.original_method["modules"][-1]["nativeXml"]
+        )
+        method.method_name = "new_name"
+        assert method.current_method["methodName"] == "new_name"
+
+    def test_current_method_after_replacing_modules(self):
+        method = EmpowerInstrumentMethod(self.example["response-BSM-TUV-CM-Acq.json"])
+        other = EmpowerInstrumentMethod(self.example["response-BSM-PDA-CM-Acq.json"])
+        method.current_method
+        method.module_method_list = other.module_method_list
+        assert method.current_method["modules"] == other.current_method["modules"]
+
     def test_copy(self):
         method = EmpowerInstrumentMethod(self.example["response-BSM-TUV-CM-Acq.json"])
         copy = method.copy()
@@ -167,6 +238,87 @@ class TestInstrumentMethod(unittest.TestCase):
         copy.sample_temperature = "50.0"
         assert method.sample_temperature == copy.sample_temperature
 
+    def test_copy_shares_original_method(self):
+        method = EmpowerInstrumentMethod(self.example["response-BSM-TUV-CM-Acq.json"])
+        copy = method.copy()
+        assert copy.original_method is method.original_method
+        for module, module_copy in zip(
+            method.module_method_list, copy.module_method_list
+        ):
+            assert module_copy is not module
+            assert module_copy.original_method is module.original_method
+
+    def test_checkpoint_and_rollback(self):
+        for backend in ["string", "tree"]:
+            method = EmpowerInstrumentMethod(
+                self.example["response-BSM-TUV-CM-Acq.json"], backend=backend
+            )
+            method.valve_position = "A2"
+            original = method.current_method
+            checkpoint = method.checkpoint()
+            method.method_name = "variant"
+            method.column_temperature = "50.0"
+            method.column_temperature = "55.0"
+            gradient_table = method.gradient_table
+            gradient_table[0]["Flow"] = "0.1"
+            method.gradient_table = gradient_table
+            method.module_method_list.append(method.module_method_list[0].copy())
+            method.rollback(checkpoint)
+            assert method.current_method == original
+            assert method.method_name == original["methodName"]
+            assert method.valve_position == ["A2", "B1"]
+            method.column_temperature = "45.0"
+            method.rollback(checkpoint)
+            assert method.current_method == original
+            method.solvent_handler_method.undo()
+            assert method.valve_position == ["A1", "B1"]
+
+    def test_transaction(self):
+        method = EmpowerInstrumentMethod(self.example["response-BSM-TUV-CM-Acq.json"])
+        original = method.current_method
+        with method.transaction():
+            method.method_name = "variant"
+            method.column_temperature = "50.0"
+            assert method.current_method["methodName"] == "variant"
+        assert method.current_method == original
+        with self.assertRaises(ValueError):
+            with method.transaction():
+                method.column_temperature = "50.0"
+                raise ValueError("Posting failed")
+        assert method.current_method == original
+
+    def test_diff(self):
+        method = EmpowerInstrumentMethod(self.example["response-BSM-TUV-CM-Acq.json"])
+        variants = [method.copy() for _ in range(3)]
+        variants[1].column_temperature = "50.0"
+        variants[2].valve_position = "A2"
+        variants[2].method_name = "variant"
+        gradient_table = variants[2].gradient_table
+        gradient_table[0]["Flow"] = "0.1"
+        variants[2].gradient_table = gradient_table
+        with patch.object(
+            EmpowerModuleMethod, "__init__", autospec=True, side_effect=init
+        ) as created:
+            differences = method.diff_many(variants)
+            assert created.call_count == 2  # Only the changed module methods
+        assert differences[0] == {}
+        assert differences[1] == {
+            "AcquityCM": {
+                "module/ColumnManager/SetColumnTemperature": ("HeaterOff_-1", "50.0")
+            }
+        }
+        assert differences[2] == {
+            "AcquityBSM": {
+                "module/FlowSourceA": ("1", "2"),
+                # The first row is written as "Initial" when the table is set
+                "module/GradientTable/GradientRow/Time": ("0.00", "Initial"),
+                "module/GradientTable/GradientRow/Flow": ("0.600", "0.1"),
+                "module/GradientTable/GradientRow/Curve": ("6", "Initial"),
+            }
+        }
+        variants[1].module_method_list.pop(0)
+        assert list(method.diff(variants[1])) == ["rAcquityFTN", "AcquityCM"]
+
     def test_copy_sample_manager_column_oven(self):
         """
         Test that the copy method works when the sample manager column oven is used.
@@ -0,0 +1,69 @@
+import json
+import os
+import unittest
+
+from OptiHPLCHandler import EmpowerInstrumentMethod
+from OptiHPLCHandler.method_template import MethodTemplate
+
+
+class TestMethodTemplate(unittest.TestCase):
+    def setUp(self) -> None:
+        with open(
+            os.path.join(
+                "tests", "empower_method_examples", "response-BSM-TUV-CM-Acq.json"
+            )
+        ) as f:
+            self.method = EmpowerInstrumentMethod(json.load(f))
+
+    def test_render_same_as_changing_method(self):
+        template = self.method.to_template(["SetColumnTemperature", "FlowSourceA"])
+        assert template.defaults == {
+            "SetColumnTemperature": "HeaterOff_-1",
+            "FlowSourceA": "1",
+        }
+        rendered = template.render(
+            {"SetColumnTemperature": 45.0, "FlowSourceA": "2"}, method_name="variant"
+        )
+        self.method.column_temperature = 45
+        self.method.valve_position = "A2"
+        self.method.method_name = "variant"
+        assert rendered == self.method.current_method
+
+    def test_render_defaults(self):
+        template = self.method.to_template(["SetColumnTemperature"])
+        assert template.render({}) == self.method.current_method
+        rendered = template.render({"SetColumnTemperature": "50.0"})
+        assert EmpowerInstrumentMethod(rendered).column_temperature == "50.0"
+        assert template.render({}) == self.method.current_method
+
+    def test_defaults_of_each_module(self):
+        method = {
+            "methodName": "test",
+            "modules": [
+                {"name": "a", "nativeXml": "<a><k>1</k></a>"},
+                {"name": "b", "nativeXml": "<b><k>2</k></b>"},
+            ],
+        }
+        template = MethodTemplate(method, ["k"])
+        assert [module["nativeXml"] for module in template.render({})["modules"]] == [
+            "<a><k>1</k></a>",
+            "<b><k>2</k></b>",
+        ]
+        assert [
+            module["nativeXml"] for module in template.render({"k": 3})["modules"]
+        ] == ["<a><k>3</k></a>", "<b><k>3</k></b>"]
+
+    def test_unknown_parameters(self):
+        with self.assertRaises(KeyError):
+            self.method.to_template(["Missing"])
+        template = self.method.to_template(["FlowSourceA"])
+        with self.assertRaises(KeyError):
+            template.render({"SetColumnTemperature": "50.0"})
+
+    def test_nested_parameters(self):
+        method = {
+            "methodName": "test",
+            "modules": [{"name": "test", "nativeXml": "<a><b>1</b></a>"}],
+        }
+        with self.assertRaises(ValueError):
+            MethodTemplate(method, ["a", "b"])
@@ -2,16 +2,25 @@ import json
 import os
 import unittest
 import warnings
+from random import Random
+from unittest.mock import patch
+from xml.etree import ElementTree as ET
 
+from OptiHPLCHandler import factories
+from OptiHPLCHandler.empower_detector_module_method import PDAMethod
 from OptiHPLCHandler.empower_module_method import (
     BSMMethod,
     ColumnManagerMethod,
     ColumnOvenMethod,
     EmpowerModuleMethod,
+    GradientStep,
     QSMMethod,
     SampleManagerMethod,
+    decode_gradient_table,
+    encode_gradient_table,
 )
-from OptiHPLCHandler.factories import module_method_factory
+from OptiHPLCHandler.factories import module_method_factory, register_module_method
+from OptiHPLCHandler.utils.xml_tree import TagOffsetIndex
 
 
 def load_example_files() -> dict:
@@ -68,6 +77,31 @@ class TestModuleMethodFactory(unittest.TestCase):
         module_method = module_method_factory(minimal_definition)
         assert isinstance(module_method, EmpowerModuleMethod)
 
+    def test_root_tag(self):
+        with open(
+            os.path.join("tests", "empower_method_examples", "PDA_example.xml")
+        ) as f:
+            definition = {"nativeXml": f.read()}
+        module_method = module_method_factory(definition)
+        assert isinstance(module_method, PDAMethod)
+
+    def test_register(self):
+        class CustomMethod(EmpowerModuleMethod):
+            pass
+
+        self.addCleanup(factories._match_pattern.cache_clear)
+        with patch.dict(factories._module_names), patch.object(
+            factories, "_module_patterns", list(factories._module_patterns)
+        ):
+            register_module_method(
+                CustomMethod, patterns=["Custom"], names=["AcquityPDA"]
+            )
+            for name in ["MyCustomModule", "AcquityPDA"]:
+                assert isinstance(module_method_factory({"name": name}), CustomMethod)
+            assert isinstance(module_method_factory({"name": "AcquityPDA2"}), PDAMethod)
+            with self.assertRaises(TypeError):
+                register_module_method(dict, patterns=["dict"])
+
 
 class TestModuleMethod(unittest.TestCase):
     def setUp(self) -> None:
@@ -114,6 +148,131 @@ class TestModuleMethod(unittest.TestCase):
         with self.assertRaises(IndexError):
             module_method.undo()
 
+    def test_reads_do_not_replay_changes(self):
+        minimal_definition = {"name": "test", "nativeXml": "<a>0</a>"}
+        module_method = module_method_factory(minimal_definition)
+        for value in range(1, 101):
+            module_method["a"] = str(value)
+            module_method.checkpoint()
+        with patch.object(EmpowerModuleMethod, "alter_method") as alter_method:
+            assert module_method["a"] == "100"
+            assert module_method.current_method["nativeXml"] == "<a>100</a>"
+            alter_method.assert_not_called()
+        for _ in range(99):
+            module_method.undo()
+        assert module_method["a"] == "1"
+
+    def test_same_key_changes_folded(self):
+        for backend in ["string", "tree"]:
+            module_method = module_method_factory(
+                {"name": "test", "nativeXml": "<a>0</a><b>0</b>"}, backend=backend
+            )
+            for value in range(1, 11):
+                module_method["a"] = str(value)
+            assert module_method._change_list == [("<a>0</a>", "<a>10</a>")]
+            module_method.checkpoint()
+            module_method["a"] = "11"
+            module_method["a"] = "12"
+            module_method.update({"a": "13", "b": "1"})
+            module_method.update({"a": "14", "b": "2"})
+            module_method["b"] = "3"
+            assert len(module_method._change_list) == 5
+            assert module_method.current_method["nativeXml"] == "<a>14</a><b>3</b>"
+            module_method.undo()
+            assert module_method.current_method["nativeXml"] == "<a>14</a><b>2</b>"
+            module_method.undo()
+            assert module_method.current_method["nativeXml"] == "<a>12</a><b>0</b>"
+            module_method.undo()
+            assert module_method.current_method["nativeXml"] == "<a>10</a><b>0</b>"
+            module_method.undo()
+            assert module_method.current_method["nativeXml"] == "<a>0</a><b>0</b>"
+            with self.assertRaises(IndexError):
+                module_method.undo()
+
+    def test_not_folded_into_copied_changes(self):
+        for backend in ["string", "tree"]:
+            module_method = module_method_factory(
+                {"name": "test", "nativeXml": "<a>0</a>"}, backend=backend
+            )
+            module_method["a"] = "1"
+            copy = module_method.copy()
+            module_method["a"] = "2"
+            copy["a"] = "3"
+            module_method.undo()
+            copy.undo()
+            assert module_method["a"] == "1"
+            assert copy["a"] == "1"
+            module_method.undo()
+            assert module_method["a"] == "0"
+
+    def test_rollback_and_revert(self):
+        for backend in ["string", "tree"]:
+            module_method = module_method_factory(
+                {"name": "test", "nativeXml": "<a>0</a><b>0</b>"}, backend=backend
+            )
+            module_method["a"] = "1"
+            checkpoint = module_method.checkpoint()
+            copy = module_method.copy()
+            module_method["a"] = "2"
+            module_method.replace("<b>0</b>", "<b>1</b>")
+            module_method.rollback(checkpoint)
+            assert module_method.current_method["nativeXml"] == "<a>1</a><b>0</b>"
+            module_method["b"] = "2"
+            copy.rollback(checkpoint)
+            assert copy.current_method["nativeXml"] == "<a>1</a><b>0</b>"
+            module_method.undo()
+            assert module_method.current_method["nativeXml"] == "<a>1</a><b>0</b>"
+            module_method.revert()
+            assert module_method.current_method == module_method.original_method
+            with self.assertRaises(IndexError):
+                module_method.undo()
+
+    def test_rollback_tree_without_copying(self):
+        module_method = module_method_factory(
+            {"name": "test", "nativeXml": "<a>0</a><b>0</b>"}, backend="tree"
+        )
+        module_method["a"] = "1"
+        module_method.update({"a": "2", "b": "1"})
+        checkpoint = module_method.checkpoint()
+        with patch("OptiHPLCHandler.empower_module_method.deepcopy") as deepcopy:
+            for value in range(3, 6):
+                module_method["a"] = str(value)
+                module_method.replace("<b>1</b>", "<b>2</b>")
+                module_method.rollback(checkpoint)
+                assert module_method.current_method["nativeXml"] == "<a>2</a><b>1</b>"
+            deepcopy.assert_not_called()
+        # Undone past the checkpoint, so the changes up to it are made again
+        module_method.undo()
+        module_method["b"] = "3"
+        module_method.rollback(checkpoint)
+        assert module_method.current_method["nativeXml"] == "<a>2</a><b>1</b>"
+        module_method.undo()
+        assert module_method.current_method["nativeXml"] == "<a>1</a><b>0</b>"
+
+    def test_diff(self):
+        module_method = module_method_factory(
+            {"name": "test", "nativeXml": "<a>0</a><b><c>0</c><c>0</c></b>"}
+        )
+        copy = module_method.copy()
+        assert module_method.diff(copy) == {}
+        copy["a"] = "1"
+        assert module_method.diff(copy) == {"a": ("0", "1")}
+        copy.replace("<c>0</c></b>", "<c>2</c></b>")
+        assert copy.diff(module_method) == {"a": ("1", "0"), "b/c[1]": ("2", "0")}
+        copy.replace("</b>", "<d>3</d></b>")
+        assert module_method.diff(copy) == {
+            "a": ("0", "1"),
+            "b/c[1]": ("0", "2"),
+            "b/d": (None, "3"),
+        }
+
+    def test_replace_missing_warns(self):
+        minimal_definition = {"name": "test", "nativeXml": "<a>value</a>"}
+        module_method = module_method_factory(minimal_definition)
+        with self.assertWarns(UserWarning):
+            module_method.replace("not there", "new")
+        assert module_method.current_method["nativeXml"] == "<a>value</a>"
+
     def test_module_method_replace_no_xml_no_changes(self):
         minimal_definition = {"name": "test"}
         module_method = module_method_factory(minimal_definition)
@@ -215,6 +374,108 @@ class TestModuleMethod(unittest.TestCase):
         module_method["a"] = "newer_value"
         assert module_method["a"] != copy["a"]
 
+    def test_copy_shares_original_and_changes(self):
+        for backend in ["string", "tree"]:
+            module_method = module_method_factory(
+                self.example_definition, backend=backend
+            )
+            module_method["Lamp"] = "false"
+            copy = module_method.copy()
+            assert copy.original_method is module_method.original_method
+            assert copy._last_step is module_method._last_step
+            copy["DataRate"] = "10"
+            module_method["DataRate"] = "5"
+            assert copy.get_many(["Lamp", "DataRate"]) == {
+                "Lamp": "false",
+                "DataRate": "10",
+            }
+            assert module_method["DataRate"] == "5"
+            copy.undo()
+            copy.undo()
+            assert copy.current_method == copy.original_method
+            assert module_method.get_many(["Lamp", "DataRate"]) == {
+                "Lamp": "false",
+                "DataRate": "5",
+            }
+
+    def test_tree_backend(self):
+        definition = self.example_definition
+        string_method = module_method_factory(definition)
+        tree_method = module_method_factory(definition, backend="tree")
+        assert tree_method.current_method == string_method.current_method
+        for key in ["Lamp", "DataRate", "FilterType"]:
+            assert tree_method[key] == string_method[key]
+            string_method[key] = "new_value"
+            tree_method[key] = "new_value"
+        string_method.replace("<Enable>false", "<Enable>true")
+        tree_method.replace("<Enable>false", "<Enable>true")
+        assert tree_method.current_method == string_method.current_method
+        tree_copy = tree_method.copy()
+        for method in [string_method, tree_method]:
+            method.undo()
+            method.undo()
+        assert tree_method.current_method == string_method.current_method
+        assert tree_copy["FilterType"] != tree_method["FilterType"]
+
+    def test_get_many(self):
+        module_method = module_method_factory(self.example_definition)
+        values = module_method.get_many(["Lamp", "DataRate"])
+        assert values["DataRate"] == "SingleDataRate_20"
+        assert values["Lamp"] == module_method.find_value(
+            module_method.original_method["nativeXml"], "Lamp"
+        )
+        with patch(
+            "OptiHPLCHandler.empower_module_method.TagOffsetIndex",
+            wraps=TagOffsetIndex,
+        ) as index:
+            module_method.get_many(["Lamp", "DataRate", "FilterType"])
+            module_method["Lamp"]
+            index.assert_not_called()
+            module_method["DataRate"] = "10"
+            assert module_method["DataRate"] == "10"
+            index.assert_not_called()  # A single read doesn't build the index
+            assert module_method.get_many(["Lamp", "DataRate"])["DataRate"] == "10"
+            index.assert_called_once()
+        with self.assertRaises(KeyError):
+            module_method.get_many(["Lamp", "Missing"])
+
+    def test_update(self):
+        for backend in ["string", "tree"]:
+            module_method = module_method_factory(
+                self.example_definition, backend=backend
+            )
+            original = module_method.current_method
+            module_method.update({"Lamp": "false", "DataRate": "10"})
+            assert module_method.get_many(["Lamp", "DataRate"]) == {
+                "Lamp": "false",
+                "DataRate": "10",
+            }
+            assert module_method.current_method == EmpowerModuleMethod.alter_method(
+                original, module_method._change_list
+            )
+            module_method.undo()
+            assert module_method.current_method == original
+            with self.assertRaises(KeyError):
+                module_method.update({"Lamp": "false", "Missing": "1"})
+            assert module_method.current_method == original
+
+    def test_update_nested_keys(self):
+        for backend in ["string", "tree"]:
+            module_method = module_method_factory(
+                {"name": "test", "nativeXml": "<a><b>1</b></a><c>2</c>"},
+                backend=backend,
+            )
+            original = module_method.current_method
+            with self.assertRaises(ValueError):
+                module_method.update({"a": "<b>2</b>", "b": "3"})
+            with self.assertRaises(ValueError):
+                module_method.update({"c": "<b>5</b>", "b": "7"})
+            assert module_method.current_method == original
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            module_method_factory(self.example_definition, backend="unknown")
+
 
 class TestColumnOvens(unittest.TestCase):
     def setUp(self) -> None:
@@ -921,6 +1182,97 @@ class testBSMMethod(unittest.TestCase):
         assert module_method.gradient_table[1]["CompositionB"] == "90.0"
         assert str(module_method.gradient_table[1]["Curve"]) == "6"
 
+    def test_gradient_steps(self):
+        module_method = BSMMethod(self.medium_definition)
+        assert module_method.gradient_steps == (
+            GradientStep(time=0.0, flow=0.3, composition=(90.0, 10.0), curve=None),
+            GradientStep(time=10.0, flow=0.5, composition=(10.0, 90.0), curve=6),
+        )
+
+    def test_gradient_table_cached(self):
+        module_method = BSMMethod(self.medium_definition)
+        with patch(
+            "OptiHPLCHandler.empower_module_method.decode_gradient_table",
+            wraps=decode_gradient_table,
+        ) as decode:
+            steps = module_method.gradient_steps
+            gradient_table = module_method.gradient_table
+            gradient_table[1]["Flow"] = "0.1"  # Doesn't change the cache
+            module_method.valve_position = ["A2"]
+            assert module_method.gradient_steps is steps
+            assert module_method.gradient_table[1]["Flow"] == "0.500"
+            decode.assert_called_once()
+            module_method.gradient_table = gradient_table
+            assert module_method.gradient_steps[1].flow == 0.1
+            assert decode.call_count == 2
+
+    def test_gradient_codec_matches_element_tree(self):
+        def element_tree_encode(gradient_table, solvent_lines):
+            xml = ET.Element("GradientTable")
+            for row in gradient_table:
+                row_xml = ET.SubElement(xml, "GradientRow")
+                for key in ["Time", "Flow"] + [
+                    f"Composition{x}" for x in solvent_lines
+                ]:
+                    ET.SubElement(row_xml, key).text = EmpowerModuleMethod._round(
+                        row[key]
+                    )
+                ET.SubElement(row_xml, "Curve").text = str(row.get("Curve", "6"))
+            gradient_xml = ET.tostring(xml, encoding="unicode")
+            return gradient_xml[len("<GradientTable>") : -len("</GradientTable>")]
+
+        random = Random(0)
+        for _ in range(50):
+            gradient_table = [
+                {
+                    "Time": random.choice(["Initial", 0, "1.5", random.random() * 10]),
+                    "Flow": random.choice(["0.600", 0.5, random.random()]),
+                    "CompositionA": random.choice([100, "50.0", random.random() * 100]),
+                    "CompositionB": random.choice(["0", 12.25, "a&b"]),
+                    "Curve": random.choice(["Initial", 6, "11"]),
+                }
+                for _ in range(random.randint(1, 10))
+            ]
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                expected = element_tree_encode(gradient_table, ["A", "B"])
+                encoded = encode_gradient_table(gradient_table, ["A", "B"])
+            assert encoded == expected
+            expected_rows = tuple(
+                tuple((field.tag, field.text) for field in row)
+                for row in ET.fromstring(f"<root>{expected}</root>")
+            )
+            assert decode_gradient_table(encoded) == expected_rows
+        for gradient_xml in [
+            " <GradientRow><Curve/></GradientRow> ",
+            "<GradientRow><Time>1</Time><Curve></Curve></GradientRow>",
+        ]:
+            assert decode_gradient_table(gradient_xml) == tuple(
+                tuple((field.tag, field.text) for field in row)
+                for row in ET.fromstring(f"<root>{gradient_xml}</root>")
+            )
+        assert decode_gradient_table("<GradientRow><Curve></Curve></GradientRow>") == (
+            (("Curve", None),),
+        )
+        with self.assertRaises(ValueError):
+            decode_gradient_table("<Other></Other>")
+
+    def test_gradient_table_setter_one_warning(self):
+        module_method = BSMMethod(self.minimal_definition)
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            module_method.gradient_table = [
+                {
+                    "Time": 0,
+                    "Flow": 0.12345,
+                    "CompositionA": 33.33333,
+                    "CompositionB": 0,
+                },
+                {"Time": 1, "Flow": 0.12345, "CompositionA": 100, "CompositionB": 0},
+            ]
+        assert len(caught) == 1
+        assert "Rounding 3 value(s)" in str(caught[0].message)
+
     def test_gradient_table_setter(self):
         module_method = BSMMethod(self.minimal_definition)
         module_method.gradient_table = [
@@ -1,8 +1,17 @@
+import os
+import tempfile
+import time
 import unittest
+from datetime import datetime, timezone
 from unittest.mock import MagicMock, patch
 
+import requests
+
 from OptiHPLCHandler import EmpowerHandler, EmpowerInstrumentMethod, EmpowerModuleMethod
 from OptiHPLCHandler.empower_api_core import EmpowerResponse
+from OptiHPLCHandler.empower_handler import _parse_time
+from OptiHPLCHandler.execution_plan import ExecutionPlan
+from OptiHPLCHandler.post_journal import PostJournal
 
 
 def create_empower_response(content):
@@ -426,6 +435,51 @@ class TestGetMethods(unittest.TestCase):
         with self.assertRaises(ValueError):
             self.handler.GetMethodList()
 
+    def test_filter_method_list(self):
+        self.handler.connection.get.return_value = create_empower_response(
+            [
+                {
+                    "fields": [
+                        {"name": "Name", "value": name},
+                        {"name": "DateModified", "value": modified},
+                        {"name": "irrelevant_field", "value": "irrelevant_value"},
+                    ]
+                }
+                for name, modified in [
+                    ("robustness_1", "2024-01-10T12:00:00Z"),
+                    ("robustness_2", "2024-02-10T12:00:00.1234567Z"),
+                    ("other_method", "2024-02-10T12:00:00.5+01:00"),
+                ]
+            ]
+        )
+        assert self.handler.GetMethodList(name_contains="robustness") == [
+            "robustness_1",
+            "robustness_2",
+        ]
+        assert self.handler.GetMethodList(name_pattern="_[2-9]$") == ["robustness_2"]
+        assert self.handler.GetMethodList(
+            modified_after=datetime(2024, 2, 1, tzinfo=timezone.utc),
+            modified_before=datetime(2024, 3, 1, tzinfo=timezone.utc),
+        ) == ["robustness_2", "other_method"]
+        assert self.handler.GetMethodList(
+            name_contains="1", fields=["Name", "DateModified", "Missing"]
+        ) == [
+            {
+                "Name": "robustness_1",
+                "DateModified": "2024-01-10T12:00:00Z",
+                "Missing": None,
+            }
+        ]
+
+    def test_parse_time(self):
+        assert _parse_time("2024-02-10T12:00:00.1234567Z") == datetime(
+            2024, 2, 10, 12, 0, 0, 123456, tzinfo=timezone.utc
+        )
+        assert _parse_time("2024-02-10T12:00:00.5Z") == datetime(
+            2024, 2, 10, 12, 0, 0, 500000, tzinfo=timezone.utc
+        )
+        assert _parse_time("2024-02-10T12:00:00") == datetime(2024, 2, 10, 12)
+
     def test_get_sample_set_method_list(self):
         self.handler.connection.get.return_value = create_empower_response(
             ["test_samplesetmethod_1"]
@@ -657,6 +711,29 @@ class TestInstrumentMethodInteraction(unittest.TestCase):
             == "<test_tag1>new_value</test_tag1><test_tag2>newer_value</test_tag2>"
         )
 
+    def test_get_method_cached(self):
+        self.handler.connection.api_version = "2.0"
+        self.handler.connection.get.return_value = create_empower_response(
+            {"methodName": "test_method", "modules": []},
+        )
+        first_method = self.handler.GetInstrumentMethod("test_method_name")
+        second_method = self.handler.GetInstrumentMethod("test_method_name")
+        assert self.handler.connection.get.call_count == 1
+        assert first_method is not second_method
+        assert self.handler.method_cache.hit_ratio == 0.5
+        self.handler.GetInstrumentMethod("other_method_name")
+        assert self.handler.connection.get.call_count == 2
+
+    def test_post_method_invalidates_cache(self):
+        self.handler.connection.api_version = "2.0"
+        self.handler.connection.get.return_value = create_empower_response(
+            {"methodName": "test_method_name", "modules": []},
+        )
+        method = self.handler.GetInstrumentMethod("test_method_name")
+        self.handler.PostInstrumentMethod(method)
+        self.handler.GetInstrumentMethod("test_method_name")
+        assert self.handler.connection.get.call_count == 2
+
 
 class TestMethodSetMethodInteraction(unittest.TestCase):
     @patch("OptiHPLCHandler.empower_handler.EmpowerConnection")
@@ -688,6 +765,20 @@ class TestMethodSetMethodInteraction(unittest.TestCase):
         )
         assert method["name"] == "test_method_return_name"
 
+    def test_get_cached(self):
+        self.handler.connection.get.return_value = create_empower_response(
+            {"name": "test_method_name"},
+        )
+        self.handler.connection.api_version = "2.0"
+        method = self.handler.GetMethodSetMethod("test_method_name")
+        method["name"] = "changed_name"
+        method = self.handler.GetMethodSetMethod("test_method_name")
+        assert self.handler.connection.get.call_count == 1
+        assert method["name"] == "test_method_name"
+        self.handler.PostMethodSetMethod(method)
+        self.handler.GetMethodSetMethod("test_method_name")
+        assert self.handler.connection.get.call_count == 2
+
     def test_post(self):
         self.handler.PostMethodSetMethod(
             {"name": "test_method_name", "test_field": "test_value"}
@@ -723,6 +814,578 @@ class TestStatus(unittest.TestCase):
         assert result == {"FirstKey": "FirstValue", "SecondKey": "SecondValue"}
 
 
+def fake_fleet_get(endpoint, timeout=None):
+    """Fake `connection.get` for a fleet with two nodes and three systems."""
+    if endpoint == "acquisition/nodes":
+        return create_empower_response(["node_1", "node_2"])
+    if endpoint.startswith("acquisition/chromatographic-systems"):
+        if endpoint.endswith("node_1"):
+            return create_empower_response(["system_1", "system_2"])
+        return create_empower_response(["system_3"])
+    if "systemName=system_2" in endpoint:
+        time.sleep(1)
+    return create_empower_response([{"name": "SystemState", "value": "Idle"}])
+
+
+class TestReferenceData(unittest.TestCase):
+    @patch("OptiHPLCHandler.empower_handler.EmpowerConnection")
+    def setUp(self, _) -> None:
+        self.handler = EmpowerHandler(
+            project="test_project",
+            address="https://test_address/",
+        )
+        self.handler.connection.get.return_value = create_empower_response(["value"])
+
+    def test_cached(self):
+        for _ in range(2):
+            self.handler.GetNodeNames()
+            self.handler.GetSystemNames("node")
+            self.handler.GetPlateTypeNames()
+            self.handler.GetSampleSetMethods()
+        assert self.handler.connection.get.call_count == 4
+        self.handler.GetSystemNames("other_node")
+        self.handler.GetPlateTypeNames(filter_string="48")
+        assert self.handler.connection.get.call_count == 6
+
+    def test_invalidate(self):
+        self.handler.GetNodeNames()
+        self.handler.reference_cache.invalidate("nodes")
+        self.handler.GetNodeNames()
+        assert self.handler.connection.get.call_count == 2
+
+    def test_post_experiment_invalidates(self):
+        self.handler.GetSampleSetMethods()
+        self.handler.PostExperiment(
+            sample_set_method_name="test_sample_set", sample_list=[], plates={}
+        )
+        self.handler.GetSampleSetMethods()
+        assert self.handler.connection.get.call_count == 2
+
+
+class TestFleetSnapshot(unittest.TestCase):
+    @patch("OptiHPLCHandler.empower_handler.EmpowerConnection")
+    def setUp(self, _) -> None:
+        self.handler = EmpowerHandler(
+            project="test_project",
+            address="https://test_address/",
+        )
+        self.handler.connection.get.side_effect = fake_fleet_get
+
+    def test_snapshot(self):
+        snapshot = self.handler.GetFleetSnapshot(time_budget=0.5)
+        assert [(row["node"], row["system"]) for row in snapshot] == [
+            ("node_1", "system_1"),
+            ("node_1", "system_2"),
+            ("node_2", "system_3"),
+        ]
+        assert snapshot[0]["SystemState"] == "Idle"
+        assert snapshot[0]["timed_out"] is False
+        assert snapshot[1]["timed_out"] is True
+        # The status of system_2 takes longer than the time budget
+        assert "SystemState" not in snapshot[1]
+        assert snapshot[2]["SystemState"] == "Idle"
+
+    def test_node_names_in_time_budget(self):
+        def slow_nodes(endpoint, timeout=None):
+            if endpoint == "acquisition/nodes":
+                time.sleep(1)
+            return fake_fleet_get(endpoint, timeout)
+
+        self.handler.connection.get.side_effect = slow_nodes
+        start = time.monotonic()
+        snapshot = self.handler.GetFleetSnapshot(time_budget=0.2)
+        assert time.monotonic() - start < 0.8
+        assert snapshot == [
+            {"node": None, "system": None, "timed_out": True, "error": None}
+        ]
+        self.handler.connection.get.side_effect = ValueError("No nodes")
+        snapshot = self.handler.GetFleetSnapshot(time_budget=0.2)
+        assert snapshot[0]["error"] == "No nodes"
+
+    def test_topology_cached(self):
+        self.handler.GetFleetSnapshot(time_budget=0.5)
+        self.handler.connection.get.reset_mock()
+        self.handler.GetFleetSnapshot(time_budget=0.5)
+        endpoints = [
+            call[1]["endpoint"] for call in self.handler.connection.get.call_args_list
+        ]
+        assert "acquisition/nodes" not in endpoints
+        assert len(endpoints) == 3  # Only the statuses are fetched
+        self.handler.connection.get.reset_mock()
+        self.handler.GetFleetSnapshot(time_budget=0.5, refresh_topology=True)
+        endpoints = [
+            call[1]["endpoint"] for call in self.handler.connection.get.call_args_list
+        ]
+        assert "acquisition/nodes" in endpoints
+
+    def test_error(self):
+        def failing_get(endpoint, timeout=None):
+            if "systemName=system_3" in endpoint:
+                raise ValueError("Empower error")
+            return fake_fleet_get(endpoint, timeout)
+
+        self.handler.connection.get.side_effect = failing_get
+        snapshot = self.handler.GetFleetSnapshot(time_budget=0.5)
+        assert snapshot[2]["error"] == "Empower error"
+        assert snapshot[2]["timed_out"] is False
+
+
+class TestExecutionPlan(unittest.TestCase):
+    @patch("OptiHPLCHandler.empower_handler.EmpowerConnection")
+    def setUp(self, _) -> None:
+        self.handler = EmpowerHandler(
+            project="test_project",
+            address="https://test_address/",
+        )
+        self.method = EmpowerInstrumentMethod(
+            {
+                "methodName": "test_method",
+                "modules": [{"name": "test", "nativeXml": "<a>value</a>"}],
+            }
+        )
+
+    def record(self):
+        with self.handler.record_plan() as plan:
+            self.handler.PostInstrumentMethod(self.method)
+            self.handler.PostMethodSetMethod(
+                {"name": "test_method", "instrumentMethod": "test_method"}
+            )
+            self.handler.PostExperiment(
+                sample_set_method_name="test_sample_set",
+                sample_list=[{"Method": "test_method", "SamplePos": "1:A,1"}],
+                plates={"1": "ANSI-48Vial2mLHolder"},
+            )
+            self.handler.RunExperiment(
+                sample_set_method="test_sample_set", node="node", system="system"
+            )
+        return plan
+
+    def test_record(self):
+        plan = self.record()
+        self.handler.connection.post.assert_not_called()
+        assert [operation.operation for operation in plan.operations] == [
+            "PostInstrumentMethod",
+            "PostMethodSetMethod",
+            "PostExperiment",
+            "RunExperiment",
+        ]
+        assert plan.validate() == []
+        assert len(plan.stages()) == 4
+        # The plan is not recording after the context manager is closed
+        self.handler.PostInstrumentMethod(self.method)
+        self.handler.connection.post.assert_called_once()
+        assert len(plan) == 4
+
+    def test_snapshot_of_method(self):
+        with self.handler.record_plan() as plan:
+            self.handler.PostInstrumentMethod(self.method)
+        self.method.module_method_list[0]["a"] = "new_value"
+        assert plan.operations[0].body["modules"][0]["nativeXml"] == "<a>value</a>"
+
+    def test_serialisation(self):
+        plan = self.record()
+        loaded_plan = ExecutionPlan.from_json(plan.to_json())
+        assert loaded_plan.operations == plan.operations
+
+    def test_validate(self):
+        with self.handler.record_plan() as plan:
+            self.handler.PostMethodSetMethod(
+                {"name": "test_method", "instrumentMethod": "existing_method"}
+            )
+        assert plan.validate() == ["InstrumentMethod:existing_method"]
+        with self.handler.record_plan(plan):
+            self.handler.PostMethodSetMethod({"name": "test_method"})
+        with self.assertRaises(ValueError):
+            plan.validate()
+        with self.handler.record_plan() as plan:
+            self.handler.PostMethodSetMethod(
+                {"name": "test_method", "instrumentMethod": "test_method"}
+            )
+            self.handler.PostInstrumentMethod(self.method)
+        with self.assertRaises(ValueError):
+            plan.validate()  # Instrument method posted after the method set method
+
+    def test_execute(self):
+        plan = self.record()
+        with self.handler.record_plan(plan):
+            # A second, independent, instrument method ends up in the first stage
+            self.method.method_name = "other_method"
+            self.handler.PostInstrumentMethod(self.method)
+        assert [len(stage) for stage in plan.stages()] == [2, 1, 1, 1]
+        self.handler.ExecutePlan(plan, max_workers=2)
+        endpoints = [
+            call[1]["endpoint"] for call in self.handler.connection.post.call_args_list
+        ]
+        assert len(endpoints) == 5
+        assert endpoints[2:] == [
+            "project/methods/method-set",
+            "project/methods/sample-set-method",
+            "acquisition/run-sample-set-method",
+        ]
+
+    def test_execute_error(self):
+        plan = self.record()
+        self.handler.connection.post.side_effect = ValueError("Empower error")
+        with self.assertRaises(RuntimeError):
+            self.handler.ExecutePlan(plan)
+        self.handler.connection.post.assert_called_once()
+
+
+class TestUpsert(unittest.TestCase):
+    @patch("OptiHPLCHandler.empower_handler.EmpowerConnection")
+    def setUp(self, _) -> None:
+        self.handler = EmpowerHandler(
+            project="test_project",
+            address="https://test_address/",
+        )
+        self.handler.connection.api_version = "2.0"
+        self.server_methods = {
+            "same": self.instrument_method("same", "<a>1</a>").current_method,
+            "changed": self.instrument_method("changed", "<a>1</a>").current_method,
+            "changed_v2": self.instrument_method(
+                "changed_v2", "<a>2</a>"
+            ).current_method,
+        }
+        self.handler.connection.get.side_effect = self.get
+
+    @staticmethod
+    def instrument_method(name, xml):
+        return EmpowerInstrumentMethod(
+            {"methodName": name, "modules": [{"name": "test", "nativeXml": xml}]}
+        )
+
+    def get(self, endpoint):
+        if endpoint.startswith("project/methods?"):
+            return create_empower_response(
+                [
+                    {"fields": [{"name": "Name", "value": name}]}
+                    for name in self.server_methods
+                ]
+            )
+        name = endpoint.split("name=")[1]
+        return create_empower_response(self.server_methods[name])
+
+    def test_upsert_instrument_methods(self):
+        methods = [
+            self.instrument_method("same", "<a>1</a>"),
+            self.instrument_method("new", "<a>1</a>"),
+            self.instrument_method("changed", "<a>2</a>"),
+        ]
+        results = self.handler.UpsertInstrumentMethods(methods)
+        assert [(result.name, result.outcome) for result in results] == [
+            ("same", "skipped"),
+            ("new", "posted"),
+            ("changed_v2", "skipped"),
+        ]
+        assert methods[2].method_name == "changed_v2"
+        # The list of methods is only fetched once
+        list_calls = [
+            call
+            for call in self.handler.connection.get.call_args_list
+            if call[1]["endpoint"].startswith("project/methods?")
+        ]
+        assert len(list_calls) == 1
+        assert self.handler.connection.post.call_count == 1
+
+    def test_upsert_versioned(self):
+        method = self.instrument_method("changed", "<a>3</a>")
+        (result,) = self.handler.UpsertInstrumentMethods([method])
+        assert result == ("changed", "changed_v3", "versioned")
+        assert (
+            self.handler.connection.post.call_args[1]["body"]["methodName"]
+            == "changed_v3"
+        )
+        assert self.handler.connection.post.call_args[1]["endpoint"].endswith(
+            "overWriteExisting=false"
+        )
+
+    def test_upsert_overwrite(self):
+        method = self.instrument_method("changed", "<a>3</a>")
+        (result,) = self.handler.UpsertInstrumentMethods([method], overwrite=True)
+        assert result == ("changed", "changed", "overwritten")
+        assert self.handler.connection.post.call_args[1]["endpoint"].endswith(
+            "overWriteExisting=true"
+        )
+
+    def test_upsert_duplicate_names(self):
+        with self.assertRaises(ValueError):
+            self.handler.UpsertInstrumentMethods(
+                [
+                    self.instrument_method("new", "<a>1</a>"),
+                    self.instrument_method("new", "<a>2</a>"),
+                ]
+            )
+
+    def test_upsert_method_set_methods(self):
+        self.server_methods = {
+            "same": {"name": "same", "instrumentMethod": "a", "id": 1},
+            "changed": {"name": "changed", "instrumentMethod": "a", "id": 2},
+        }
+        results = self.handler.UpsertMethodSetMethods(
+            [
+                {"name": "same", "instrumentMethod": "a"},
+                {"name": "changed", "instrumentMethod": "b"},
+            ]
+        )
+        assert [(result.name, result.outcome) for result in results] == [
+            ("same", "skipped"),
+            ("changed_v2", "versioned"),
+        ]
+        assert self.handler.connection.post.call_args[1]["body"] == {
+            "name": "changed_v2",
+            "instrumentMethod": "b",
+        }
+
+    def test_upsert_versioned_name_in_batch(self):
+        self.server_methods = {
+            "changed": {"name": "changed", "instrumentMethod": "a", "id": 2},
+        }
+        results = self.handler.UpsertMethodSetMethods(
+            [
+                {"name": "changed", "instrumentMethod": "b"},
+                {"name": "changed_v2", "instrumentMethod": "c"},
+            ]
+        )
+        assert [(result.name, result.outcome) for result in results] == [
+            ("changed_v3", "versioned"),
+            ("changed_v2", "posted"),
+        ]
+
+    def test_upsert_truncated_names_differ(self):
+        names = ["a" * 40 + "_1", "a" * 40 + "_2"]
+        for name in names:
+            self.server_methods[name] = self.instrument_method(
+                name, "<a>1</a>"
+            ).current_method
+        results = self.handler.UpsertInstrumentMethods(
+            [self.instrument_method(name, "<a>2</a>") for name in names]
+        )
+        posted = [result.name for result in results]
+        assert all(result.outcome == "versioned" for result in results)
+        assert len(set(posted)) == 2
+        assert not set(posted) & set(self.server_methods)
+
+
+class TestSampleSetMethod(unittest.TestCase):
+    @patch("OptiHPLCHandler.empower_handler.EmpowerConnection")
+    def setUp(self, _) -> None:
+        self.handler = EmpowerHandler(
+            project="test_project",
+            address="https://test_address/",
+        )
+        self.handler.connection.api_version = "2.0"
+        lines = [
+            {
+                "fields": [
+                    {"name": "MethodSetOrReportMethod", "value": method},
+                    {"name": "Function", "value": {"member": function}},
+                ]
+            }
+            for method, function in [
+                ("method_set_1", "Inject Samples"),
+                ("method_set_2", "Inject Samples"),
+                ("method_set_1", "Inject Samples"),
+                ("report_method", "Report"),
+            ]
+        ]
+        self.methods = {
+            "sample-set-method?name=sample_set": {
+                "name": "sample_set",
+                "sampleSetLines": lines,
+            },
+            "method-set?name=method_set_1": {
+                "name": "method_set_1",
+                "instrumentMethod": "instrument",
+            },
+            "method-set?name=method_set_2": {
+                "name": "method_set_2",
+                "instrumentMethod": "instrument",
+            },
+            "instrument-method?name=instrument": {
+                "methodName": "instrument",
+                "modules": [],
+            },
+        }
+        self.handler.connection.get.side_effect = lambda endpoint: (
+            create_empower_response(self.methods[endpoint.split("/")[-1]])
+        )
+
+    def test_get(self):
+        method = self.handler.GetSampleSetMethod("sample_set")
+        method["name"] = "changed"
+        assert self.handler.GetSampleSetMethod("sample_set")["name"] == "sample_set"
+        assert self.handler.connection.get.call_count == 1
+        self.handler.PostExperiment(
+            sample_set_method_name="sample_set", sample_list=[], plates={}
+        )
+        self.handler.GetSampleSetMethod("sample_set")
+        assert self.handler.connection.get.call_count == 2
+
+    def test_resolved(self):
+        resolved = self.handler.GetResolvedSampleSetMethod("sample_set")
+        assert resolved.sample_set_method["name"] == "sample_set"
+        assert list(resolved.method_set_methods) == ["method_set_1", "method_set_2"]
+        assert list(resolved.instrument_methods) == ["instrument"]
+        assert isinstance(
+            resolved.instrument_methods["instrument"], EmpowerInstrumentMethod
+        )
+        # Each method is fetched once, and the report method is not fetched
+        assert self.handler.connection.get.call_count == 4
+        self.handler.GetResolvedSampleSetMethod("sample_set")
+        assert self.handler.connection.get.call_count == 4
+
+
+class TestPostJournal(unittest.TestCase):
+    @patch("OptiHPLCHandler.empower_handler.EmpowerConnection")
+    def setUp(self, _) -> None:
+        self.folder = tempfile.TemporaryDirectory()
+        self.addCleanup(self.folder.cleanup)
+        self.path = os.path.join(self.folder.name, "journal.db")
+        self.handler = EmpowerHandler(
+            project="test_project",
+            address="https://test_address/",
+            allow_login_without_context_manager=True,
+            journal=PostJournal(self.path, retry_delay=0),
+        )
+        self.handler.connection.get.return_value = create_empower_response([])
+        self.addCleanup(self.handler.journal.stop)
+
+    def post_methods(self):
+        for number in range(3):
+            self.handler.PostMethodSetMethod({"name": f"method_{number}"})
+
+    def posted_names(self):
+        return [
+            call[1]["body"]["name"]
+            for call in self.handler.connection.post.call_args_list
+        ]
+
+    def test_posted_in_background(self):
+        self.post_methods()
+        self.post_methods()  # Already waiting, so not added again
+        self.handler.connection.post.assert_not_called()
+        self.handler.login()
+        self.handler.journal.flush(timeout=5)
+        assert self.posted_names() == ["method_0", "method_1", "method_2"]
+        self.post_methods()  # Already posted, so not posted again
+        assert self.handler.journal.add(
+            "PostMethodSetMethod",
+            self.handler.connection.post.call_args[1]["endpoint"],
+            {"name": "method_2"},
+            force=True,
+        )
+        self.handler.logout()
+        assert self.posted_names() == ["method_0", "method_1", "method_2", "method_2"]
+
+    def test_rerun_after_crash(self):
+        self.handler.login()
+        self.post_methods()
+        self.handler.journal.flush(timeout=5)
+        self.handler.journal.stop()
+        journal = PostJournal(self.path, retry_delay=0)
+        journal.start(self.handler.connection)
+        self.handler.journal = journal
+        self.post_methods()
+        self.handler.PostMethodSetMethod({"name": "method_3"})
+        journal.flush(timeout=5)
+        journal.stop()
+        assert self.posted_names() == ["method_0", "method_1", "method_2", "method_3"]
+
+    def test_rejected_post_not_retried(self):
+        response = MagicMock(status_code=400)
+        self.handler.connection.post.side_effect = requests.exceptions.HTTPError(
+            "exists", response=response
+        )
+        self.handler.login()
+        self.post_methods()
+        with self.assertRaises(RuntimeError):
+            self.handler.journal.flush(timeout=5)
+        assert self.posted_names() == ["method_0"]
+
+    def test_cache_cleared_when_sent(self):
+        self.handler.method_cache.set(
+            self.handler._method_cache_key("MethodSetMethod", "method_0"), {"old": 1}
+        )
+        self.handler.PostMethodSetMethod({"name": "method_0"})
+        # Read and cached again before the post is sent
+        self.handler.method_cache.set(
+            self.handler._method_cache_key("MethodSetMethod", "method_0"), {"old": 1}
+        )
+        self.handler.login()
+        self.handler.journal.flush(timeout=5)
+        self.handler.journal.stop()
+        with self.assertRaises(KeyError):
+            self.handler.method_cache.get(
+                self.handler._method_cache_key("MethodSetMethod", "method_0")
+            )
+
+    def test_no_attempts_left(self):
+        self.handler.connection.post.side_effect = requests.exceptions.ConnectionError(
+            "error"
+        )
+        self.handler.journal.max_attempts = 3
+        self.handler.login()
+        self.post_methods()
+        with self.assertRaises(RuntimeError):
+            self.handler.journal.flush(timeout=5)
+        self.handler.journal.stop()
+        journal = PostJournal(self.path, max_attempts=1)
+        journal.retry_failed()
+        with journal._connect() as database:
+            database.execute("UPDATE journal SET attempts = 2")
+        journal.start(self.handler.connection)
+        with self.assertRaises(RuntimeError):
+            journal.flush(timeout=5)
+        journal.stop()
+        assert self.handler.connection.post.call_count == 3
+        assert len(journal.entries("failed")) == 1
+
+    def test_resume(self):
+        self.post_methods()
+        journal = PostJournal(self.path)
+        assert [entry.body["name"] for entry in journal.entries("pending")] == [
+            "method_0",
+            "method_1",
+            "method_2",
+        ]
+        journal.start(self.handler.connection)
+        journal.flush(timeout=5)
+        journal.stop()
+        assert len(PostJournal(self.path).entries("done")) == 3
+
+    def test_retry(self):
+        self.handler.connection.post.side_effect = [
+            requests.exceptions.ConnectionError("error"),
+            None,
+            None,
+            None,
+        ]
+        self.handler.login()
+        self.post_methods()
+        self.handler.journal.flush(timeout=5)
+        assert self.posted_names() == ["method_0", "method_0", "method_1", "method_2"]
+
+    def test_failure_stops_posting(self):
+        self.handler.journal.max_attempts = 2
+        self.handler.connection.post.side_effect = requests.exceptions.ConnectionError(
+            "error"
+        )
+        self.handler.login()
+        self.post_methods()
+        with self.assertRaises(RuntimeError):
+            self.handler.journal.flush(timeout=5)
+        assert self.posted_names() == ["method_0", "method_0"]
+        self.handler.connection.post.side_effect = None
+        self.handler.journal.retry_failed()
+        self.handler.journal.flush(timeout=5)
+        assert len(self.handler.journal.entries("done")) == 3
+
+    def test_flush_not_started(self):
+        self.post_methods()
+        with self.assertRaises(RuntimeError):
+            self.handler.journal.flush()
+
+
 class TestSampleSetLineFields(unittest.TestCase):
     @patch("OptiHPLCHandler.empower_handler.EmpowerConnection")
     def setUp(self, _) -> None:
@@ -1,10 +1,21 @@
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
 import unittest
+from random import Random
 
+from OptiHPLCHandler.empower_module_method import EmpowerModuleMethod
 from OptiHPLCHandler.utils import (
     append_truncate_method_name,
     make_method_name_string_compatible_with_empower,
 )
+from OptiHPLCHandler.utils.cache import LRUCache, ReferenceDataCache, TTLCache
+from OptiHPLCHandler.utils.sqlite_cache import SQLiteResponseCache
 from OptiHPLCHandler.utils.validate_gradient_table import validate_gradient_table
+from OptiHPLCHandler.utils.xml_tree import LeafIndex, TagOffsetIndex, XmlTree, root_tag
 
 
 class TestUtils(unittest.TestCase):
@@ -102,3 +113,376 @@ class TestUtils(unittest.TestCase):
                 str(e)
                 == "The time in the gradient table row is less than the previousrow. The row is 9.1 and the previous rowis 10.0."  # noqa: E501
             )
+
+
+class TestTTLCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.now = 0.0
+        self.cache = TTLCache(ttl=10, clock=lambda: self.now)
+
+    def test_expiry(self):
+        self.cache.set("key", "value")
+        assert self.cache.get("key") == "value"
+        self.now = 11
+        with self.assertRaises(KeyError):
+            self.cache.get("key")
+
+    def test_invalidate(self):
+        self.cache.set("key", "value")
+        self.cache.set("other key", "value")
+        self.cache.invalidate("key")
+        with self.assertRaises(KeyError):
+            self.cache.get("key")
+        assert self.cache.get("other key") == "value"
+        self.cache.invalidate()
+        with self.assertRaises(KeyError):
+            self.cache.get("other key")
+
+
+class TestReferenceDataCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.now = 0.0
+        self.cache = ReferenceDataCache(
+            ttl={"nodes": 10}, stale_while_revalidate=False, clock=lambda: self.now
+        )
+        self.calls = 0
+
+    def loader(self):
+        self.calls += 1
+        return [f"node_{self.calls}"]
+
+    def test_cached(self):
+        assert self.cache.get("nodes", ("key",), self.loader) == ["node_1"]
+        assert self.cache.get("nodes", ("key",), self.loader) == ["node_1"]
+        assert self.cache.get("nodes", ("other key",), self.loader) == ["node_2"]
+        self.now = 11
+        assert self.cache.get("nodes", ("key",), self.loader) == ["node_3"]
+
+    def test_returns_copy(self):
+        self.cache.get("nodes", ("key",), self.loader).append("changed")
+        assert self.cache.get("nodes", ("key",), self.loader) == ["node_1"]
+
+    def test_not_cached(self):
+        self.cache.get("unknown_resource", ("key",), self.loader)
+        self.cache.get("unknown_resource", ("key",), self.loader)
+        assert self.calls == 2
+
+    def test_invalidate(self):
+        self.cache.get("nodes", ("key",), self.loader)
+        self.cache.invalidate("nodes")
+        assert self.cache.get("nodes", ("key",), self.loader) == ["node_2"]
+        self.cache.invalidate()
+        assert self.cache.get("nodes", ("key",), self.loader) == ["node_3"]
+
+    def test_stale_while_revalidate(self):
+        self.cache.stale_while_revalidate = True
+        refresh_allowed = threading.Event()
+
+        def loader():
+            if self.calls > 0:
+                refresh_allowed.wait(timeout=5)
+            return self.loader()
+
+        self.cache.get("nodes", ("key",), loader)
+        self.now = 11
+        # The stale value is returned, while a new value is fetched in the background
+        assert self.cache.get("nodes", ("key",), loader) == ["node_1"]
+        assert self.cache.get("nodes", ("key",), loader) == ["node_1"]
+        refresh_allowed.set()
+        for _ in range(500):
+            if self.cache.get("nodes", ("key",), loader) == ["node_2"]:
+                break
+            time.sleep(0.01)
+        assert self.cache.get("nodes", ("key",), loader) == ["node_2"]
+        assert self.calls == 2  # Only one refresh, even though it was expired twice
+
+    def test_persistence(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "cache.json")
+            cache = ReferenceDataCache(path=path, clock=lambda: self.now)
+            cache.get("nodes", ("key",), self.loader)
+            new_cache = ReferenceDataCache(path=path, clock=lambda: self.now)
+            assert new_cache.get("nodes", ("key",), self.loader) == ["node_1"]
+            assert self.calls == 1
+
+
+class TestLRUCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.cache = LRUCache(max_bytes=10, sizeof=len)
+
+    def test_get(self):
+        self.cache.set("key", "value")
+        assert self.cache.get("key") == "value"
+        with self.assertRaises(KeyError):
+            self.cache.get("other key")
+        assert self.cache.hit_ratio == 0.5
+        assert self.cache.memory_usage == 5
+
+    def test_evict_least_recently_used(self):
+        self.cache.set("a", "aaaa")
+        self.cache.set("b", "bbbb")
+        self.cache.get("a")
+        self.cache.set("c", "cccc")
+        assert self.cache.get("a") == "aaaa"
+        with self.assertRaises(KeyError):
+            self.cache.get("b")
+        assert self.cache.memory_usage == 8
+        assert len(self.cache) == 2
+
+    def test_too_large(self):
+        self.cache.set("key", "a value that is too large")
+        assert len(self.cache) == 0
+        assert self.cache.memory_usage == 0
+
+    def test_replace_and_invalidate(self):
+        self.cache.set("key", "value")
+        self.cache.set("key", "val")
+        assert self.cache.memory_usage == 3
+        self.cache.invalidate("key")
+        assert self.cache.memory_usage == 0
+        self.cache.set("key", "value")
+        self.cache.invalidate()
+        assert len(self.cache) == 0
+
+
+class TestSQLiteResponseCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.folder = tempfile.TemporaryDirectory()
+        self.addCleanup(self.folder.cleanup)
+        self.now = 0.0
+        self.cache = SQLiteResponseCache(
+            os.path.join(self.folder.name, "cache.db"),
+            ttl={"project/fields": 10},
+            max_bytes=100,
+            clock=lambda: self.now,
+        )
+        self.key = ("address", "project", "user", "1.0")
+
+    def test_ttl_for(self):
+        assert self.cache.ttl_for("project/fields") == 10
+        assert self.cache.ttl_for("/project/methods?methodTypes=x") == 300
+        assert self.cache.ttl_for("project/methods/sample-set-method-list") == 60
+        assert self.cache.ttl_for("acquisition/nodes") == 0
+
+    def test_get(self):
+        with self.assertRaises(KeyError):
+            self.cache.get(*self.key, "project/fields")
+        self.cache.set(*self.key, "project/fields", {"content": [1]})
+        set_time, response = self.cache.get(*self.key, "project/fields")
+        assert response == {"content": [1]}
+        assert not self.cache.is_expired("project/fields", set_time)
+        self.now = 11
+        assert self.cache.is_expired("project/fields", set_time)
+
+    def test_keyed_on_user(self):
+        self.cache.set(*self.key, "project/fields", 1)
+        with self.assertRaises(KeyError):
+            self.cache.get("address", "project", "other user", "1.0", "project/fields")
+
+    def test_table_without_user_replaced(self):
+        path = os.path.join(self.folder.name, "old.db")
+        connection = sqlite3.connect(path)
+        connection.execute(
+            "CREATE TABLE responses (address TEXT, project TEXT, api_version TEXT, "
+            "endpoint TEXT, set_time REAL, size INTEGER, response TEXT)"
+        )
+        connection.commit()
+        connection.close()
+        cache = SQLiteResponseCache(path)
+        cache.set(*self.key, "project/fields", 1)
+        assert cache.get(*self.key, "project/fields")[1] == 1
+
+    def test_evict_oldest(self):
+        for number in range(3):
+            self.now = number
+            self.cache.set(*self.key, f"project/fields/{number}", "x" * 38)
+        assert len(self.cache) == 2
+        assert self.cache.memory_usage == 80
+        with self.assertRaises(KeyError):
+            self.cache.get(*self.key, "project/fields/0")
+        self.cache.set(*self.key, "project/fields/large", "x" * 100)
+        assert len(self.cache) == 2
+
+    def test_invalidate(self):
+        self.cache.set(*self.key, "project/fields", 1)
+        self.cache.set(*self.key, "project/methods", 1)
+        self.cache.set("address", "other project", "user", "1.0", "project/methods", 1)
+        self.cache.invalidate(project="project", endpoint_prefix="project/methods")
+        assert len(self.cache) == 2
+        self.cache.invalidate()
+        assert len(self.cache) == 0
+
+    def test_concurrent_writes(self):
+        caches = [SQLiteResponseCache(self.cache.path) for _ in range(4)]
+
+        def write(cache, number):
+            for index in range(20):
+                cache.set(*self.key, f"project/fields/{number}/{index}", index)
+
+        threads = [
+            threading.Thread(target=write, args=(cache, number))
+            for number, cache in enumerate(caches)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(self.cache) == 80
+
+
+class TestXmlTree(unittest.TestCase):
+    def test_round_trip(self):
+        example_folder = os.path.join("tests", "empower_method_examples")
+        for file in os.listdir(example_folder):
+            if file.endswith(".xml"):
+                with open(os.path.join(example_folder, file)) as f:
+                    xml = f.read()
+                assert XmlTree(xml).xml == xml
+
+    def test_get_and_set(self):
+        tree = XmlTree("<a><b>1</b><c attribute='x'>2</c></a>")
+        assert tree["b"] == "1"
+        assert tree["a"] == "<b>1</b><c attribute='x'>2</c>"
+        tree["b"] = "<d>3</d>"
+        assert tree["d"] == "3"
+        assert tree.xml == "<a><b><d>3</d></b><c attribute='x'>2</c></a>"
+        tree.undo()
+        assert "d" not in tree
+        assert tree.xml == "<a><b>1</b><c attribute='x'>2</c></a>"
+
+    def test_missing_and_duplicate(self):
+        tree = XmlTree("<a><b>1</b><b>2</b></a>")
+        with self.assertRaises(KeyError):
+            tree["c"]
+        with self.assertRaises(ValueError):
+            tree["b"]
+
+    def test_malformed(self):
+        xml = "<a><b>1</a></c>text<d>"
+        tree = XmlTree(xml)
+        assert tree.xml == xml
+        assert tree["a"] == "<b>1"
+        assert "b" not in tree
+
+    def test_replace(self):
+        tree = XmlTree("<a><b>1</b></a>")
+        assert tree.replace("<b>1</b>", "<c>2</c>") == 1
+        assert tree["c"] == "2"
+        assert tree.replace("missing", "new") == 0
+        tree.undo()
+        tree.undo()
+        assert tree.xml == "<a><b>1</b></a>"
+
+    def test_merge_last(self):
+        tree = XmlTree("<a><b>1</b><c>1</c></a>")
+        tree["b"] = "2"
+        assert not tree.merge_last(1)
+        tree["c"] = "2"
+        assert not tree.merge_last(1)  # Different elements
+        tree["c"] = "3"
+        assert tree.merge_last(1)
+        tree.undo()
+        assert tree.xml == "<a><b>2</b><c>1</c></a>"
+        tree.replace("2", "4")
+        tree.replace("4", "5")
+        assert not tree.merge_last(1)
+
+
+class TestTagOffsetIndex(unittest.TestCase):
+    def test_same_as_find_value(self):
+        example_folder = os.path.join("tests", "empower_method_examples")
+        for file in os.listdir(example_folder):
+            if not file.endswith(".xml"):
+                continue
+            with open(os.path.join(example_folder, file)) as f:
+                xml = f.read()
+            index = TagOffsetIndex(xml)
+            for key in set(re.findall(r"<(\w+)>", xml)):
+                try:
+                    expected = EmpowerModuleMethod.find_value(xml, key)
+                except ValueError:
+                    with self.assertRaises(ValueError):
+                        index[key]
+                else:
+                    assert index[key] == expected
+
+    def test_missing(self):
+        index = TagOffsetIndex("<a>1</a><b>2<c></b>")
+        with self.assertRaises(KeyError):
+            index["c"]
+        with self.assertRaises(KeyError):
+            index["d"]
+
+
+class TestLeafIndex(unittest.TestCase):
+    def test_values(self):
+        index = LeafIndex("<a><b>1</b><c><d>2</d><d>3</d></c><e/>x<f>4</a></g>")
+        assert index.values == {"a/b": "1", "a/c/d[0]": "2", "a/c/d[1]": "3"}
+
+    def test_diff_same_as_values(self):
+        random = Random(0)
+        example_folder = os.path.join("tests", "empower_method_examples")
+        for file in os.listdir(example_folder):
+            if not file.endswith(".xml"):
+                continue
+            with open(os.path.join(example_folder, file)) as f:
+                xml = f.read()
+            index = LeafIndex(xml)
+            spans = list(index.spans.values())
+            for _ in range(50):
+                other = xml
+                for start, end in sorted(random.sample(spans, 3), reverse=True):
+                    value = random.choice(
+                        ["", "1.5", "x", xml[start:end], "<n>1</n>", '<n m="1">x</n>']
+                    )
+                    other = other[:start] + value + other[end:]
+                values, other_values = index.values, LeafIndex(other).values
+                expected = {
+                    path: (value, other_values.get(path))
+                    for path, value in values.items()
+                    if other_values.get(path) != value
+                }
+                differences = index.diff(other)
+                if values.keys() != other_values.keys():
+                    assert differences is None
+                elif differences is not None:
+                    assert differences == expected
+
+    def test_diff_different_elements(self):
+        index = LeafIndex("<a><b>1</b><c>2</c></a>")
+        assert index.diff("<a><b>1</b><c>3</c></a>") == {"a/c": ("2", "3")}
+        assert index.diff("<a><b>1</b><c>2</c></a>") == {}
+        assert index.diff("<a><b>1</b><b>2</b></a>") is None
+
+    def test_diff_inside_tag_with_attributes(self):
+        index = LeafIndex('<a><b><c attribute="1">v</c></b><d>1</d></a>')
+        for other in [
+            '<a><b><c attribute="2">v</c></b><d>1</d></a>',
+            '<a><b><c attribute="1">w</c></b><d>1</d></a>',
+            '<a><b><c attribute="1">v</c>x</b><d>2</d></a>',
+        ]:
+            differences = index.diff(other)
+            other_values = LeafIndex(other).values
+            expected = {
+                path: (value, other_values[path])
+                for path, value in index.values.items()
+                if other_values[path] != value
+            }
+            assert differences is None or differences == expected
+            module_method = EmpowerModuleMethod({"nativeXml": index.xml})
+            other_module_method = EmpowerModuleMethod({"nativeXml": other})
+            assert module_method.diff(other_module_method) == expected
+
+
+class TestRootTag(unittest.TestCase):
+    def test_root_tag(self):
+        assert root_tag("<a><b/></a>") == "a"
+        assert (
+            root_tag(
+                '<?xml version="1.0"?>\n<!-- <comment> -->\n<!DOCTYPE a>'
+                '<AcquityPDAMethod version="1">'
+            )
+            == "AcquityPDAMethod"
+        )
+        assert root_tag("not xml") is None
+        assert root_tag("") is None